@@ -3,7 +3,7 @@ from setuptools import setup
 setup(
     name='tacred_enrichment',
     version='1.0.0',
-    packages=['tacred_enrichment', 'tacred_enrichment.extra', 'tacred_enrichment.internal'],
+    packages=['tacred_enrichment', 'tacred_enrichment.benchmark', 'tacred_enrichment.extra', 'tacred_enrichment.internal'],
     url='https://github.com/yyellin/tacred-enrichment',
     license='Apache 2.0',
     author='Jonathan Yellin',
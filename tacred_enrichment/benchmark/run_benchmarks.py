@@ -0,0 +1,364 @@
+"""run_benchmarks
+
+Usage:
+  run_benchmarks.py [--output=<results-file>] [--entries=<count>] [--sentence-length=<tokens>] [--depth=<levels>] [--remote-rate=<rate>] [--split-rate=<rate>] [--seed=<seed>] [--repeat=<times>] [--dep-graph=<backend>] [--only=<benchmarks>]
+  run_benchmarks.py compare <baseline-results-file> <results-file>
+  run_benchmarks.py (-h | --help)
+
+Times the CPU bound parts of the enrichment - tokenization mapping, DepGraph queries, each UCCA enhancer, passage
+conversion and (de)serialization and the post-processing of CoreNLP responses - over synthetic TACRED entries
+parsed by a stub in place of TUPA, so that no model nor network is needed. The same options always generate the
+same entries and passages, so the results of runs over different commits can be compared.
+
+Options:
+  -h --help                   Show this screen.
+  --output=<results-file>     Write the results (json) to this file rather than to stdout
+  --entries=<count>           Number of synthetic entries [default: 500]
+  --sentence-length=<tokens>  Mean number of tokens of a sentence [default: 25]
+  --depth=<levels>            Maximal number of UCCA units between the root and a terminal [default: 3]
+  --remote-rate=<rate>        Share of UCCA units with a remote participant [default: 0.1]
+  --split-rate=<rate>         Share of tokens split by the UCCA tokenization [default: 0.05]
+  --seed=<seed>               Seed of the synthetic data [default: 0]
+  --repeat=<times>            Number of timed runs of each benchmark, following an untimed one [default: 5]
+  --dep-graph=<backend>       DepGraph implementation used by the enhancers, 'networkx' or 'array' [default: networkx]
+  --only=<benchmarks>         Comma separated prefixes of the names of the benchmarks to run (for example 'enhancer,dep_graph:array')
+"""
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import OrderedDict, namedtuple
+
+from docopt import docopt
+
+from tacred_enrichment.benchmark.stub_parser import StubTupaParser
+from tacred_enrichment.benchmark.synthetic import generate_corenlp_response, generate_entries, generate_native_passage, ucca_tokenize
+from tacred_enrichment.corenlp_enrichment import enhance_item as enhance_corenlp_item
+from tacred_enrichment.internal.dep_graph_backend import BACKENDS, set_dep_graph_backend
+from tacred_enrichment.internal.map_tokenization import MapTokenization
+from tacred_enrichment.internal.sanitize_tacred import SanitizeTacred
+from tacred_enrichment.internal.sync_tac_tags import SyncTacTags
+from tacred_enrichment.internal.ucca_enhancer_registry import ENHANCERS
+from tacred_enrichment.internal.ucca_graph_index import UccaGraphIndex
+from tacred_enrichment.internal.ucca_passage_converter import UccaPassageConverter
+from tacred_enrichment.internal.ucca_types import UccaParsedPassage, is_terminal
+
+# version of the layout of the results file
+RESULTS_VERSION = 1
+
+
+class Benchmark(namedtuple('Benchmark', 'name, run, operations')):
+    """
+    A 'Benchmark' is a named callable, doing 'operations' operations (parsing a passage, running an enhancer
+    over an entry and so on) each time it's called
+    """
+
+
+class PreparedEntry(namedtuple('PreparedEntry', 'item, tokens, ucca_tokens, tac_to_ucca, native, passage, graph_index, subj, obj')):
+    """
+    A 'PreparedEntry' holds a synthetic entry (with the outputs of all enhancers) along with everything needed to
+    run each benchmark over it: its sanitized and UCCA tokens, the mapping between them, its native and converted
+    passage and graph index, and the node ids of the first terminal of its subject and of its object
+    """
+
+
+class StubCoreNlp(object):
+    """
+    'StubCoreNlp' answers 'get_all' with a prepared (json decoded) CoreNLP response, in place of 'CoreNlpClient'
+    """
+
+    def __init__(self, response):
+        self.__response = response
+
+    def get_all(self, tokens, tokenize=True):
+        return self.__response
+
+
+def prepare_entries(count, seed, sentence_length, depth, remote_rate, split_rate):
+    """
+    'prepare_entries' generates synthetic entries and parses them with the stub parser; entries whose tokens
+    can't be aligned with those of their passage (which ucca_enrichment drops as well) are left out
+
+    """
+    prepared = []
+
+    for item in generate_entries(count, seed, sentence_length, split_rate):
+        tokens = SanitizeTacred.sanitize_tokens(item['token'])
+
+        native = generate_native_passage('1', ucca_tokenize(tokens), seed, depth, remote_rate)
+        passage = UccaPassageConverter.convert(native)
+        ucca_tokens = [terminal.text for terminal in passage.terminals]
+
+        tac_to_ucca = MapTokenization.map_a_to_b(tokens, ucca_tokens)
+        if not MapTokenization.check_surjectivity(tac_to_ucca, ucca_tokens) or not MapTokenization.check_defined(tac_to_ucca, tokens):
+            continue
+
+        graph_index = UccaGraphIndex(passage)
+
+        # the outputs of each enhancer are added to the entry, since later enhancers may require them
+        for enhancer in (enhancer_class() for enhancer_class in ENHANCERS):
+            if enhancer.sentence_level:
+                item.update(enhancer.enhance(None, None, passage, graph_index))
+            else:
+                item.update(enhancer.enhance(item, tac_to_ucca, passage, graph_index))
+
+        subj = passage.get_node_id_by_token_id(tac_to_ucca[item['subj_start']][0] + 1)
+        obj = passage.get_node_id_by_token_id(tac_to_ucca[item['obj_start']][0] + 1)
+
+        prepared.append(PreparedEntry(item, tokens, ucca_tokens, tac_to_ucca, native, passage, graph_index, subj, obj))
+
+    return prepared
+
+
+def tokenization_benchmarks(entries):
+
+    tac_lookups = [{key: entry.item[key] for key in ('subj_start', 'subj_end', 'obj_start', 'obj_end')} for entry in entries]
+
+    def map_tokenization():
+        for entry in entries:
+            MapTokenization.map_a_to_b(entry.tokens, entry.ucca_tokens)
+
+    def sync_tac_tags():
+        for entry, tac_lookup in zip(entries, tac_lookups):
+            SyncTacTags.b_lookup_to_a_lookup(entry.ucca_tokens, entry.tokens, tac_lookup)
+
+    return [Benchmark('map_tokenization', map_tokenization, len(entries)),
+            Benchmark('sync_tac_tags', sync_tac_tags, len(entries))]
+
+
+def dep_graph_benchmarks(entries, backend):
+    """
+    'dep_graph_benchmarks' times the construction of the DepGraph of each passage, and queries over them; the
+    graphs are built (and lazily indexed, by the untimed run) beforehand, so the queries are timed on their own
+
+    """
+    dep_graph_class = BACKENDS[backend]
+    graphs = [dep_graph_class(entry.graph_index.links, is_terminal) for entry in entries]
+    roots = [graph.root() for graph in graphs]
+    terminals = [[terminal.node_id for terminal in entry.passage.terminals] for entry in entries]
+
+    # as 'UccaEncodingMinSubtree', the minimal sub graph is that of the parents of the subject and the object
+    parents = [(entry.graph_index.get_parents(entry.subj)[0], entry.graph_index.get_parents(entry.obj)[0]) for entry in entries]
+
+    def compare_by(terminal_list, one, another):
+        return len(terminal_list)
+
+    def build():
+        for entry in entries:
+            dep_graph_class(entry.graph_index.links, is_terminal)
+
+    def undirected_steps():
+        for entry, graph in zip(entries, graphs):
+            graph.get_undirected_steps(entry.subj, entry.obj)
+
+    def lowest_common_ancestor():
+        for entry, graph in zip(entries, graphs):
+            graph.lowest_common_ancestor(entry.subj, entry.obj)
+
+    def dependency_representations():
+        for graph, root, passage_terminals in zip(graphs, roots, terminals):
+            graph.get_undirected_dependency_representations(passage_terminals, root)
+
+    def minimal_subgraph():
+        for graph, (one, another) in zip(graphs, parents):
+            graph.get_minimal_subgraph(one, another, compare_by)
+
+    prefix = 'dep_graph:{0}:'.format(backend)
+
+    return [Benchmark(prefix + 'build', build, len(entries)),
+            Benchmark(prefix + 'undirected_steps', undirected_steps, len(entries)),
+            Benchmark(prefix + 'lowest_common_ancestor', lowest_common_ancestor, len(entries)),
+            Benchmark(prefix + 'dependency_representations', dependency_representations, len(entries)),
+            Benchmark(prefix + 'minimal_subgraph', minimal_subgraph, len(entries))]
+
+
+def enhancer_benchmarks(entries):
+
+    benchmarks = [Benchmark('graph_index', lambda: [UccaGraphIndex(entry.passage) for entry in entries], len(entries))]
+
+    for enhancer_class in ENHANCERS:
+        enhancer = enhancer_class()
+
+        if enhancer.sentence_level:
+            def run(enhancer=enhancer):
+                for entry in entries:
+                    enhancer.enhance(None, None, entry.passage, entry.graph_index)
+        else:
+            def run(enhancer=enhancer):
+                for entry in entries:
+                    enhancer.enhance(entry.item, entry.tac_to_ucca, entry.passage, entry.graph_index)
+
+        benchmarks.append(Benchmark('enhancer:' + enhancer_class.__name__, run, len(entries)))
+
+    return benchmarks
+
+
+def passage_benchmarks(entries):
+
+    serializations = [entry.passage.serialize() for entry in entries]
+
+    def conversion():
+        for entry in entries:
+            UccaPassageConverter.convert(entry.native)
+
+    def serialize():
+        for entry in entries:
+            entry.passage.serialize()
+
+    def deserialize():
+        for serialization in serializations:
+            UccaParsedPassage.from_serialization(serialization)
+
+    return [Benchmark('passage:conversion', conversion, len(entries)),
+            Benchmark('passage:serialize', serialize, len(entries)),
+            Benchmark('passage:deserialize', deserialize, len(entries))]
+
+
+def corenlp_benchmarks(entries, seed):
+
+    responses = [generate_corenlp_response(entry.ucca_tokens, seed) for entry in entries]
+    response_texts = [json.dumps(response) for response in responses]
+    clients = [StubCoreNlp(response) for response in responses]
+
+    def decode():
+        for response_text in response_texts:
+            json.loads(response_text)
+
+    def post_processing():
+        for entry, client in zip(entries, clients):
+            enhance_corenlp_item({'ucca_tokens': entry.ucca_tokens}, client)
+
+    return [Benchmark('corenlp:decode', decode, len(entries)),
+            Benchmark('corenlp:post_processing', post_processing, len(entries))]
+
+
+def stub_parser_benchmarks(entries, seed, depth, remote_rate):
+
+    parser = StubTupaParser(seed, depth, remote_rate)
+    sentences = [' '.join(entry.tokens) for entry in entries]
+
+    return [Benchmark('stub_parser:parse_sentences', lambda: parser.parse_sentences(sentences), len(entries))]
+
+
+def time_benchmark(benchmark, repeat):
+    """
+    'time_benchmark' calls the benchmark once untimed (to warm caches up) and then 'repeat' times, with the
+    garbage collector disabled as 'timeit' does, and returns the duration of each timed call
+
+    """
+    benchmark.run()
+
+    durations = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            benchmark.run()
+            durations.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    return durations
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(parameters, repeat, only=None):
+    """
+    'run_benchmarks' runs all benchmarks (or those whose names start with any of 'only') over the synthetic
+    entries generated by 'parameters', and returns the results as a json serializable dict
+
+    """
+    entries = prepare_entries(parameters['entries'], parameters['seed'], parameters['sentence_length'], parameters['depth'],
+                              parameters['remote_rate'], parameters['split_rate'])
+
+    benchmarks = tokenization_benchmarks(entries)
+    for backend in BACKENDS:
+        benchmarks += dep_graph_benchmarks(entries, backend)
+    benchmarks += enhancer_benchmarks(entries)
+    benchmarks += passage_benchmarks(entries)
+    benchmarks += corenlp_benchmarks(entries, parameters['seed'])
+    benchmarks += stub_parser_benchmarks(entries, parameters['seed'], parameters['depth'], parameters['remote_rate'])
+
+    if only is not None:
+        benchmarks = [benchmark for benchmark in benchmarks if any(benchmark.name.startswith(prefix) for prefix in only)]
+
+    results = OrderedDict()
+    for benchmark in benchmarks:
+        durations = time_benchmark(benchmark, repeat)
+        print('{0}: {1:.1f}us per operation'.format(benchmark.name, min(durations) / benchmark.operations * 1e6), file=sys.stderr)
+
+        results[benchmark.name] = {'operations': benchmark.operations,
+                                   'durations': [round(duration, 6) for duration in durations],
+                                   'best_us_per_operation': round(min(durations) / benchmark.operations * 1e6, 3),
+                                   'median_us_per_operation': round(statistics.median(durations) / benchmark.operations * 1e6, 3)}
+
+    return {'version': RESULTS_VERSION,
+            'commit': get_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': dict(parameters, prepared_entries=len(entries), repeat=repeat),
+            'benchmarks': results}
+
+
+def compare(baseline, results):
+    """
+    'compare' prints, for each benchmark in both result sets, the best time per operation in each and their
+    ratio (lower is better)
+
+    """
+    if baseline['parameters'] != results['parameters']:
+        print('warning: the results were produced with different parameters, so they are not comparable', file=sys.stderr)
+
+    print('{0:45} {1:>12} {2:>12} {3:>8}'.format('benchmark', 'baseline us', 'us', 'ratio'))
+    for name, result in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+
+        baseline_us = baseline['benchmarks'][name]['best_us_per_operation']
+        print('{0:45} {1:12.1f} {2:12.1f} {3:8.2f}'.format(name, baseline_us, result['best_us_per_operation'],
+                                                          result['best_us_per_operation'] / baseline_us if baseline_us > 0 else float('nan')))
+
+
+if __name__ == "__main__":
+    args = docopt(__doc__)
+
+    if args['compare']:
+        with open(args['<baseline-results-file>'], encoding='utf-8') as baseline_file, open(args['<results-file>'], encoding='utf-8') as results_file:
+            compare(json.load(baseline_file), json.load(results_file))
+        sys.exit(0)
+
+    try:
+        set_dep_graph_backend(args['--dep-graph'])
+    except ValueError as e:
+        sys.exit(str(e))
+
+    parameters = {'entries': int(args['--entries']),
+                  'sentence_length': int(args['--sentence-length']),
+                  'depth': int(args['--depth']),
+                  'remote_rate': float(args['--remote-rate']),
+                  'split_rate': float(args['--split-rate']),
+                  'seed': int(args['--seed']),
+                  'dep_graph': args['--dep-graph']}
+
+    only = args['--only'].split(',') if args['--only'] is not None else None
+
+    results = run_benchmarks(parameters, int(args['--repeat']), only)
+
+    if args['--output'] is not None:
+        with open(args['--output'], 'w', encoding='utf-8') as output_file:
+            json.dump(results, output_file, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
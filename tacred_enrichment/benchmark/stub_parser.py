@@ -0,0 +1,40 @@
+from tacred_enrichment.benchmark.synthetic import generate_native_passage, ucca_tokenize
+from tacred_enrichment.internal.ucca_passage_converter import UccaPassageConverter
+
+
+class StubTupaParser(object):
+    """
+    'StubTupaParser' stands in for 'TupaParser' where there's no TUPA model (nor spaCy one) to parse with: it has
+    the same 'parse_sentence' and 'parse_sentences' methods, and returns UccaParsedPassage objects converted
+    from synthetic native passages (see 'generate_native_passage') just as TupaParser converts the passages TUPA
+    parses. The passage of a sentence depends on the sentence alone, so parsing it again gives the same passage.
+
+    Methods
+    -------
+    parse_sentence
+        returns the UccaParsedPassage of a sentence
+    parse_sentences
+        returns the UccaParsedPassage objects of a list of sentences
+
+    """
+
+    def __init__(self, seed=0, depth=3, remote_rate=0.1):
+        """
+
+        Parameters
+        ----------
+        seed, depth, remote_rate
+            passed on to 'generate_native_passage'
+        """
+        self.__seed = seed
+        self.__depth = depth
+        self.__remote_rate = remote_rate
+
+    def parse_sentence(self, sentence):
+
+        native = generate_native_passage('1', ucca_tokenize(sentence.split(' ')), self.__seed, self.__depth, self.__remote_rate)
+
+        return UccaPassageConverter.convert(native)
+
+    def parse_sentences(self, sentences):
+        return [self.parse_sentence(sentence) for sentence in sentences]
@@ -0,0 +1,223 @@
+import hashlib
+import random
+
+from ucca.core import Passage
+from ucca.layer0 import Layer0
+from ucca.layer1 import Layer1, EdgeTags
+
+# words the synthetic sentences are made of; the hyphenated ones are split by the UCCA tokenization (as spaCy
+# would split them), so that mapping the TACRED tokens to the UCCA ones isn't always one to one
+WORDS = ['the', 'company', 'said', 'that', 'John', 'Smith', 'works', 'for', 'Acme', 'in', 'Boston', 'since', 'his',
+         'brother', 'founded', 'a', 'small', 'firm', 'with', 'Mary', 'Jones', 'who', 'was', 'born', 'on', 'March',
+         'chief', 'executive', 'of', 'Globex', 'and', 'has', 'been', 'married', 'to', 'her', 'late', 'husband', 'is']
+HYPHENATED_WORDS = ['co-founder', 'rock-hard', 'well-known', 'Jean-Pierre', 'ex-wife', 'vice-president']
+PUNCTUATION = [',', '.', '-LRB-', '-RRB-']
+
+ENTITY_TYPES = ['PERSON', 'ORGANIZATION', 'LOCATION', 'DATE', 'TITLE']
+RELATIONS = ['no_relation', 'per:employee_of', 'org:founded_by', 'per:spouse', 'per:title', 'org:city_of_headquarters']
+
+# categories of the edges between layer 1 units, and of those of units holding terminals
+SCENE_TAGS = [EdgeTags.ParallelScene, EdgeTags.Linker]
+UNIT_TAGS = [EdgeTags.Participant, EdgeTags.Process, EdgeTags.State, EdgeTags.Adverbial, EdgeTags.Center,
+             EdgeTags.Elaborator, EdgeTags.Relator, EdgeTags.Function]
+
+SPACY_TAGS = [('NN', 'NOUN'), ('NNP', 'PROPN'), ('VBD', 'VERB'), ('IN', 'ADP'), ('DT', 'DET'), ('JJ', 'ADJ')]
+
+
+def seeded_random(seed, *keys):
+    """
+    'seeded_random' returns a random generator seeded by 'seed' and 'keys', the same for the same arguments
+    whatever the process or python hash seed
+
+    """
+    digest = hashlib.blake2b(repr((seed,) + keys).encode('utf-8'), digest_size=8).digest()
+    return random.Random(int.from_bytes(digest, 'little'))
+
+
+def ucca_tokenize(tokens):
+    """
+    'ucca_tokenize' splits the hyphenated TACRED tokens as the UCCA tokenization does ('co-founder' becomes
+    'co', '-' and 'founder')
+
+    """
+    ucca_tokens = []
+    for token in tokens:
+        if '-' in token.strip('-'):
+            for index, part in enumerate(token.split('-')):
+                if index > 0:
+                    ucca_tokens.append('-')
+                ucca_tokens.append(part)
+        else:
+            ucca_tokens.append(token)
+
+    return ucca_tokens
+
+
+def generate_entries(count, seed=0, sentence_length=25, split_rate=0.05):
+    """
+    'generate_entries' generates TACRED-like entries - tokens, subject and object spans and their types and a
+    relation - each with a sentence of its own
+
+    Parameters
+    ----------
+    count
+        number of entries
+    seed
+        the same seed (and other arguments) always generate the same entries
+    sentence_length
+        mean number of tokens of a sentence; sentence lengths vary between half and one and a half of it
+    split_rate
+        the share of tokens that are hyphenated, and thus split by the UCCA tokenization
+
+    Returns
+    -------
+        a list of entries
+    """
+    entries = []
+
+    for entry_index in range(count):
+        rnd = seeded_random(seed, 'entry', entry_index)
+
+        length = max(4, rnd.randint(sentence_length // 2, sentence_length + sentence_length // 2))
+
+        tokens = []
+        for _ in range(length):
+            draw = rnd.random()
+            if draw < split_rate:
+                tokens.append(rnd.choice(HYPHENATED_WORDS))
+            elif draw < split_rate + 0.08:
+                tokens.append(rnd.choice(PUNCTUATION))
+            else:
+                tokens.append(rnd.choice(WORDS))
+
+        # subject and object spans of up to three tokens, the subject in the first half of the sentence and
+        # the object in the second, so that they never overlap
+        subj_start = rnd.randrange(length // 2)
+        subj_end = min(subj_start + rnd.randrange(3), length // 2 - 1)
+        obj_start = rnd.randrange(length // 2, length)
+        obj_end = min(obj_start + rnd.randrange(3), length - 1)
+
+        entries.append({'id': 'synthetic-{0}'.format(entry_index),
+                        'token': tokens,
+                        'relation': rnd.choice(RELATIONS),
+                        'subj_start': subj_start, 'subj_end': subj_end, 'subj_type': rnd.choice(ENTITY_TYPES),
+                        'obj_start': obj_start, 'obj_end': obj_end, 'obj_type': rnd.choice(ENTITY_TYPES)})
+
+    return entries
+
+
+def generate_native_passage(passage_id, ucca_tokens, seed=0, depth=3, remote_rate=0.1):
+    """
+    'generate_native_passage' generates a native ucca passage over 'ucca_tokens', its terminals annotated as
+    spaCy would have annotated them, and its layer 1 units nested as TUPA might have parsed them
+
+    Parameters
+    ----------
+    passage_id
+        id of the passage
+    ucca_tokens
+        the tokens of the sentence, as tokenized for UCCA (see 'ucca_tokenize')
+    seed
+        the same seed (and other arguments) always generate the same passage
+    depth
+        maximal number of layer 1 units between the root and a terminal (at least 1)
+    remote_rate
+        the share of units that get a remote participant
+
+    Returns
+    -------
+        a native ucca passage
+    """
+    rnd = seeded_random(seed, 'passage', tuple(ucca_tokens))
+
+    passage = Passage(passage_id)
+    layer0 = Layer0(passage)
+    layer1 = Layer1(passage)
+
+    terminals = []
+    for position, text in enumerate(ucca_tokens, start=1):
+        punct = not any(character.isalnum() for character in text)
+        terminal = layer0.add_terminal(text=text, punct=punct)
+
+        tag, pos = ('.', 'PUNCT') if punct else rnd.choice(SPACY_TAGS)
+        terminal.extra.update({'lemma': text.lower(), 'tag': tag, 'pos': pos, 'ent_type': '',
+                               'head': 0 if position == 1 else -rnd.randint(1, position - 1)})
+        terminals.append(terminal)
+
+    units = []
+    ancestors = {}
+
+    def add_units(parent, start, end, level):
+        """adds units over terminals[start:end] under 'parent', splitting the span further until 'depth'"""
+        pieces = []
+        while start < end:
+            piece_end = min(end, start + max(1, rnd.randint(1, max(1, (end - start) // 2 + 1))))
+            pieces.append((start, piece_end))
+            start = piece_end
+
+        for piece_start, piece_end in pieces:
+            tag = rnd.choice(SCENE_TAGS if level == 1 else UNIT_TAGS)
+            unit = layer1.add_fnode(parent, tag)
+            units.append(unit)
+            ancestors[unit.ID] = ancestors[parent.ID] | {parent.ID} if parent is not None else set()
+
+            if level < depth and piece_end - piece_start > 1:
+                add_units(unit, piece_start, piece_end, level + 1)
+            else:
+                for terminal in terminals[piece_start:piece_end]:
+                    if terminal.punct:
+                        layer1.add_punct(unit, terminal)
+                    else:
+                        unit.add(EdgeTags.Terminal, terminal)
+
+    add_units(None, 0, len(terminals), 1)
+
+    # a remote edge only points from a unit to one added after it (as all direct edges do) that isn't its
+    # descendant, so the passage remains a dag
+    for index, unit in enumerate(units):
+        if rnd.random() < remote_rate:
+            candidates = [candidate for candidate in units[index + 1:] if unit.ID not in ancestors[candidate.ID]]
+            if candidates:
+                layer1.add_remote(unit, EdgeTags.Participant, rnd.choice(candidates))
+
+    return passage
+
+
+def generate_corenlp_response(tokens, seed=0):
+    """
+    'generate_corenlp_response' generates what CoreNLP's server would (json decoded) respond with for 'tokens' -
+    as requested by 'CoreNlpClient.get_all' - with a sentence per full stop, a dependency tree per sentence
+    and a few coreference chains
+
+    """
+    rnd = seeded_random(seed, 'corenlp', tuple(tokens))
+
+    sentence_tokens = [[]]
+    for token in tokens:
+        sentence_tokens[-1].append(token)
+        if token == '.':
+            sentence_tokens.append([])
+    sentence_tokens = [current for current in sentence_tokens if current]
+
+    sentences = []
+    for current in sentence_tokens:
+        dependencies = [{'dep': 'ROOT' if index == 1 else 'dep', 'dependent': index,
+                         'governor': 0 if index == 1 else rnd.randint(1, index - 1)}
+                        for index in range(1, len(current) + 1)]
+        rnd.shuffle(dependencies)
+
+        sentences.append({'basicDependencies': dependencies,
+                          'tokens': [{'word': token, 'pos': rnd.choice(SPACY_TAGS)[0], 'ner': rnd.choice(ENTITY_TYPES + ['O'] * 5)}
+                                     for token in current]})
+
+    corefs = {}
+    for chain in range(rnd.randint(0, 3)):
+        mentions = []
+        for mention in range(rnd.randint(2, 4)):
+            sentence_number = rnd.randint(1, len(sentences))
+            start = rnd.randint(1, len(sentence_tokens[sentence_number - 1]))
+            mentions.append({'sentNum': sentence_number, 'startIndex': start, 'endIndex': start + 1,
+                             'isRepresentativeMention': mention == 0})
+        corefs[str(chain + 1)] = mentions
+
+    return {'sentences': sentences, 'corefs': corefs}
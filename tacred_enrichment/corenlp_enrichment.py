@@ -1,17 +1,25 @@
 """Enhance TAC with UD attributes based on CoreNLP parse
 
 Usage:
-  corenlp_enrichment.py <corenlp_server> <corenlp_port> [--lines] [--input=<input-file>] [--output=<output-file>]
+  corenlp_enrichment.py <corenlp_server> <corenlp_port> [--lines] [--input=<input-file>] [--output=<output-file>] [--resume] [--stats=<stats-file>] [--report-interval=<seconds>]
   corenlp_enrichment.py (-h | --help)
 
 Options:
   -h --help     Show this screen.
+  --resume      Resume an interrupted run from the journal kept next to the output file
+  --stats=<stats-file>         Write run statistics - per stage timings and latency percentiles, the slowest entries and failure counts - to a json file
+  --report-interval=<seconds>  Seconds between summaries of the run statistics on stderr, 0 for none (a final summary is always given) [default: 60]
 """
 from docopt import docopt
+from itertools import islice
 import sys
+import time
 import ijson
 import jsonlines
 from tacred_enrichment.internal.core_nlp_client import CoreNlpClient
+from tacred_enrichment.internal.enrichment_journal import EnrichmentJournal
+from tacred_enrichment.internal.graceful_stop import GracefulStop
+from tacred_enrichment.internal.run_metrics import metrics
 
 
 def split_keep_delimiter(tokens, delimiter):
@@ -38,65 +46,129 @@ def split_keep_delimiter(tokens, delimiter):
     #return [item for token in tokens for subtoken in token.split('.') for item in [subtoken, '.'] ]
 
 
-args = docopt(__doc__)
+def enhance_item(item, core_nlp):
 
-corenlp_server = args['<corenlp_server>']
-corenlp_port = int(args['<corenlp_port>'])
+    retokenized = item['ucca_tokens']
 
-input_stream = open(args['--input'], encoding='utf-8') if args['--input'] is not None else sys.stdin
-output_stream = open(args['--output'], 'w', encoding='utf-8', newline='', buffering=1) if args['--output'] is not None else sys.stdout
-lines = True if args['--lines'] else False
+    parse = core_nlp.get_all(retokenized, False)
+    sentences = parse['sentences']
 
-reader = jsonlines.Reader(input_stream) if lines else ijson.items(input_stream, 'item')
+    item['corenlp_ner'] = []
+    item['corenlp_pos'] = []
+    item['corenlp_heads'] = []
+    item['corenlp_coref'] = []
 
-with jsonlines.Writer(output_stream) as json_write:
+    for sentence in sentences:
 
-    core_nlp = CoreNlpClient(corenlp_server, corenlp_port, 15000)
+        current_heads = [b for (a, b) in sorted([(dep_set['dependent'], dep_set['governor']) for dep_set in  sentence['basicDependencies']], key=lambda x: x[0])]
+        current_heads = [head + len(item['corenlp_heads']) if head > 0 else head for head in current_heads]
+
+        current_pos = [token['pos'] for token in sentence['tokens']]
+        current_ner = [token['ner'] for token in sentence['tokens']]
+
+        item['corenlp_heads'] += current_heads
+        item['corenlp_pos'] += current_pos
+        item['corenlp_ner'] += current_ner
+
+
+    sentence_adj = [0]
+    for sentence in sentences[:-1]:
+        sentence_adj.append( len(sentence['tokens']) )
+
+    corefs = parse['corefs'].values()
+
+    for coref in corefs:
+        anchor = next(x for x in coref if x['isRepresentativeMention'])
+        refs = [x for x in coref if not x['isRepresentativeMention']]
+
+        anchor_coords = [anchor['startIndex']+sentence_adj[anchor['sentNum']-1], \
+                        anchor['endIndex']+sentence_adj[anchor['sentNum']-1]]
+
+        refs_coords = [[ref['startIndex']+sentence_adj[ref['sentNum']-1], \
+                        ref['endIndex']+sentence_adj[ref['sentNum']-1]] for ref in refs]
+
+        item['corenlp_coref'].append([anchor_coords, refs_coords])
 
-    for item in reader:
 
-        retokenized = item['ucca_tokens']
+def enhance(reader, output_stream, core_nlp, journal=None, progress=None, stats_file=None, report_interval=None):
+    """
+    'enhance' adds the CoreNLP attributes to each entry yielded by 'reader' - a generator of (input offset
+    following the entry, entry) tuples - and writes them to 'output_stream'. If a 'journal' is given each
+    entry is committed to it once written, and SIGTERM/SIGINT stop the run cleanly after the current entry.
+    Timings and the slowest entries are summarized on stderr every 'report_interval' seconds (if given) and
+    once done, when they are also written to 'stats_file' (if given) as json.
 
-        parse = core_nlp.get_all(retokenized, False)
-        sentences = parse['sentences']
+    """
 
-        item['corenlp_ner'] = []
-        item['corenlp_pos'] = []
-        item['corenlp_heads'] = []
-        item['corenlp_coref'] = []
+    count = progress.count if progress is not None else 0
+    stop = GracefulStop() if journal is not None else None
 
-        for sentence in sentences:
+    metrics.reset()
 
-            current_heads = [b for (a, b) in sorted([(dep_set['dependent'], dep_set['governor']) for dep_set in  sentence['basicDependencies']], key=lambda x: x[0])]
-            current_heads = [head + len(item['corenlp_heads']) if head > 0 else head for head in current_heads]
+    try:
+        with jsonlines.Writer(output_stream) as json_write:
 
-            current_pos = [token['pos'] for token in sentence['tokens']]
-            current_ner = [token['ner'] for token in sentence['tokens']]
+            for input_offset, item in reader:
 
-            item['corenlp_heads'] += current_heads
-            item['corenlp_pos'] += current_pos
-            item['corenlp_ner'] += current_ner
+                start = time.perf_counter()
+                enhance_item(item, core_nlp)
+                metrics.entry(item.get('id'), time.perf_counter() - start)
 
+                with metrics.timer('json_write'):
+                    json_write.write(item)
+                count += 1
 
-        sentence_adj = [0]
-        for sentence in sentences[:-1]:
-            sentence_adj.append( len(sentence['tokens']) )
+                if journal is not None:
+                    output_stream.flush()
+                    journal.commit(EnrichmentJournal.Progress(input_offset, output_stream.tell(), count))
 
-        corefs = parse['corefs'].values()
+                metrics.maybe_report(report_interval)
 
-        for coref in corefs:
-            anchor = next(x for x in coref if x['isRepresentativeMention'])
-            refs = [x for x in coref if not x['isRepresentativeMention']]
+                if stop is not None and stop.requested:
+                    break
 
-            anchor_coords = [anchor['startIndex']+sentence_adj[anchor['sentNum']-1], \
-                            anchor['endIndex']+sentence_adj[anchor['sentNum']-1]]
+    finally:
+        print(metrics.summary(), file=sys.stderr)
+        if stats_file is not None:
+            metrics.write(stats_file)
 
-            refs_coords = [[ref['startIndex']+sentence_adj[ref['sentNum']-1], \
-                            ref['endIndex']+sentence_adj[ref['sentNum']-1]] for ref in refs]
 
-            item['corenlp_coref'].append([anchor_coords, refs_coords])
+def read_json(input_stream, count=0):
+    """
+    'read_json' reads the entries of a json array, skipping the first 'count' of them; byte offsets
+    are not available for the array format so None is yielded in their stead
 
-        json_write.write(item)
+    """
+    for item in islice(ijson.items(input_stream, 'item'), count, None):
+        yield None, item
 
 
+if __name__ == "__main__":
+    args = docopt(__doc__)
+
+    if args['--resume'] and (args['--input'] is None or args['--output'] is None):
+        sys.exit('--resume requires both --input and --output')
+
+    corenlp_server = args['<corenlp_server>']
+    corenlp_port = int(args['<corenlp_port>'])
+
+    journal = EnrichmentJournal(args['--output'], args['--input']) if args['--output'] is not None else None
+    progress = journal.load() if args['--resume'] else None
+
+    if progress is not None:
+        EnrichmentJournal.prepare_output_for_resume(args['--output'], progress)
+
+    input_stream = open(args['--input'], 'rb') if args['--input'] is not None else sys.stdin.buffer
+    output_stream = open(args['--output'], 'a' if progress is not None else 'w', encoding='utf-8', newline='', buffering=1) if args['--output'] is not None else sys.stdout
+    lines = True if args['--lines'] else False
+
+    if lines:
+        reader = EnrichmentJournal.read_json_lines(input_stream, progress.input_offset if progress is not None else 0)
+    else:
+        reader = read_json(input_stream, progress.count if progress is not None else 0)
+
+    core_nlp = CoreNlpClient(corenlp_server, corenlp_port, 15000)
+
+    report_interval = int(args['--report-interval']) or None
 
+    enhance(reader, output_stream, core_nlp, journal, progress, args['--stats'], report_interval)
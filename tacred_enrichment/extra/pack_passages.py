@@ -0,0 +1,43 @@
+"""pack_passages
+
+Usage:
+  pack_passages.py <passages-file> <packed-file>
+  pack_passages.py (-h | --help)
+
+Converts a passage store, as written by ucca_enrichment's --save-passages, into a packed passage file,
+which can be memory mapped and looked up by entry id without loading it.
+
+Options:
+  -h --help     Show this screen.
+"""
+import sys
+
+from docopt import docopt
+
+from tacred_enrichment.internal.ucca_packed_passages import UccaPackedPassageWriter
+from tacred_enrichment.internal.ucca_passage_store import UccaPassageStore
+
+
+def pack_passages(passages_file, packed_file):
+
+    store = UccaPassageStore(passages_file, read_only=True)
+
+    count = 0
+    try:
+        with UccaPackedPassageWriter(packed_file) as writer:
+            for entry_id, parsed_passage in store.entries():
+                writer.write(entry_id, parsed_passage)
+                count += 1
+    finally:
+        store.close()
+
+    print('packed {0} passages'.format(count), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    args = docopt(__doc__)
+
+    try:
+        pack_passages(args['<passages-file>'], args['<packed-file>'])
+    except FileNotFoundError as e:
+        sys.exit(str(e))
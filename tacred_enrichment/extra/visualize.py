@@ -4,6 +4,7 @@ Usage:
   visualize.py raw <tupa_module_path> <input-file> <output-dir>
   visualize.py xml_serializion <input-file> <output-dir>
   visualize.py my_serialization <input-file> <output-dir>
+  visualize.py packed <packed-file> <output-dir> <entry-id>...
   visualize.py (-h | --help)
 
 Options:
@@ -135,6 +136,28 @@ def from_serialized_ucca_parsed_passage(re_representation_files, output_dir):
         plt.savefig(os.path.join(output_dir, filename + '.png'))
         plt.close()
 
+def from_packed_passages(packed_file, entry_ids, output_dir):
+
+    from tacred_enrichment.internal.ucca_packed_passages import UccaPackedPassageReader
+
+    reader = UccaPackedPassageReader(packed_file)
+
+    for entry_id in entry_ids:
+
+        parsed_passage = reader.get(entry_id, native=False)
+        if parsed_passage is None:
+            print('no passage for {0} in {1}'.format(entry_id, packed_file))
+            continue
+
+        width = len(parsed_passage.terminals) * 19 / 27
+
+        plt.figure(figsize=(width, width * 10 / 19))
+
+        draw_from_re_representation(parsed_passage)
+
+        plt.savefig(os.path.join(output_dir, entry_id + '.png'))
+        plt.close()
+
 def draw_from_re_representation(passage):
 
     import matplotlib.cbook
@@ -217,8 +240,11 @@ if __name__ == "__main__":
     no_serialization = args.get('raw', False)
     xml_serialization = args.get('xml_serializion', False)
     my_serialization = args.get('my_serialization', False)
+    packed = args.get('packed', False)
 
     input_file = args.get('<input-file>', None)
+    packed_file = args.get('<packed-file>', None)
+    entry_ids = args.get('<entry-id>', [])
     output_dir = args.get('<output-dir>', None)
 
     tupa_module_path = args.get('<tupa_module_path>', None)
@@ -232,5 +258,8 @@ if __name__ == "__main__":
     elif my_serialization:
         from_serialized_ucca_parsed_passage([input_file], output_dir)
 
+    elif packed:
+        from_packed_passages(packed_file, entry_ids, output_dir)
+
     elif no_serialization:
         from_sentence_list([input_file], tupa_module_path, output_dir)
\ No newline at end of file
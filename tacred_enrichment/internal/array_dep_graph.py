@@ -0,0 +1,588 @@
+from collections import deque
+
+import networkx
+
+from tacred_enrichment.internal.dep_graph import Step
+
+
+class ArrayDepGraph(object):
+    """
+    'ArrayDepGraph' is an alternative to 'DepGraph', with the same public methods and the same results,
+    which rather than wrapping networkx graphs (that allocate a dictionary per node and per edge) holds
+    the dag in flat integer arrays. Nodes are numbered in order of first appearance in the links, which is
+    the order networkx would hold them in, so that wherever the result of a 'DepGraph' method depends on
+    the order in which networkx visits nodes (e.g. which of several shortest paths is returned) the same
+    order is followed here. networkx is only used for its exception types, so that callers see the same
+    errors with either class.
+
+    Attributes
+    ----------
+    __node_ids
+        the id of each node, by node number
+    __node_numbers
+        maps each node id to its number
+    __links
+        the link of each edge, by edge number (edges are numbered in order of first appearance)
+    __child_offsets, __children, __child_edges
+        CSR representation of the children of each node: the children of node 'n' (and the numbers of
+        the edges to them) are at positions '__child_offsets[n]' to '__child_offsets[n+1]'
+    __parent_offsets, __parents, __parent_edges
+        CSR representation of the parents of each node, in the same layout
+
+    """
+
+    def __init__(self, links, is_terminal = lambda x: True):
+        """
+
+        Parameters
+        ----------
+        links :
+           list of 'Link' objects that represent a dependency parse
+        """
+
+        edge_to_link = {}
+        for link in links:
+            edge_to_link[(link.parent_index, link.word_index)] = link
+
+        node_numbers = {}
+        edge_parents = []
+        edge_children = []
+        for parent, me in edge_to_link:
+            for node in (parent, me):
+                if node not in node_numbers:
+                    node_numbers[node] = len(node_numbers)
+            edge_parents.append(node_numbers[parent])
+            edge_children.append(node_numbers[me])
+
+        self.__node_ids = list(node_numbers)
+        self.__node_numbers = node_numbers
+        self.__links = list(edge_to_link.values())
+        self.__is_terminal = is_terminal
+
+        self.__child_offsets, self.__children, self.__child_edges = ArrayDepGraph.__to_csr(len(node_numbers), edge_parents, edge_children)
+        self.__parent_offsets, self.__parents, self.__parent_edges = ArrayDepGraph.__to_csr(len(node_numbers), edge_children, edge_parents)
+
+        # we'll initialize these lazily
+        self.__neighbor_offsets = None
+        self.__neighbors = None
+        self.__tree_parent = None
+        self.__tree_depth = None
+        self.__tree_entry = None
+        self.__tree_exit = None
+        self.__indexed = False
+        self.__ancestors = {}
+        self.__subtree_terminals = None
+
+    @staticmethod
+    def __to_csr(node_count, sources, targets):
+        """
+        lays out the targets of each source contiguously, retaining the order of the edges
+        """
+        offsets = [0] * (node_count + 1)
+        for source in sources:
+            offsets[source + 1] += 1
+        for node in range(node_count):
+            offsets[node + 1] += offsets[node]
+
+        positions = offsets[:-1]
+        laid_out_targets = [0] * len(sources)
+        laid_out_edges = [0] * len(sources)
+        for edge, (source, target) in enumerate(zip(sources, targets)):
+            laid_out_targets[positions[source]] = target
+            laid_out_edges[positions[source]] = edge
+            positions[source] += 1
+
+        return offsets, laid_out_targets, laid_out_edges
+
+    def __get_children(self, node):
+        return self.__children[self.__child_offsets[node]:self.__child_offsets[node + 1]]
+
+    def __get_direct_parents(self, node):
+        return self.__parents[self.__parent_offsets[node]:self.__parent_offsets[node + 1]]
+
+    def __get_neighbors(self, node):
+        """
+        the undirected neighbors of a node, in the order networkx.Graph would hold them: by the first edge
+        connecting the two
+        """
+        if self.__neighbors is None:
+            neighbor_lists = [[] for _ in self.__node_ids]
+            for parent in range(len(self.__node_ids)):
+                for position in range(self.__child_offsets[parent], self.__child_offsets[parent + 1]):
+                    neighbor_lists[parent].append((self.__child_edges[position], self.__children[position]))
+                    neighbor_lists[self.__children[position]].append((self.__child_edges[position], parent))
+
+            self.__neighbor_offsets = [0]
+            self.__neighbors = []
+            for neighbor_list in neighbor_lists:
+                self.__neighbors.extend(dict.fromkeys(neighbor for edge, neighbor in sorted(neighbor_list)))
+                self.__neighbor_offsets.append(len(self.__neighbors))
+
+        return self.__neighbors[self.__neighbor_offsets[node]:self.__neighbor_offsets[node + 1]]
+
+    def __find_edge(self, parent, child):
+        for position in range(self.__child_offsets[parent], self.__child_offsets[parent + 1]):
+            if self.__children[position] == child:
+                return self.__child_edges[position]
+        return -1
+
+    def __get_number(self, node_id):
+        number = self.__node_numbers.get(node_id)
+        if number is None:
+            raise networkx.NetworkXError('The node {0} is not in the digraph.'.format(node_id))
+        return number
+
+    def root(self):
+        """
+        Return root node_index (as 'DepGraph.root', the first node without parents)
+
+        """
+        for node in range(len(self.__node_ids)):
+            if self.__parent_offsets[node] == self.__parent_offsets[node + 1]:
+                return self.__node_ids[node]
+
+        raise networkx.NetworkXUnfeasible('Graph contains a cycle')
+
+    def get_terminals(self):
+        """
+
+        Returns
+        -------
+        The ids  of all terminals
+
+        """
+        terminals = set()
+        for link in self.__links:
+            if self.__is_terminal(link.word_index):
+                terminals.add(link.word_index)
+
+        return list(terminals)
+
+    def successors(self, node_index):
+        """
+        Iterator over the children of a node
+
+        """
+        return iter([self.__node_ids[child] for child in self.__get_children(self.__get_number(node_index))])
+
+    def get_parents(self, id):
+        """
+
+        Parameters
+        ----------
+        id
+            id of node for whose parents we're looking for
+
+        Returns
+        -------
+        The ids  of all parents of the node whose id was give (like 'networkx.ancestors', in breadth first
+        order of insertion)
+
+        """
+        return {self.__node_ids[ancestor] for ancestor in self.__get_ancestor_order(self.__get_number(id))}
+
+    def __get_ancestor_order(self, node):
+        """
+        the ancestors of a node in the order of a breadth first search over the parents
+        """
+        seen = {node}
+        order = []
+        to_visit = [node]
+        for current in to_visit:
+            for parent in self.__get_direct_parents(current):
+                if parent not in seen:
+                    seen.add(parent)
+                    order.append(parent)
+                    to_visit.append(parent)
+
+        return order
+
+    def __build_index(self):
+        """
+        when the dag is a tree (a single root, from which all nodes are reached, each through a single
+        parent) records the parent and depth of each node, and the entry and exit times of a DFS
+        """
+
+        self.__indexed = True
+
+        node_count = len(self.__node_ids)
+        roots = [node for node in range(node_count) if self.__parent_offsets[node] == self.__parent_offsets[node + 1]]
+        if len(roots) != 1 or any(self.__parent_offsets[node + 1] - self.__parent_offsets[node] > 1 for node in range(node_count)):
+            return
+
+        parent = [-1] * node_count
+        depth = [-1] * node_count
+        entry = [-1] * node_count
+        exit = [-1] * node_count
+
+        depth[roots[0]] = 0
+        time = 0
+        to_visit = [(roots[0], False)]
+        while to_visit:
+            node, visited = to_visit.pop()
+            if visited:
+                exit[node] = time
+                time += 1
+                continue
+
+            entry[node] = time
+            time += 1
+            to_visit.append((node, True))
+            for child in self.__get_children(node):
+                parent[child] = node
+                depth[child] = depth[node] + 1
+                to_visit.append((child, False))
+
+        # nodes on a cycle aren't reached from the root
+        if -1 in entry:
+            return
+
+        self.__tree_parent = parent
+        self.__tree_depth = depth
+        self.__tree_entry = entry
+        self.__tree_exit = exit
+
+    def __is_tree(self):
+        if not self.__indexed:
+            self.__build_index()
+        return self.__tree_parent is not None
+
+    def __get_tree_path(self, start, end):
+        """
+        returns the nodes on the path from 'start' to 'end' in a tree, both included
+        """
+        up = [start]
+        down = [end]
+        while self.__tree_depth[up[-1]] > self.__tree_depth[down[-1]]:
+            up.append(self.__tree_parent[up[-1]])
+        while self.__tree_depth[down[-1]] > self.__tree_depth[up[-1]]:
+            down.append(self.__tree_parent[down[-1]])
+        while up[-1] != down[-1]:
+            up.append(self.__tree_parent[up[-1]])
+            down.append(self.__tree_parent[down[-1]])
+
+        return up + down[-2::-1]
+
+    def __get_shortest_path(self, start, end):
+        """
+        the shortest undirected path between 'start' and 'end', found with the same bidirectional breadth
+        first search as 'networkx.shortest_path' (and thus the same path among several of equal length)
+        """
+        if start == end:
+            return [start]
+
+        pred = {start: None}
+        succ = {end: None}
+        forward_fringe = [start]
+        reverse_fringe = [end]
+        meeting = None
+
+        while forward_fringe and reverse_fringe and meeting is None:
+            if len(forward_fringe) <= len(reverse_fringe):
+                this_level = forward_fringe
+                forward_fringe = []
+                for v in this_level:
+                    for w in self.__get_neighbors(v):
+                        if w not in pred:
+                            forward_fringe.append(w)
+                            pred[w] = v
+                        if w in succ:
+                            meeting = w
+                            break
+                    if meeting is not None:
+                        break
+            else:
+                this_level = reverse_fringe
+                reverse_fringe = []
+                for v in this_level:
+                    for w in self.__get_neighbors(v):
+                        if w not in succ:
+                            succ[w] = v
+                            reverse_fringe.append(w)
+                        if w in pred:
+                            meeting = w
+                            break
+                    if meeting is not None:
+                        break
+
+        if meeting is None:
+            raise networkx.NetworkXNoPath('No path between {0} and {1}.'.format(self.__node_ids[start], self.__node_ids[end]))
+
+        path = []
+        node = meeting
+        while node is not None:
+            path.append(node)
+            node = pred[node]
+        path.reverse()
+        node = succ[path[-1]]
+        while node is not None:
+            path.append(node)
+            node = succ[node]
+
+        return path
+
+    def get_undirected_steps(self, start, end):
+        """
+
+        Parameters
+        ----------
+        start
+            first node in path
+        end
+            last node in path
+
+        Returns
+        -------
+        The shortest path between 'start and 'end' represented as a deserialization of a
+        list of Step objects
+        """
+        steps = []
+
+        if start not in self.__node_numbers or end not in self.__node_numbers:
+            return steps
+
+        start = self.__node_numbers[start]
+        end = self.__node_numbers[end]
+
+        if self.__is_tree():
+            node_list = self.__get_tree_path(start, end)
+        else:
+            node_list = self.__get_shortest_path(start, end)
+
+        for i in range(0, len(node_list) - 1):
+
+            me = node_list[i]
+            next = node_list[i + 1]
+
+            edge = self.__find_edge(me, next)
+            if edge >= 0:
+                direction = '>'  # '↑'
+            else:
+                edge = self.__find_edge(next, me)
+                direction = '<'  # ''↓'
+
+            step = Step(me=self.__node_ids[me], next=self.__node_ids[next], dep_direction=direction, dependency=self.__links[edge].dep_type)
+
+            steps.append(step)
+
+        return steps
+
+    def get_undirected_dependency_representations(self, nodes, end):
+        """
+        Same as 'DepGraph.get_undirected_dependency_representations': for each of 'nodes' the string
+
+            Step.get_dependency_representation(self.get_undirected_steps(node, end)[1:])
+
+        computed in a single breadth first traversal from 'end' (falling back to 'get_undirected_steps'
+        for nodes reached by several shortest paths of differing representations)
+
+        """
+        distance = {}
+        order = []
+        if end in self.__node_numbers:
+            distance[self.__node_numbers[end]] = 0
+            order.append(self.__node_numbers[end])
+
+        for node in order:
+            for neighbor in self.__get_neighbors(node):
+                if neighbor not in distance:
+                    distance[neighbor] = distance[node] + 1
+                    order.append(neighbor)
+
+        def dependency(me, next):
+            edge = self.__find_edge(me, next)
+            return self.__links[edge if edge >= 0 else self.__find_edge(next, me)].dep_type
+
+        def predecessors(node):
+            return [neighbor for neighbor in self.__get_neighbors(node) if distance.get(neighbor) == distance[node] - 1]
+
+        # at most two distinct representations of the shortest paths from each node to 'end'
+        representations = {order[0]: ('',)} if order else {}
+        for node in order[1:]:
+            node_representations = []
+            for predecessor in predecessors(node):
+                for predecessor_representation in representations[predecessor]:
+                    representation = dependency(node, predecessor) + predecessor_representation
+                    if representation not in node_representations:
+                        node_representations.append(representation)
+                if len(node_representations) > 1:
+                    break
+            representations[node] = tuple(node_representations[:2])
+
+        result = {}
+        for node_id in nodes:
+            if node_id == end or node_id not in self.__node_numbers:
+                result[node_id] = ''
+                continue
+
+            node = self.__node_numbers[node_id]
+            next_representations = set()
+            if node in distance:
+                next_representations = set(representation
+                                           for predecessor in predecessors(node)
+                                           for representation in representations[predecessor])
+
+            if len(next_representations) == 1:
+                result[node_id] = next_representations.pop()
+            else:
+                result[node_id] = Step.get_dependency_representation(self.get_undirected_steps(node_id, end)[1:])
+
+        return result
+
+    def is_ancestor(self, ancestor, node):
+        """
+        whether there is a (non empty) directed path from 'ancestor' to 'node'; False if either isn't in the graph
+
+        """
+        if ancestor not in self.__node_numbers or node not in self.__node_numbers or ancestor == node:
+            return False
+
+        ancestor = self.__node_numbers[ancestor]
+        node = self.__node_numbers[node]
+
+        if self.__is_tree():
+            return self.__tree_entry[ancestor] < self.__tree_entry[node] and self.__tree_exit[node] < self.__tree_exit[ancestor]
+
+        if node not in self.__ancestors:
+            self.__ancestors[node] = frozenset(self.__get_ancestor_order(node))
+
+        return ancestor in self.__ancestors[node]
+
+    def lowest_common_ancestor(self, one, another):
+        """
+        The lowest common ancestor of the two nodes, as 'DepGraph.lowest_common_ancestor' (i.e. as
+        'networkx.lowest_common_ancestor'); networkx.NodeNotFound is raised if either node isn't in the graph
+
+        """
+        for node in (one, another):
+            if node not in self.__node_numbers:
+                raise networkx.NodeNotFound('Node {0} is not in the graph'.format(node))
+
+        if self.__is_tree():
+            path = self.__get_tree_path(self.__node_numbers[one], self.__node_numbers[another])
+            return self.__node_ids[min(path, key=lambda node: self.__tree_depth[node])]
+
+        # replicate networkx: start from an arbitrary common ancestor (the first in the iteration order of
+        # the intersection of the ancestor sets) and descend through common ancestors while possible
+        ancestors_one = self.get_parents(one)
+        ancestors_one.add(one)
+        ancestors_another = ancestors_one if another == one else self.get_parents(another)
+        ancestors_another.add(another)
+
+        common_ancestors = ancestors_one & ancestors_another
+        if not common_ancestors:
+            return None
+
+        common_ancestor = next(iter(common_ancestors))
+        while True:
+            successor = None
+            for lower_ancestor in self.successors(common_ancestor):
+                if lower_ancestor in common_ancestors:
+                    successor = lower_ancestor
+                    break
+            if successor is None:
+                break
+            common_ancestor = successor
+
+        return common_ancestor
+
+    def __get_subtree_links(self, subtree_root):
+        """
+        returns the links of the sub-graph rooted at 'subtree_root', in BFS order
+        """
+
+        links = []
+        to_visit = deque([self.__get_number(subtree_root)])
+
+        while to_visit:
+            current_node = to_visit.popleft()
+
+            for position in range(self.__child_offsets[current_node], self.__child_offsets[current_node + 1]):
+                links.append(self.__links[self.__child_edges[position]])
+                to_visit.append(self.__children[position])
+
+        return links
+
+    def get_links_of_lca_subgraph(self, one, another):
+        """
+
+        Parameters
+        ----------
+        one
+            one node in the tree
+        another
+            a second node in the tree
+
+        Returns
+        -------
+        The all the links corresponding to the smallest sub-graph containing nodes one and two,
+        in DFS order
+        """
+
+        return self.__get_subtree_links(self.lowest_common_ancestor(one, another))
+
+    def __get_subtree_terminals(self):
+        """
+        returns a map from each node (number) to the (frozen) set of terminals in the sub-graph rooted at
+        it, computed for all nodes at once in a single post-order pass
+        """
+
+        if self.__subtree_terminals is None:
+            subtree_terminals = [None] * len(self.__node_ids)
+
+            for root in range(len(self.__node_ids)):
+                if subtree_terminals[root] is not None:
+                    continue
+
+                to_visit = [(root, False)]
+                while to_visit:
+                    node, visited = to_visit.pop()
+                    if subtree_terminals[node] is not None:
+                        continue
+
+                    children = self.__get_children(node)
+                    if not visited:
+                        to_visit.append((node, True))
+                        to_visit.extend((child, False) for child in children if subtree_terminals[child] is None)
+                        continue
+
+                    terminals = set()
+                    for child in children:
+                        child_id = self.__node_ids[child]
+                        if self.__is_terminal(child_id):
+                            terminals.add(child_id)
+                        terminals.update(subtree_terminals[child])
+                    subtree_terminals[node] = frozenset(terminals)
+
+            self.__subtree_terminals = subtree_terminals
+
+        return self.__subtree_terminals
+
+    def get_minimal_subgraph(self, one, another, compare_by):
+        """
+
+        Parameters
+        ----------
+        one
+            one node in the tree
+        another
+            a second node in the tree
+
+        Returns
+        -------
+        """
+
+        ancestors_one = self.get_parents(one)
+        ancestors_another = self.get_parents(another)
+
+        common_ancestors  = set(ancestors_one).intersection(ancestors_another)
+
+        if len(common_ancestors) == 0:
+            return None
+
+        # as with 'DepGraph.get_minimal_subgraph' on a tie the first in iteration order wins
+        subtree_terminals = self.__get_subtree_terminals()
+        minimal_common_ancestor = min(common_ancestors,
+                                      key=lambda common_ancestor: compare_by(list(subtree_terminals[self.__node_numbers[common_ancestor]]), one, another))
+
+        return ArrayDepGraph(self.__get_subtree_links(minimal_common_ancestor), self.__is_terminal)
@@ -2,6 +2,8 @@ import requests
 import json
 from stanfordcorenlp import StanfordCoreNLP
 
+from tacred_enrichment.internal.run_metrics import metrics
+
 
 class CoreNlpClient(StanfordCoreNLP):
     """
@@ -81,8 +83,11 @@ class CoreNlpClient(StanfordCoreNLP):
 
         params = {'properties': str(properties), 'pipelineLanguage': self.lang}
 
-        r = requests.post(self.url, params=params, data=sentence)
-        r_dict = json.loads(r.text)
+        with metrics.timer('corenlp_request'):
+            r = requests.post(self.url, params=params, data=sentence)
+
+        with metrics.timer('corenlp_decode'):
+            r_dict = json.loads(r.text)
 
         return r_dict
 
@@ -1,5 +1,4 @@
-from collections import namedtuple, defaultdict
-from copy import deepcopy
+from collections import namedtuple, defaultdict, deque
 
 
 import networkx
@@ -68,6 +67,14 @@ class DepGraph(object):
     __digraph
         a networkx.DiGraph directed tree which will be used, for example, to produce lowest common ancestor
 
+    __tree_index
+        when the dag is a tree (every node but the root has a single parent), the parent and depth of each node,
+        a binary lifting table of ancestors and entry/exit times of a DFS; used to answer lowest common ancestor,
+        is-ancestor and path queries without searching the graph
+
+    __ancestors
+        when the dag is not a tree, the set of ancestors of each node queried so far
+
 
     Methods
     -------
@@ -104,8 +111,13 @@ class DepGraph(object):
 
         self.__digraph = networkx.DiGraph(list(self.__edge_to_link.keys()))
 
-        # we'll initialize __graph lazily
+        # we'll initialize __graph, __neighbors, __subtree_terminals, __tree_index and __ancestors lazily
         self.__graph = None
+        self.__neighbors = None
+        self.__subtree_terminals = None
+        self.__tree_index = None
+        self.__ancestors = {}
+        self.__indexed = False
 
         #
         self.__is_terminal = is_terminal
@@ -180,14 +192,23 @@ class DepGraph(object):
         The shortest path between 'start and 'end' represented as a deserialization of a
         list of Step objects
         """
-        if self.__graph is None:
-            self.__graph = networkx.Graph(list(self.__edge_to_link.keys()))
-
         steps = []
-        try:
-            node_list = networkx.shortest_path(self.__graph, source=start, target=end)
-        except networkx.exception.NodeNotFound:
-            return steps
+
+        tree_index = self.__get_tree_index()
+        if tree_index is not None:
+            # in a tree the path is the unique one through the lowest common ancestor
+            if start not in tree_index.depth or end not in tree_index.depth:
+                return steps
+            node_list = self.__get_tree_path(start, end)
+
+        else:
+            if self.__graph is None:
+                self.__graph = networkx.Graph(list(self.__edge_to_link.keys()))
+
+            try:
+                node_list = networkx.shortest_path(self.__graph, source=start, target=end)
+            except networkx.exception.NodeNotFound:
+                return steps
 
         for i in range(0, len(node_list) - 1):
 
@@ -214,6 +235,245 @@ class DepGraph(object):
 
         return steps
 
+    def get_undirected_dependency_representations(self, nodes, end):
+        """
+        'get_undirected_dependency_representations' returns, for each of 'nodes', the same string as
+
+            Step.get_dependency_representation(self.get_undirected_steps(node, end)[1:])
+
+        but computes them all in a single breadth first traversal from 'end', rather than with a
+        separate shortest path search per node.
+
+        Each node's representation is passed down the traversal to the nodes it leads to. When a node can be
+        reached from 'end' by several shortest paths that spell different representations (which remote edges
+        can bring about) the representation depends on which path the shortest path search happens to pick;
+        for such nodes we fall back to 'get_undirected_steps', so that the result is always identical.
+
+        Parameters
+        ----------
+        nodes
+            nodes whose representation is required
+        end
+            last node in each path (typically the root)
+
+        Returns
+        -------
+            dictionary mapping each of 'nodes' to its representation
+        """
+        if self.__neighbors is None:
+            self.__neighbors = defaultdict(list)
+            for edge in self.__edge_to_link:
+                self.__neighbors[edge.parent].append(edge.me)
+                self.__neighbors[edge.me].append(edge.parent)
+
+        distance = {end: 0}
+        order = [end]
+        for node in order:
+            for neighbor in self.__neighbors.get(node, ()):
+                if neighbor not in distance:
+                    distance[neighbor] = distance[node] + 1
+                    order.append(neighbor)
+
+        def dependency(me, next):
+            edge = DepGraph.Edge(me, next) if DepGraph.Edge(me, next) in self.__edge_to_link else DepGraph.Edge(next, me)
+            return self.__edge_to_link[edge].dep_type
+
+        def predecessors(node):
+            return [neighbor for neighbor in self.__neighbors[node] if distance.get(neighbor) == distance[node] - 1]
+
+        # the distinct representations of the shortest paths from each node to 'end' (including the first
+        # step); we only care whether there is one or more, hence at most two are kept
+        representations = {end: ('',)}
+        for node in order[1:]:
+            node_representations = []
+            for predecessor in predecessors(node):
+                for predecessor_representation in representations[predecessor]:
+                    representation = dependency(node, predecessor) + predecessor_representation
+                    if representation not in node_representations:
+                        node_representations.append(representation)
+                if len(node_representations) > 1:
+                    break
+            representations[node] = tuple(node_representations[:2])
+
+        result = {}
+        for node in nodes:
+            if node == end or node not in self.__neighbors:
+                # no path, or one without any steps
+                result[node] = ''
+                continue
+
+            # the representation excludes the node's first step, and is thus that of the next node on the path
+            next_representations = set()
+            if node in distance:
+                next_representations = set(representation
+                                           for predecessor in predecessors(node)
+                                           for representation in representations[predecessor])
+
+            if len(next_representations) == 1:
+                result[node] = next_representations.pop()
+            else:
+                result[node] = Step.get_dependency_representation(self.get_undirected_steps(node, end)[1:])
+
+        return result
+
+    class TreeIndex(namedtuple('TreeIndex', 'parent, depth, jumps, entry, exit')):
+        """
+        'TreeIndex' holds, for each node of a tree, its 'parent' and 'depth', its ancestors 2^k levels up
+        ('jumps[k]', the root being its own ancestor), and the 'entry' and 'exit' times of a DFS of the tree
+        (a node is an ancestor of another iff it's entered before and exited after it)
+        """
+
+    def __build_index(self):
+        """
+        builds a 'TreeIndex' when the dag is a tree (a single root, from which all nodes are reached, each
+        through a single parent)
+        """
+
+        self.__indexed = True
+
+        nodes = list(self.__digraph.nodes)
+        roots = [node for node in nodes if self.__digraph.in_degree(node) == 0]
+        if len(roots) != 1 or any(self.__digraph.in_degree(node) > 1 for node in nodes):
+            return
+
+        root = roots[0]
+        parent = {root: root}
+        depth = {root: 0}
+        entry = {}
+        exit = {}
+
+        time = 0
+        to_visit = [(root, False)]
+        while to_visit:
+            node, visited = to_visit.pop()
+            if visited:
+                exit[node] = time
+                time += 1
+                continue
+
+            entry[node] = time
+            time += 1
+            to_visit.append((node, True))
+            for child in self.__digraph.successors(node):
+                parent[child] = node
+                depth[child] = depth[node] + 1
+                to_visit.append((child, False))
+
+        # nodes on a cycle aren't reached from the root
+        if len(entry) != len(nodes):
+            return
+
+        jumps = [parent]
+        for _ in range(max(depth.values()).bit_length()):
+            previous = jumps[-1]
+            jumps.append({node: previous[previous[node]] for node in previous})
+
+        self.__tree_index = DepGraph.TreeIndex(parent=parent, depth=depth, jumps=jumps, entry=entry, exit=exit)
+
+    def __get_tree_index(self):
+        if not self.__indexed:
+            self.__build_index()
+        return self.__tree_index
+
+    def __get_tree_lca(self, one, another):
+        tree_index = self.__tree_index
+
+        if tree_index.depth[one] < tree_index.depth[another]:
+            one, another = another, one
+
+        # lift the deeper node to the depth of the other
+        difference = tree_index.depth[one] - tree_index.depth[another]
+        level = 0
+        while difference:
+            if difference & 1:
+                one = tree_index.jumps[level][one]
+            difference >>= 1
+            level += 1
+
+        if one == another:
+            return one
+
+        # lift both to just below their lowest common ancestor
+        for jump in reversed(tree_index.jumps):
+            if jump[one] != jump[another]:
+                one = jump[one]
+                another = jump[another]
+
+        return tree_index.parent[one]
+
+    def __get_tree_path(self, start, end):
+        """
+        returns the nodes on the path from 'start' to 'end' in a tree, both included
+        """
+        lowest_common_ancestor = self.__get_tree_lca(start, end)
+
+        up = [start]
+        while up[-1] != lowest_common_ancestor:
+            up.append(self.__tree_index.parent[up[-1]])
+
+        down = [end]
+        while down[-1] != lowest_common_ancestor:
+            down.append(self.__tree_index.parent[down[-1]])
+
+        return up + down[-2::-1]
+
+    def is_ancestor(self, ancestor, node):
+        """
+
+        Parameters
+        ----------
+        ancestor
+            potential ancestor
+        node
+            potential descendant
+
+        Returns
+        -------
+        whether there is a (non empty) directed path from 'ancestor' to 'node'; False if either isn't in the graph
+        """
+
+        tree_index = self.__get_tree_index()
+
+        if tree_index is not None:
+            if ancestor not in tree_index.entry or node not in tree_index.entry or ancestor == node:
+                return False
+            return tree_index.entry[ancestor] < tree_index.entry[node] and tree_index.exit[node] < tree_index.exit[ancestor]
+
+        if node not in self.__digraph:
+            return False
+
+        if node not in self.__ancestors:
+            self.__ancestors[node] = frozenset(networkx.ancestors(self.__digraph, node))
+
+        return ancestor in self.__ancestors[node]
+
+    def lowest_common_ancestor(self, one, another):
+        """
+
+        Parameters
+        ----------
+        one
+            one node in the graph
+        another
+            a second node in the graph
+
+        Returns
+        -------
+        The lowest common ancestor of the two nodes (as with 'networkx.lowest_common_ancestor', a node is
+        considered its own ancestor); networkx.NodeNotFound is raised if either node isn't in the graph
+        """
+
+        tree_index = self.__get_tree_index()
+
+        if tree_index is None:
+            return networkx.lowest_common_ancestor(self.__digraph, one, another)
+
+        for node in (one, another):
+            if node not in tree_index.depth:
+                raise networkx.NodeNotFound('Node {0} is not in the graph'.format(node))
+
+        return self.__get_tree_lca(one, another)
+
     def get_links_of_lca_subgraph(self, one, another):
         """
 
@@ -230,31 +490,48 @@ class DepGraph(object):
         in DFS order
         """
 
-        lowest_common_ancestor = networkx.lowest_common_ancestor(self.__digraph, one, another)
+        return self.__get_subtree_links(self.lowest_common_ancestor(one, another))
+
+    def __get_subtree_links(self, subtree_root):
+        """
+        returns the links of the sub-graph rooted at 'subtree_root', in BFS order; links are immutable, and
+        are thus shared with this graph rather than copied
+        """
 
         links = []
-        to_visit = [(None,lowest_common_ancestor)]
+        to_visit = deque([(None, subtree_root)])
 
         while to_visit:
-            parent_node, current_node = to_visit.pop()
+            parent_node, current_node = to_visit.popleft()
 
             if parent_node != None:
-                link = deepcopy(self.__edge_to_link[(parent_node, current_node)])
-                links.append(link)
+                links.append(self.__edge_to_link[(parent_node, current_node)])
 
             for child_node in self.__digraph.successors(current_node):
-                to_visit.insert(0, (current_node, child_node) )
-
+                to_visit.append((current_node, child_node))
 
+        return links
 
+    def __get_subtree_terminals(self):
+        """
+        returns a map from each node to the (frozen) set of terminals in the sub-graph rooted at it; the
+        sets are computed for all nodes at once, in a single pass over the nodes in reverse topological
+        order (so that a node's children are always handled before it), and only on first use
+        """
 
-        # subgraph = networkx.ego_graph( self.__digraph, lowest_common_ancestor, 1000)
-        # for edge in  networkx.dfs_edges(subgraph):
-        #     link = deepcopy(self.__edge_to_link[edge])
-        #     links.append(link)
+        if self.__subtree_terminals is None:
+            subtree_terminals = {}
+            for node in reversed(list(networkx.topological_sort(self.__digraph))):
+                terminals = set()
+                for child_node in self.__digraph.successors(node):
+                    if self.__is_terminal(child_node):
+                        terminals.add(child_node)
+                    terminals.update(subtree_terminals[child_node])
+                subtree_terminals[node] = frozenset(terminals)
 
-        return links
+            self.__subtree_terminals = subtree_terminals
 
+        return self.__subtree_terminals
 
     def get_minimal_subgraph(self, one, another, compare_by):
         """
@@ -275,34 +552,13 @@ class DepGraph(object):
 
         common_ancestors  = set(ancestors_one).intersection(ancestors_another)
 
-        common_ancestor_to_subtrees = {}
-        for common_ancestor in common_ancestors:
-
-            links = []
-            to_visit = [(None,common_ancestor)]
-
-            while to_visit:
-                parent_node, current_node = to_visit.pop()
-
-                if parent_node != None:
-                    link = deepcopy(self.__edge_to_link[(parent_node, current_node)])
-                    links.append(link)
-
-                for child_node in self.__digraph.successors(current_node):
-                    to_visit.insert(0, (current_node, child_node) )
-
-            subtree = DepGraph(links, self.__is_terminal)
-#            terminals = subtree.get_terminals()
-
-            common_ancestor_to_subtrees[common_ancestor] = subtree
-
-        sorted_subtrees = sorted(common_ancestor_to_subtrees.values(),key = lambda l : compare_by(l.get_terminals(),one,another))
-
-        if len(sorted_subtrees) > 0:
-            return sorted_subtrees[0]
-
-        else:
+        if len(common_ancestors) == 0:
             return None
 
+        # choose the minimal common ancestor by the terminals of its sub-graph, and only then construct a
+        # DepGraph for its sub-graph; on a tie the first in iteration order wins, as with a stable sort
+        subtree_terminals = self.__get_subtree_terminals()
+        minimal_common_ancestor = min(common_ancestors,
+                                      key=lambda common_ancestor: compare_by(list(subtree_terminals[common_ancestor]), one, another))
 
-
+        return DepGraph(self.__get_subtree_links(minimal_common_ancestor), self.__is_terminal)
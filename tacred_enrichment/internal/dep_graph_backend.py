@@ -0,0 +1,44 @@
+import os
+
+from tacred_enrichment.internal.array_dep_graph import ArrayDepGraph
+from tacred_enrichment.internal.dep_graph import DepGraph
+
+# the environment variable naming the DepGraph implementation to use; being part of the environment, the
+# choice is inherited by worker processes
+BACKEND_VARIABLE = 'TACRED_DEP_GRAPH_BACKEND'
+
+BACKENDS = {
+    'networkx': DepGraph,
+    'array': ArrayDepGraph,
+}
+
+DEFAULT_BACKEND = 'networkx'
+
+
+def set_dep_graph_backend(backend):
+    """
+    'set_dep_graph_backend' selects the DepGraph implementation that 'create_dep_graph' constructs,
+    for this process and any process it starts
+
+    Parameters
+    ----------
+    backend
+        'networkx' (DepGraph) or 'array' (ArrayDepGraph); a ValueError is raised for any other value
+    """
+    if backend not in BACKENDS:
+        raise ValueError('unknown DepGraph backend {0}, expected one of: {1}'.format(backend, ', '.join(BACKENDS)))
+
+    os.environ[BACKEND_VARIABLE] = backend
+
+
+def create_dep_graph(links, is_terminal=lambda x: True):
+    """
+    'create_dep_graph' constructs a dependency graph over 'links' using the selected implementation
+    (see 'set_dep_graph_backend'); both implementations have the same methods and give the same results
+
+    """
+    backend = os.environ.get(BACKEND_VARIABLE, DEFAULT_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError('unknown DepGraph backend {0} in {1}, expected one of: {2}'.format(backend, BACKEND_VARIABLE, ', '.join(BACKENDS)))
+
+    return BACKENDS[backend](links, is_terminal)
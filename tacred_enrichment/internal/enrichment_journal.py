@@ -0,0 +1,107 @@
+import json
+import os
+from collections import namedtuple
+
+
+class EnrichmentJournal(object):
+    """
+    'EnrichmentJournal' keeps track of the progress of a long running enrichment job, so that it may be
+    resumed should it be interrupted. The journal is a small json file that lives next to the output file
+    ('<output-file>.journal'), and is rewritten (atomically) each time a set of entries is committed to
+    the output.
+
+    Attributes
+    ----------
+    Progress
+        the content of the journal: the byte offset in the input following the last committed entry (or
+        None if the input isn't read as json lines), the byte size of the output at that point, and the
+        number of input entries committed
+
+    Methods
+    -------
+    load
+        returns the last committed 'Progress', or None if there isn't one
+    commit
+        records a new 'Progress'
+    read_json_lines
+        iterates over a binary json lines stream, yielding each entry along with the offset that follows it
+
+    """
+
+    Progress = namedtuple('Progress', 'input_offset, output_offset, count')
+
+    def __init__(self, output_file, input_file=None):
+        """
+
+        Parameters
+        ----------
+        output_file
+            path of the enrichment output; the journal is kept alongside it
+        input_file
+            path of the enrichment input; recorded in the journal so that we don't resume against the
+            wrong input
+        """
+        self.__journal_file = output_file + '.journal'
+        self.__input_file = os.path.abspath(input_file) if input_file is not None else None
+
+    def load(self):
+
+        if not os.path.exists(self.__journal_file):
+            return None
+
+        with open(self.__journal_file, encoding='utf-8') as journal:
+            content = json.load(journal)
+
+        if content.get('input') != self.__input_file:
+            raise ValueError('journal \'{0}\' was recorded for input \'{1}\''.format(self.__journal_file, content.get('input')))
+
+        return EnrichmentJournal.Progress(content['input_offset'], content['output_offset'], content['count'])
+
+    def commit(self, progress):
+
+        content = {'input': self.__input_file,
+                   'input_offset': progress.input_offset,
+                   'output_offset': progress.output_offset,
+                   'count': progress.count}
+
+        # write to a temporary file and rename, so that a crash mid write never leaves a corrupt journal
+        temporary_file = self.__journal_file + '.tmp'
+        with open(temporary_file, 'w', encoding='utf-8') as journal:
+            json.dump(content, journal)
+
+        os.replace(temporary_file, self.__journal_file)
+
+    @staticmethod
+    def prepare_output_for_resume(output_file, progress):
+        """
+        'prepare_output_for_resume' drops anything that was written to 'output_file' after the last
+        commit, so that the resumed run can append to it
+
+        """
+        if os.path.getsize(output_file) > progress.output_offset:
+            os.truncate(output_file, progress.output_offset)
+
+    @staticmethod
+    def read_json_lines(input_stream, offset=0):
+        """
+        'read_json_lines' reads json lines from a binary stream, starting at 'offset'
+
+        Parameters
+        ----------
+        input_stream
+            binary stream; it must be seekable if 'offset' is not 0
+        offset
+            byte offset from which to start reading
+
+        Returns
+        -------
+            generator of (offset following the entry, entry) tuples
+        """
+        if offset > 0:
+            input_stream.seek(offset)
+
+        for line in input_stream:
+            offset += len(line)
+
+            if line.strip():
+                yield offset, json.loads(line.decode('utf-8'))
@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+from collections import deque, namedtuple
+
+from tacred_enrichment.internal.enrichment_journal import EnrichmentJournal
+
+
+class Rejection(namedtuple('Rejection', 'id, stage, reason')):
+    """
+    A 'Rejection' stands in for a TACRED entry that was dropped from the enriched output: it holds the
+    entry's id, the stage at which it failed ('parse', 'alignment' or 'passage_lookup') and why. Rejections
+    are written, one json object per line, to a rejects file, whose entries can then be retried.
+    """
+
+
+def read_rejected_ids(rejects_file):
+    """
+    'read_rejected_ids' returns the distinct entry ids of a rejects file, in order of appearance (an entry
+    may appear more than once, if it failed again or if a run was resumed after it was rejected)
+
+    """
+    entry_ids = []
+    seen = set()
+
+    with open(rejects_file, encoding='utf-8') as rejects_stream:
+        for line in rejects_stream:
+            if not line.strip():
+                continue
+
+            entry_id = json.loads(line)['id']
+            if entry_id not in seen:
+                seen.add(entry_id)
+                entry_ids.append(entry_id)
+
+    return entry_ids
+
+
+def select_entries(input_stream, entry_ids, selected_stream):
+    """
+    'select_entries' copies the entries of the (binary json lines) 'input_stream' whose id is in 'entry_ids'
+    to the binary 'selected_stream', and returns the position of every entry of the input, by id
+
+    """
+    entry_ids = set(entry_ids)
+    positions = {}
+
+    for position, (_, item) in enumerate(EnrichmentJournal.read_json_lines(input_stream, 0)):
+        positions[item['id']] = position
+
+        if item['id'] in entry_ids:
+            selected_stream.write((json.dumps(item) + '\n').encode('utf-8'))
+
+    return positions
+
+
+def splice_entries(output_file, spliced_stream, positions):
+    """
+    'splice_entries' merges the enriched entries of the (text json lines) 'spliced_stream' into the json lines
+    'output_file', each at the place its 'positions' (see 'select_entries') puts it among the output's entries.
+    An output entry with the id of a spliced one is replaced by it. The merged output is thus in input order, as
+    that of a full run is, rather than in id order. It's written to a temporary file that then replaces
+    'output_file', so it's never left half written.
+
+    """
+    spliced = []
+    for line in spliced_stream:
+        if line.strip():
+            spliced.append((positions[json.loads(line)['id']], line))
+
+    spliced.sort(key=lambda position_and_line: position_and_line[0])
+    spliced_ids = set(json.loads(line)['id'] for _, line in spliced)
+    pending = deque(spliced)
+
+    output_directory = os.path.dirname(os.path.abspath(output_file))
+    merged = tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', dir=output_directory, delete=False)
+
+    try:
+        with merged, open(output_file, encoding='utf-8', newline='') as output_stream:
+
+            for line in output_stream:
+                if not line.strip():
+                    continue
+
+                entry_id = json.loads(line)['id']
+                if entry_id in spliced_ids:
+                    continue
+
+                # entries that aren't in the input (which should not happen) are kept where they are
+                position = positions.get(entry_id)
+                while pending and position is not None and pending[0][0] < position:
+                    merged.write(pending.popleft()[1])
+
+                merged.write(line)
+
+            while pending:
+                merged.write(pending.popleft()[1])
+
+        shutil.copymode(output_file, merged.name)
+        os.replace(merged.name, output_file)
+
+    except BaseException:
+        os.unlink(merged.name)
+        raise
+
+
+def retry_entries(input_file, output_file, entry_ids, enhance):
+    """
+    'retry_entries' enhances only the entries of 'input_file' whose id is in 'entry_ids' (typically those of a
+    rejects file) and splices the enhanced ones into 'output_file' - the output of an earlier run over the same
+    input - where a full run would have put them, in input order. Output entries with the same id are replaced,
+    while those that are rejected again are left as they were. 'enhance' is called with a binary stream of the
+    selected entries and a text stream to write the enhanced ones to.
+
+    """
+    output_directory = os.path.dirname(os.path.abspath(output_file))
+
+    with open(input_file, 'rb') as input_stream, tempfile.TemporaryFile(dir=output_directory) as selected_stream, \
+            tempfile.TemporaryFile('w+', encoding='utf-8', newline='', dir=output_directory) as enhanced_stream:
+
+        positions = select_entries(input_stream, entry_ids, selected_stream)
+
+        unknown = [entry_id for entry_id in entry_ids if entry_id not in positions]
+        if unknown:
+            print('{0} of the ids are not in the input, e.g. {1}'.format(len(unknown), unknown[0]), file=sys.stderr)
+
+        selected_stream.seek(0)
+        enhance(selected_stream, enhanced_stream)
+
+        enhanced_stream.seek(0)
+        splice_entries(output_file, enhanced_stream, positions)
@@ -0,0 +1,27 @@
+import signal
+
+
+class GracefulStop(object):
+    """
+    'GracefulStop' replaces the default SIGTERM and SIGINT behaviour with one that merely records that a
+    stop was requested, so that long running jobs can finish writing the current entry and checkpoint
+    before exiting. A second signal interrupts immediately.
+
+    Attributes
+    ----------
+    requested
+        True once SIGTERM or SIGINT have been received
+
+    """
+
+    def __init__(self):
+        self.requested = False
+
+        signal.signal(signal.SIGTERM, self.__handler)
+        signal.signal(signal.SIGINT, self.__handler)
+
+    def __handler(self, signum, frame):
+        if self.requested:
+            raise KeyboardInterrupt()
+
+        self.requested = True
@@ -0,0 +1,71 @@
+import itertools
+from collections import deque
+
+import networkx
+
+
+class HeadDistances(object):
+    """
+    'HeadDistances' computes, for a sentence whose dependency structure is given as an array of heads,
+    the distance of each token from the shortest path between the subject and the object. The graph is
+    undirected, and its nodes are the tokens (0 based) plus a virtual root node (-1); in addition, all
+    tokens of the subject are connected to one another, as are all tokens of the object.
+
+    The shortest subject-object path is found once, and the distances of all tokens from it are then
+    computed in a single breadth first search seeded with all the nodes on the path - linear in the size
+    of the sentence.
+
+    Heads are given per token as a list of 1 based head indices (0 being the root), which accommodates
+    multi-headed representations such as 'ucca_deps'; single headed arrays such as 'corenlp_heads' can
+    be converted with 'as_multi_heads'.
+
+    """
+
+    # distance assigned to tokens that are not connected to the path
+    UNREACHABLE = 1e12
+
+    @staticmethod
+    def as_multi_heads(heads):
+        return [[head] for head in heads]
+
+    @staticmethod
+    def distances_from_path(multi_heads, subj, obj):
+        """
+
+        Parameters
+        ----------
+        multi_heads
+            for each token, the list of its (1 based) heads
+        subj
+            0 based indices of the subject's tokens
+        obj
+            0 based indices of the object's tokens
+
+        Returns
+        -------
+            list holding the distance of each token from the shortest path between the first subject token
+            and the first object token; networkx.NetworkXNoPath is raised if there is no such path
+        """
+        sent_len = len(multi_heads)
+
+        edges = {(head_id-1, id): True for id in range(sent_len) for head_id in multi_heads[id]}
+
+        extended_edges = edges.copy()
+        for edge in itertools.combinations(subj, 2):
+            extended_edges[edge] = True
+        for edge in itertools.combinations(obj, 2):
+            extended_edges[edge] = True
+
+        graph = networkx.Graph(list(extended_edges.keys()))
+        on_path = networkx.shortest_path(graph, source=subj[0], target=obj[0])
+
+        distances = {node: 0 for node in on_path}
+        to_visit = deque(on_path)
+        while to_visit:
+            node = to_visit.popleft()
+            for neighbor in graph.adj[node]:
+                if neighbor not in distances:
+                    distances[neighbor] = distances[node] + 1
+                    to_visit.append(neighbor)
+
+        return [distances.get(token_id, HeadDistances.UNREACHABLE) for token_id in range(sent_len)]
@@ -1,6 +1,6 @@
 from collections import namedtuple
 
-import networkx
+from tacred_enrichment.internal.dep_graph_backend import create_dep_graph
 
 
 
@@ -57,35 +57,14 @@ class Link(namedtuple('Link', 'word, word_index, parent, parent_index, dep_type'
         ancestor to all others) the first node in 'nodes' will be returned
 
         """
-        graph = Link.__get_networkx_digraph(links)
+        graph = create_dep_graph(links)
 
         for potential_head in indices:
-            descendants = networkx.descendants(graph, potential_head)
-            nodes_without_potential_head = list(filter(lambda x: x != potential_head, indices))
-
-            found_head = True
-            for potential_descendant in nodes_without_potential_head:
-                if potential_descendant not in descendants:
-                    found_head = False
-                    break
+            found_head = all(graph.is_ancestor(potential_head, potential_descendant)
+                             for potential_descendant in indices if potential_descendant != potential_head)
 
             if found_head:
                 return potential_head
 
         # if we can't find a head, by convention we just return the first node
         return indices[0]
-
-
-
-    @staticmethod
-    def __get_networkx_digraph(links):
-        """
-        internal method that converts a list of Link objects into an instance of 'networkx.DiGraph'
-        """
-        edges = []
-        for link in links:
-            edges.append((link.parent_index, link.word_index))
-
-        digraph = networkx.DiGraph(edges)
-        return digraph
-
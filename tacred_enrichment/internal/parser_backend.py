@@ -0,0 +1,140 @@
+import hashlib
+import pickle
+import sqlite3
+
+from tacred_enrichment.internal.ucca_types import UccaParsedPassage
+
+# the parser backends 'create_parser' supports: 'live' parses with TUPA, 'record:<file>' parses with TUPA and records
+# every parse in a file, and 'replay:<file>' serves the parses recorded in a file, without TUPA
+LIVE = 'live'
+RECORD = 'record'
+REPLAY = 'replay'
+
+
+def parse_parser_backend(backend):
+    """
+    'parse_parser_backend' splits a parser backend specification ('live', 'record:<file>' or 'replay:<file>')
+    into the backend and its file (None for 'live'); a ValueError is raised for any other specification
+
+    """
+    if backend == LIVE:
+        return LIVE, None
+
+    kind, _, backend_file = backend.partition(':')
+    if kind not in (RECORD, REPLAY) or not backend_file:
+        raise ValueError('unknown parser backend {0}, expected one of: {1}, {2}:<file>, {3}:<file>'.format(backend, LIVE, RECORD, REPLAY))
+
+    return kind, backend_file
+
+
+class ParseRecording(object):
+    """
+    'ParseRecording' is a file of UCCA parses keyed by a hash of their (sanitized) sentence, as recorded by
+    'RecordingTupaParser' and replayed by 'ReplayTupaParser'. It's an sqlite file holding, per sentence, the
+    serialized 'UccaParsedPassage' along with a pickle of its native ucca passage (as in 'UccaParseCache').
+
+    Methods
+    -------
+    put
+        records the UccaParsedPassage of a sentence
+    load
+        returns all recorded parses, keyed by sentence hash
+    key
+        returns the hash a sentence's parse is recorded under
+
+    """
+
+    def __init__(self, recording_file):
+
+        # several worker processes may record to the same file, hence the generous timeout and WAL mode
+        self.__connection = sqlite3.connect(recording_file, timeout=60, isolation_level=None)
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS passages (key TEXT PRIMARY KEY, serialization TEXT, native BLOB)')
+
+    @staticmethod
+    def key(sentence):
+        return hashlib.sha1(sentence.encode('utf-8')).hexdigest()
+
+    def put(self, sentence, parsed_passage):
+
+        native = pickle.dumps(parsed_passage.native, protocol=pickle.HIGHEST_PROTOCOL) if parsed_passage.native is not None else None
+
+        self.__connection.execute('INSERT OR REPLACE INTO passages VALUES (?, ?, ?)',
+                                  (ParseRecording.key(sentence), parsed_passage.serialize(), native))
+
+    def load(self):
+        """
+        'load' returns a dict mapping the hash of each recorded sentence to its serialized passage and native
+        pickle (None if it had no native passage)
+
+        """
+        return {key: (serialization, native)
+                for key, serialization, native in self.__connection.execute('SELECT key, serialization, native FROM passages')}
+
+
+class RecordingTupaParser(object):
+    """
+    'RecordingTupaParser' wraps a 'TupaParser' (or a 'CachedTupaParser'), exposing the same 'parse_sentence'
+    and 'parse_sentences' methods, and records every parse it returns in a 'ParseRecording'
+
+    """
+
+    def __init__(self, parser, recording):
+        self.parser = parser
+        self.__recording = recording
+
+        # sentences this instance has recorded, which needn't be recorded again
+        self.__recorded_keys = set()
+
+    def __record(self, sentence, parsed_passage):
+
+        key = ParseRecording.key(sentence)
+        if parsed_passage is None or key in self.__recorded_keys:
+            return
+
+        self.__recorded_keys.add(key)
+        self.__recording.put(sentence, parsed_passage)
+
+    def parse_sentence(self, sentence):
+
+        parsed_passage = self.parser.parse_sentence(sentence)
+        self.__record(sentence, parsed_passage)
+
+        return parsed_passage
+
+    def parse_sentences(self, sentences):
+
+        parsed_passages = self.parser.parse_sentences(sentences)
+        for sentence, parsed_passage in zip(sentences, parsed_passages):
+            self.__record(sentence, parsed_passage)
+
+        return parsed_passages
+
+
+class ReplayTupaParser(object):
+    """
+    'ReplayTupaParser' stands in for a 'TupaParser', exposing the same 'parse_sentence' and 'parse_sentences'
+    methods, but rather than parsing it serves the parses of a 'ParseRecording', so no TUPA model is needed.
+    The whole recording is read into memory once; a sentence missing from it fails to parse (None is returned).
+
+    """
+
+    def __init__(self, recording_file):
+        self.__recorded = ParseRecording(recording_file).load()
+
+    def parse_sentence(self, sentence):
+
+        recorded = self.__recorded.get(ParseRecording.key(sentence))
+        if recorded is None:
+            return None
+
+        serialization, native = recorded
+
+        # each call decodes a passage of its own, as parsing would, so callers may hold on to it (or modify it)
+        parsed_passage = UccaParsedPassage.from_serialization(serialization)
+        parsed_passage.native = pickle.loads(native) if native is not None else None
+
+        return parsed_passage
+
+    def parse_sentences(self, sentences):
+        return [self.parse_sentence(sentence) for sentence in sentences]
@@ -0,0 +1,68 @@
+import sys
+from collections import namedtuple
+
+from tacred_enrichment.internal.parser_backend import LIVE, RECORD, REPLAY, ParseRecording, RecordingTupaParser, ReplayTupaParser, parse_parser_backend
+from tacred_enrichment.internal.tupa_parser import TupaParser
+from tacred_enrichment.internal.ucca_parse_cache import UccaParseCache, CachedTupaParser
+
+
+class ParserSettings(namedtuple('ParserSettings', 'model_prefix, backend, cache_file, cache_size, cache_fingerprint, '
+                                                  'annotation_batch_size, annotation_processes')):
+    """
+    'ParserSettings' holds everything needed to create the parser of an enrichment run (see 'create_parser'), in
+    whichever process parses: the TUPA 'model_prefix', the parser 'backend' ('live', 'record:<file>' or
+    'replay:<file>'), the parse cache's file, size cap and model fingerprint (the file being None for no cache),
+    and the number of sentences spaCy annotates at a time and of processes it does so with.
+    Use 'ParserSettings.create', which takes the model fingerprint once, in the calling process.
+    """
+
+    @staticmethod
+    def create(model_prefix, backend=LIVE, cache_file=None, cache_size=None, cache_hash_model=False,
+               annotation_batch_size=TupaParser.DEFAULT_ANNOTATION_BATCH_SIZE, annotation_processes=1):
+        """
+        'create' returns the ParserSettings of the given arguments, fingerprinting the model (see
+        'UccaParseCache.model_fingerprint') if a 'cache_file' is given
+
+        """
+        cache_fingerprint = UccaParseCache.model_fingerprint(model_prefix, cache_hash_model) if cache_file is not None else None
+
+        return ParserSettings(model_prefix, backend, cache_file, cache_size, cache_fingerprint, annotation_batch_size, annotation_processes)
+
+
+def create_parser(settings):
+    """
+    'create_parser' returns a TupaParser, wrapped with a parse cache if the 'settings' have a cache file, and with a
+    recording of its parses for a 'record:<file>' backend; for a 'replay:<file>' one it returns a ReplayTupaParser
+    instead (and the model isn't used)
+
+    """
+    backend, backend_file = parse_parser_backend(settings.backend)
+    if backend == REPLAY:
+        return ReplayTupaParser(backend_file)
+
+    parser = TupaParser(settings.model_prefix, settings.annotation_batch_size, settings.annotation_processes)
+
+    if settings.cache_file is not None:
+        cache = UccaParseCache(settings.cache_file, settings.cache_fingerprint, settings.cache_size)
+        parser = CachedTupaParser(parser, cache)
+
+    if backend == RECORD:
+        parser = RecordingTupaParser(parser, ParseRecording(backend_file))
+
+    return parser
+
+
+def get_cache_stats(parser):
+    if isinstance(parser, RecordingTupaParser):
+        parser = parser.parser
+
+    return (parser.cache.hits, parser.cache.misses) if isinstance(parser, CachedTupaParser) else None
+
+
+def report_cache_stats(cache_stats):
+    if len(cache_stats) == 0:
+        return
+
+    hits = sum(stats[0] for stats in cache_stats)
+    misses = sum(stats[1] for stats in cache_stats)
+    print('parse cache: {0} hits, {1} misses'.format(hits, misses), file=sys.stderr)
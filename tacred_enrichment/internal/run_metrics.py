@@ -0,0 +1,237 @@
+import heapq
+import json
+import math
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+class LatencyHistogram(object):
+    """
+    'LatencyHistogram' summarizes the durations of the calls to a stage in bounded memory: it counts them in
+    logarithmic buckets, each 'GROWTH' times as wide as the one before, so a percentile it gives is within half a
+    bucket (about 1%) of the exact one, however many calls there were. Histograms of different processes are
+    merged by adding up their counts.
+
+    Methods
+    -------
+    add
+        records a duration
+    merge
+        adds the durations recorded by another histogram
+    percentile
+        returns (approximately) the duration below which the given percentage of the recorded ones fall
+
+    """
+
+    GROWTH = 1.02
+
+    # durations this short (in seconds) all fall in the first bucket
+    SHORTEST = 1e-7
+
+    __slots__ = ('calls', 'seconds', 'shortest', 'longest', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.shortest = None
+        self.longest = None
+        self.buckets = Counter()
+
+    def add(self, seconds):
+        self.calls += 1
+        self.seconds += seconds
+        self.shortest = seconds if self.shortest is None else min(self.shortest, seconds)
+        self.longest = seconds if self.longest is None else max(self.longest, seconds)
+        self.buckets[math.floor(math.log(max(seconds, LatencyHistogram.SHORTEST), LatencyHistogram.GROWTH))] += 1
+
+    def merge(self, other):
+        if other.calls == 0:
+            return
+
+        self.calls += other.calls
+        self.seconds += other.seconds
+        self.shortest = other.shortest if self.shortest is None else min(self.shortest, other.shortest)
+        self.longest = other.longest if self.longest is None else max(self.longest, other.longest)
+        self.buckets.update(other.buckets)
+
+    def percentile(self, percentile):
+        # the duration ranked as the exact percentile of the sorted durations would be (with index
+        # 'calls * percentile / 100'), estimated by the middle of its bucket
+        rank = min(self.calls - 1, int(self.calls * percentile / 100))
+
+        for bucket in sorted(self.buckets):
+            rank -= self.buckets[bucket]
+            if rank < 0:
+                estimate = LatencyHistogram.GROWTH ** (bucket + 0.5)
+                return min(self.longest, max(self.shortest, estimate))
+
+        return self.longest
+
+
+class RunMetrics(object):
+    """
+    'RunMetrics' collects timings and counts over an enrichment run: the duration of each call to every
+    instrumented stage (spaCy annotation, TUPA parse, CoreNLP requests and so on), the time spent on each
+    entry - of which the slowest are kept - and failures, counted by reason. The durations of the calls to a stage
+    are counted in a LatencyHistogram, so memory doesn't grow with the length of the run.
+
+    Each process has its own instance ('metrics', below). Worker processes hand theirs over to the parent
+    process with 'drain', and the parent adds them to its own with 'merge'.
+
+    Methods
+    -------
+    timer
+        a context manager timing a call to a stage
+    add
+        records the duration of a call to a stage
+    entry
+        records the time spent on an entry
+    failure
+        counts a failure (reporting it on stderr)
+    drain
+        returns everything collected so far, and starts over
+    merge
+        adds what another instance's 'drain' returned
+    summary
+        returns a (multi line) human readable summary
+    maybe_report
+        prints the summary to stderr if enough time has passed since it was last printed
+    write
+        writes all statistics to a json file
+    reset
+        discards everything collected, and restarts the clock
+
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, slowest_count=10):
+        self.__slowest_count = slowest_count
+        self.reset()
+
+    def reset(self):
+        self.__started = time.time()
+        self.__last_report = self.__started
+        self.__clear()
+
+    def __clear(self):
+        # per stage: a histogram of the durations of its calls, and the number of items handled by all calls together
+        self.__durations = {}
+        self.__items = Counter()
+        self.__entries = 0
+        self.__failures = Counter()
+        self.__slowest = []
+
+    @contextmanager
+    def timer(self, stage, count=1):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, count)
+
+    def add(self, stage, seconds, count=1):
+        durations = self.__durations.get(stage)
+        if durations is None:
+            durations = self.__durations[stage] = LatencyHistogram()
+
+        durations.add(seconds)
+        self.__items[stage] += count
+
+    def entry(self, entry_id, seconds):
+        self.__entries += 1
+        self.__keep_if_slow(entry_id, seconds)
+
+    def __keep_if_slow(self, entry_id, seconds):
+        if len(self.__slowest) < self.__slowest_count:
+            heapq.heappush(self.__slowest, (seconds, entry_id))
+        elif seconds > self.__slowest[0][0]:
+            heapq.heapreplace(self.__slowest, (seconds, entry_id))
+
+    def failure(self, reason):
+        self.__failures[reason] += 1
+        print(reason, file=sys.stderr)
+
+    def drain(self):
+        state = {'durations': self.__durations, 'items': self.__items, 'entries': self.__entries,
+                 'failures': self.__failures, 'slowest': self.__slowest}
+        self.__clear()
+
+        return state
+
+    def merge(self, state):
+        for stage, durations in state['durations'].items():
+            self.__durations.setdefault(stage, LatencyHistogram()).merge(durations)
+
+        self.__items.update(state['items'])
+        self.__entries += state['entries']
+        self.__failures.update(state['failures'])
+
+        for seconds, entry_id in state['slowest']:
+            self.__keep_if_slow(entry_id, seconds)
+
+    def statistics(self):
+        """
+        'statistics' returns all that was collected as a json serializable dict: per stage, the number of calls,
+        of items handled, the total time, the throughput (items per second spent in the stage) and latency
+        percentiles of a call (in milliseconds, estimated by 'LatencyHistogram'); along with the overall entry
+        throughput, the slowest entries and the failure counts
+
+        """
+        elapsed = time.time() - self.__started
+
+        stages = {}
+        for stage, durations in self.__durations.items():
+            total = durations.seconds
+
+            stages[stage] = {'calls': durations.calls,
+                             'items': self.__items[stage],
+                             'seconds': round(total, 3),
+                             'items_per_second': round(self.__items[stage] / total, 2) if total > 0 else None}
+
+            for percentile in RunMetrics.PERCENTILES:
+                stages[stage]['p{0}_ms'.format(percentile)] = round(durations.percentile(percentile) * 1000, 3)
+
+        return {'elapsed_seconds': round(elapsed, 3),
+                'entries': self.__entries,
+                'entries_per_second': round(self.__entries / elapsed, 2) if elapsed > 0 else None,
+                'stages': stages,
+                'slowest_entries': [{'id': entry_id, 'seconds': round(seconds, 4)} for seconds, entry_id in sorted(self.__slowest, reverse=True)],
+                'failures': dict(self.__failures.most_common())}
+
+    def summary(self):
+        statistics = self.statistics()
+
+        lines = ['{0} entries in {1:.0f}s ({2} entries/s)'.format(statistics['entries'], statistics['elapsed_seconds'],
+                                                                  statistics['entries_per_second'])]
+
+        for stage, stage_statistics in sorted(statistics['stages'].items(), key=lambda x: -x[1]['seconds']):
+            lines.append('  {0}: {1}s, {2} items/s, p50 {3}ms, p95 {4}ms, p99 {5}ms'.format(
+                stage, stage_statistics['seconds'], stage_statistics['items_per_second'],
+                stage_statistics['p50_ms'], stage_statistics['p95_ms'], stage_statistics['p99_ms']))
+
+        for reason, count in statistics['failures'].items():
+            lines.append('  failed {0} times: {1}'.format(count, reason))
+
+        return '\n'.join(lines)
+
+    def maybe_report(self, interval):
+        """
+        'maybe_report' prints the summary to stderr once every 'interval' seconds (never if it's None)
+
+        """
+        if interval is None or time.time() - self.__last_report < interval:
+            return
+
+        self.__last_report = time.time()
+        print(self.summary(), file=sys.stderr)
+
+    def write(self, stats_file):
+        with open(stats_file, 'w', encoding='utf-8') as file:
+            json.dump(self.statistics(), file, indent=2)
+
+
+# the metrics of this process
+metrics = RunMetrics()
@@ -0,0 +1,70 @@
+from collections import OrderedDict, namedtuple
+
+
+class SentenceAnalysis(namedtuple('SentenceAnalysis', 'parsed_sentence, graph_index, tac_to_ucca, ucca_tokens, spacy_attributes, sentence_enhancements, failure')):
+    """
+    'SentenceAnalysis' holds everything about a TACRED sentence that doesn't depend on the subject and object
+    of a specific entry: its UCCA parse and the parse's graph index, the alignment of the TACRED tokens to the UCCA ones, the spaCy attributes
+    of the UCCA tokens, and the output of the sentence level enhancers (keyed by enhancer type). If the sentence could not be parsed or aligned,
+    'failure' (a SentenceFailure) describes why.
+    """
+
+
+class SentenceFailure(namedtuple('SentenceFailure', 'stage, reason')):
+    """
+    'SentenceFailure' is the 'failure' of a SentenceAnalysis: the stage at which the sentence failed ('parse',
+    'alignment' or 'passage_lookup') and why
+    """
+
+
+class SentenceMemo(object):
+    """
+    'SentenceMemo' remembers the analysis of the most recently seen sentences, so that TACRED entries
+    sharing a sentence (and differing only in their subject and object) don't have it parsed and analyzed
+    all over again. It's a simple LRU map keyed by the sentence's (sanitized) token tuple.
+
+    Methods
+    -------
+    get
+        returns the analysis of a sentence or None if it isn't remembered
+    put
+        remembers the analysis of a sentence, forgetting the least recently used one if full (and returning it)
+
+    """
+
+    def __init__(self, capacity):
+        """
+
+        Parameters
+        ----------
+        capacity
+            maximal number of sentences remembered; 0 disables the memo
+        """
+        self.__capacity = capacity
+        self.__memo = OrderedDict()
+
+    def get(self, tokens):
+
+        analysis = self.__memo.get(tokens)
+
+        if analysis is not None:
+            self.__memo.move_to_end(tokens)
+
+        return analysis
+
+    def put(self, tokens, analysis):
+        """
+        returns the sentence that was forgotten to make room, if any - which is 'tokens' itself if the memo is disabled
+        """
+
+        if self.__capacity == 0:
+            return tokens
+
+        self.__memo[tokens] = analysis
+        self.__memo.move_to_end(tokens)
+
+        if len(self.__memo) > self.__capacity:
+            forgotten, _ = self.__memo.popitem(last=False)
+            return forgotten
+
+        return None
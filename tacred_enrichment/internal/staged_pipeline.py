@@ -0,0 +1,133 @@
+import sys
+import traceback
+from collections import namedtuple
+from queue import Full
+from threading import Event, Thread
+
+# passed down the queues of a staged pipeline once its input is exhausted
+END_OF_INPUT = None
+
+
+class StageFailure(namedtuple('StageFailure', 'stage, details')):
+    """
+    'StageFailure' is passed down the queues of a staged pipeline in place of a result when a stage fails; each
+    stage forwards it and stops, so that it reaches the end of the pipeline where it can be raised
+    """
+
+
+def feed(stage, items, output_queue, stopping):
+    """
+    'feed' puts each of 'items' on 'output_queue', blocking while the queue is full, followed by END_OF_INPUT.
+    It's meant to run in a thread; setting the 'stopping' event makes it give up between (or while waiting on) puts
+
+    """
+    try:
+        for item in items:
+            while not stopping.is_set():
+                try:
+                    output_queue.put(item, timeout=0.1)
+                    break
+                except Full:
+                    pass
+
+            if stopping.is_set():
+                return
+
+        output_queue.put(END_OF_INPUT)
+
+    except Exception:
+        output_queue.put(StageFailure(stage, traceback.format_exc()))
+
+
+def run_stage(stage, create_handler, input_queue, output_queue):
+    """
+    'run_stage' runs a single stage of a staged pipeline: it takes each message off 'input_queue', hands it to
+    the handler and puts the handler's result on 'output_queue', until it gets END_OF_INPUT or a StageFailure,
+    which it forwards. The handler is obtained by calling 'create_handler' so that failing to set the stage up
+    is reported just like failing to handle a message.
+
+    """
+    try:
+        handle = create_handler()
+
+        while True:
+            message = input_queue.get()
+
+            if message is END_OF_INPUT or isinstance(message, StageFailure):
+                output_queue.put(message)
+                return
+
+            output_queue.put(handle(message))
+
+    except Exception:
+        output_queue.put(StageFailure(stage, traceback.format_exc()))
+
+
+class QueueDepthMonitor(object):
+    """
+    'QueueDepthMonitor' samples the depth of the queues of a staged pipeline in a background thread. A stage whose
+    input queue is mostly full is the pipeline's bottleneck, while the stages after it have mostly empty queues.
+
+    Methods
+    -------
+    start
+        starts sampling
+    stop
+        stops sampling
+    report
+        prints the mean and maximal depth of each queue, and how often it was full, to stderr
+
+    """
+
+    def __init__(self, queues, capacity, interval=0.1):
+        """
+
+        Parameters
+        ----------
+        queues
+            an ordered mapping of stage names to their (multiprocessing) input queues
+        capacity
+            the maximal size of the queues
+        interval
+            seconds between samples
+        """
+        self.__queues = queues
+        self.__capacity = capacity
+        self.__interval = interval
+        self.__samples = 0
+        self.__totals = {stage: 0 for stage in queues}
+        self.__maxima = {stage: 0 for stage in queues}
+        self.__full = {stage: 0 for stage in queues}
+        self.__stopped = Event()
+        self.__thread = Thread(target=self.__sample, daemon=True)
+
+    def start(self):
+        self.__thread.start()
+
+    def stop(self):
+        self.__stopped.set()
+        self.__thread.join()
+
+    def report(self):
+        if self.__samples == 0:
+            return
+
+        for stage in self.__queues:
+            print('queue before {0}: mean depth {1:.1f}, max {2} of {3}, full {4:.0%} of the time'.format(
+                stage, self.__totals[stage] / self.__samples, self.__maxima[stage], self.__capacity,
+                self.__full[stage] / self.__samples), file=sys.stderr)
+
+    def __sample(self):
+        while not self.__stopped.wait(self.__interval):
+            try:
+                depths = {stage: queue.qsize() for stage, queue in self.__queues.items()}
+            except NotImplementedError:
+                # 'qsize' isn't available on some platforms (macOS), in which case there's nothing to report
+                return
+
+            self.__samples += 1
+            for stage, depth in depths.items():
+                self.__totals[stage] += depth
+                self.__maxima[stage] = max(self.__maxima[stage], depth)
+                if depth >= self.__capacity:
+                    self.__full[stage] += 1
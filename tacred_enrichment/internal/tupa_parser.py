@@ -1,16 +1,14 @@
 import os
 import sys
-from collections import OrderedDict
+from collections import deque
+from itertools import groupby
 
-import networkx
 from tupa.parse import Parser
 from ucca.convert import from_text
-from ucca.core import Passage
-from ucca.layer0 import Layer0
-from ucca.layer1 import Layer1
-from ucca.textutil import annotate_all
+from ucca.textutil import get_nlp, set_docs, to_annotate
 
-from tacred_enrichment.internal.ucca_types import UccaParsedPassage, UccaEdge, UccaNode, UccaTerminalNode
+from tacred_enrichment.internal.run_metrics import metrics
+from tacred_enrichment.internal.ucca_passage_converter import UccaPassageConverter
 
 
 class TupaParser(object):
@@ -28,13 +26,26 @@ class TupaParser(object):
     # incremented after each use
     __passage_counter = 0
 
-    def __init__(self, model_prefix):
+    # the batch size ucca's own 'annotate_all' hands to spaCy
+    DEFAULT_ANNOTATION_BATCH_SIZE = 50
+
+    def __init__(self, model_prefix, annotation_batch_size=DEFAULT_ANNOTATION_BATCH_SIZE, annotation_processes=1):
         """
 
         Parameters
         ----------
+        model_prefix
+            prefix of the TUPA model files
+        annotation_batch_size
+            number of passages spaCy annotates at a time
+        annotation_processes
+            number of processes spaCy annotates with ('n_process', which requires spaCy 2.2.2 or later when
+            larger than 1)
         """
 
+        self.__annotation_batch_size = annotation_batch_size
+        self.__annotation_processes = annotation_processes
+
         # the sys.argv assignment is a necessary: without it tupa.parse.Parser will throw exceptions
         remember_argv = sys.argv
         sys.argv = ['-m', model_prefix]
@@ -45,7 +56,7 @@ class TupaParser(object):
 
         self.__parser = parser
 
-        # Since 'parse_sentence' calls 'annotate_all' which lazily instantiated a spacey pipeline,
+        # Since 'parse_sentence' calls 'get_nlp' which lazily instantiated a spacey pipeline,
         # and since we want all the initialization to occur in the __init__ method, we simply call
         # 'parse_sentence' with dummy input
         self.parse_sentence('Hello dummy world')
@@ -60,24 +71,19 @@ class TupaParser(object):
         parsed_passage = None
 
         try:
-            TupaParser.__passage_counter =+ 1
-            passage_id = TupaParser.__passage_counter =+ 1
-
-            # from_text will convert the sentence into a ucca structure.
-            # annotate_all will annotate the structure with information from the Spacy parse.
-            # annotate_all returns a generator - one that will yield only one object - hence
-            # we call next
-            unparsed_passage = next( annotate_all( from_text( sentence, passage_id, one_per_line= True) ) )
-
+            unparsed_passage = self.__annotate([sentence])[0]
 
             # The 'tupa.parse class's parse method expects a list of unparsed-message. We also need to set
             # the 'evaluate' argument to True, otherwise we get incorrect results. (Ofir Arviv advised as such).
             # The parse method also returns a generator, hence the need to call next.
             # The actual object returned is a tuple of the parsed-passage and an internal score object. We're
             # not interested in the score though, so we just extract the parsed-passage
-            parsed_passage_and_score = next( self.__parser.parse( [unparsed_passage], evaluate=True) )
+            with metrics.timer('tupa_parse'):
+                parsed_passage_and_score = next( self.__parser.parse( [unparsed_passage], evaluate=True) )
+
             internal_parsed_passage = parsed_passage_and_score[0]
-            parsed_passage = TupaParser.__get_ucca_parsed_passage_from_passage(internal_parsed_passage)
+            with metrics.timer('passage_conversion'):
+                parsed_passage = UccaPassageConverter.convert(internal_parsed_passage)
 
         finally:
             sys.stdout = reg_stdout
@@ -90,147 +96,61 @@ class TupaParser(object):
         parsed_passages = []
 
         try:
-
-            unparsed_passages = []
-            for sentence in sentences:
-
-                TupaParser.__passage_counter =+ 1
-                passage_id = TupaParser.__passage_counter =+ 1
-
-                # from_text will convert the sentence into a ucca structure.
-                # annotate_all will annotate the structure with information from the Spacy parse.
-                # annotate_all returns a generator - one that will yield only one object - hence
-                # we call next
-                unparsed_passage = next( annotate_all( from_text( sentence, passage_id, one_per_line= True) ) )
-                unparsed_passages.append(unparsed_passage)
-
+            unparsed_passages = self.__annotate(sentences)
 
             # We also need to set the 'evaluate' argument to True, otherwise we get incorrect results.
             # (Ofir Arviv advised as such).
             # The parse method also returns a generator, hence the need to call next.
             # The actual object returned is a tuple of the parsed-passage and an internal score object. We're
             # not interested in the score though, so we just extract the parsed-passage
-            for parsed_passage_and_score in self.__parser.parse( unparsed_passages, evaluate=True):
+            # the passages are parsed as they are taken off the generator, so that's what the 'tupa_parse' timer times
+            parsed_passages_and_scores = iter(self.__parser.parse( unparsed_passages, evaluate=True))
+            while True:
+                with metrics.timer('tupa_parse'):
+                    parsed_passage_and_score = next(parsed_passages_and_scores, None)
+
+                if parsed_passage_and_score is None:
+                    break
+
                 internal_parsed_passage = parsed_passage_and_score[0]
-                parsed_passage = TupaParser.__get_ucca_parsed_passage_from_passage(internal_parsed_passage)
+                with metrics.timer('passage_conversion'):
+                    parsed_passage = UccaPassageConverter.convert(internal_parsed_passage)
                 parsed_passages.append(parsed_passage)
 
         finally:
             sys.stdout = reg_stdout
             return parsed_passages
 
+    def __annotate(self, sentences):
+        """
+        '__annotate' converts each sentence into an unparsed ucca passage, and annotates all of them with
+        a single pass through spaCy's 'pipe'. The annotation itself is ucca's: its 'to_annotate' splits the
+        passages into token lists and its 'set_docs' copies the spaCy attributes into the terminals' 'extra',
+        exactly as 'annotate_all' does, only with our own batch size and number of processes
 
-    @staticmethod
-    def __get_ucca_parsed_passage_from_passage(passage: Passage):
-        ucca_parsed_passage = UccaParsedPassage(passage)
-
-        ucca_parsed_passage.terminals = []
-        ucca_parsed_passage.non_terminals = []
-        ucca_parsed_passage.edges = []
-
-        ucca_node_lookup = {}
-
-        layer0 = next(layer for layer in passage.layers if isinstance(layer, Layer0))
-        layer1 = next(layer for layer in passage.layers if isinstance(layer, Layer1))
-
-        for node in layer0.all:
-            edge_tags_in = [edge.tag for edge in node.incoming]
-            token_id = int(node.ID.split('.')[1])  # :)
-            lemma, tag, pos, ent, head =  node.extra['lemma'], node.extra['tag'], node.extra['pos'], node.extra['ent_type'], node.extra['head']
-            terminal_node = UccaTerminalNode(node.ID, edge_tags_in, token_id, node.text, lemma, tag, pos, ent, head)
-            ucca_parsed_passage.terminals.append(terminal_node)
-            ucca_node_lookup[node.ID] = terminal_node
-
-        for node in layer1.all:
-            edge_tags_in = [edge.tag for edge in node.incoming]
-            non_terminal_node = UccaNode(node.ID, edge_tags_in)
-            ucca_parsed_passage.non_terminals.append(non_terminal_node)
-            ucca_node_lookup[node.ID] = non_terminal_node
-
-        # all the edges are from layer1 nodes to their children (which can include layer0
-        # nodes)
-
-        edge_lookup = OrderedDict()
-
-
-        for node in layer1.all:
-            for edge in node.outgoing:
-                child_node = ucca_node_lookup[edge.child.ID]
-                parent_node = ucca_node_lookup[edge.parent.ID]
-
-                ucca_edge = UccaEdge(child_node, parent_node, edge.tag, 'remote' if edge.attrib.get('remote') else 'direct')
-                edge_lookup[(edge.parent.ID, edge.child.ID)] = ucca_edge
-
-                #ucca_parsed_passage.edges.append(UccaEdge(child_node, parent_node, edge.tag, 'remote' if edge.attrib.get('remote') else 'direct'))
-
-
-        # the edges as extracted in the sequence above are not in proper order - specifically children of
-        # a given parent are not in the order appropriate to the actual terminals ...
-
-        # the following code fixes this up by sorting children based on their earliest direct terminal descendant
-
-        # we'll first create a DiGraph with all the edges - this DiGraph will allow us to easily iterate over the edges
-        # in breadth first fashion (something we couldn't do by just considering the edge list)
-        digraph_with_remotes = networkx.DiGraph(list(edge_lookup.keys()))
-
-        # and then a DiGraph without remote edges - we'll use this for  sorting
-        digraph_without_remotes = networkx.DiGraph( [ edge_key for edge_key, edge in edge_lookup.items() if edge.classification == 'direct' ] )
-
-        # there might be a better way for finding the root of the dag; i didn't find one
-        root = next(networkx.topological_sort(digraph_with_remotes))
-
-        # standard stack based implementation for iterating over the dag in breadth first fashion
-        stack = [ root ]
-
-        while stack:
-            node = stack.pop()
-
-            # get all the nodes children
-            children = list(digraph_with_remotes.successors(node))
-
-            # no need to sort if there is just one child
-            if len(children) > 1:
-
-                # child_to_lowest_value_terminal will contain a mapping if each of nodes' childlren to
-                # their respective earliest terminal that it's directly connected to
-                child_to_lowest_value_terminal = {}
-                for child in children:
-
-                    # in the case of a non-terminal ...
-                    if child.split('.')[0] == '1':
-                        # only consider direct descendants (that's why we call networkx.descendants on 'digraph_without_remotes'
-                        # and not on 'digraph_with_remotes'
-                        descendants = networkx.descendants(digraph_without_remotes, child)
-
-                        # terminal descendants all have ids with a '0.x' format, where x is an integer that reflects the token
-                        # index of the terminal
-                        terminal_descendants = [ int(descendant.split('.')[1]) for descendant in descendants if descendant.split('.')[0] == '0' ]
-
-                        # get the earliest terminal id for child by sorting it terminal descendants and then
-                        # picking the first one
-                        terminal_descendants.sort()
-                        earliest_terminal_id = terminal_descendants[0]
-
-                    else:
-                        #'child' is a terminal, so it's 'earliest_terminal_id' is basically itself ..
-                        earliest_terminal_id = int(child.split('.')[1])
-
-                    child_to_lowest_value_terminal[child] = earliest_terminal_id
+        """
+        passages = []
+        for sentence in sentences:
 
-                # finally sort the children based on their earliest terminal id
-                children = [child for child, _ in sorted( child_to_lowest_value_terminal.items(), key=lambda x: x[1] ) ]
+            TupaParser.__passage_counter =+ 1
+            passage_id = TupaParser.__passage_counter =+ 1
 
-            # now we can add edges in proper order
-            for child_node in children:
-                edge = edge_lookup[(node, child_node)]
-                ucca_parsed_passage.edges.append(edge)
+            # from_text will convert the sentence into a ucca structure; it returns a generator - one that
+            # will yield only one object - hence we call next
+            passages.append(next( from_text( sentence, passage_id, one_per_line= True) ))
 
-            # we are popping from a stack so in order to treat the children in their proper
-            # order we need to push them to stack in reverse order
-            children.reverse()
-            stack += children
+        pipe_arguments = {'batch_size': self.__annotation_batch_size}
+        if self.__annotation_processes > 1:
+            pipe_arguments['n_process'] = self.__annotation_processes
 
+        with metrics.timer('spacy_annotation', count=len(passages)):
 
+            # as in 'annotate_all', paragraphs without tokens are not handed to spaCy
+            paragraphs = to_annotate(((passage,) for passage in passages), replace=False)
+            for need_annotation, stream in groupby(paragraphs, lambda x: bool(x[0])):
+                annotated = get_nlp().pipe(stream, as_tuples=True, **pipe_arguments) if need_annotation else stream
 
+                # 'set_docs' annotates the passages in place as its generator is consumed
+                deque(set_docs(annotated, as_array=False, as_extra=True, lang='en', vocab=None, replace=False, verbose=False), maxlen=0)
 
-        return ucca_parsed_passage
+        return passages
@@ -0,0 +1,262 @@
+import time
+from collections import defaultdict
+
+from more_itertools import chunked
+
+from tacred_enrichment.internal.enrichment_rejects import Rejection
+from tacred_enrichment.internal.map_tokenization import MapTokenization
+from tacred_enrichment.internal.parser_settings import create_parser, get_cache_stats, report_cache_stats
+from tacred_enrichment.internal.run_metrics import metrics
+from tacred_enrichment.internal.sanitize_tacred import SanitizeTacred
+from tacred_enrichment.internal.sentence_memo import SentenceAnalysis, SentenceFailure, SentenceMemo
+from tacred_enrichment.internal.ucca_graph_index import UccaGraphIndex
+from tacred_enrichment.internal.ucca_passage_store import UccaPassageStore
+
+
+def parse_batch(parser, sentences):
+    """
+    'parse_batch' parses a list of sentences, grouping them into buckets of identical length so that
+    each bucket goes through a single 'parse_sentences' call, and returns the parsed sentences in the
+    original order (with None for sentences that could not be parsed)
+
+    """
+
+    buckets = defaultdict(list)
+    for index, sentence in enumerate(sentences):
+        buckets[len(sentence.split(' '))].append(index)
+
+    parsed_sentences = [None] * len(sentences)
+
+    for indices in buckets.values():
+        bucket = [sentences[index] for index in indices]
+
+        if len(bucket) == 1:
+            parsed_bucket = [parser.parse_sentence(bucket[0])]
+        else:
+            parsed_bucket = parser.parse_sentences(bucket)
+
+            # 'parse_sentences' swallows errors and returns whatever it managed to parse before the failure;
+            # as we can't tell which sentence is to blame we fall back to parsing the bucket one at a time
+            if len(parsed_bucket) != len(bucket):
+                parsed_bucket = [parser.parse_sentence(sentence) for sentence in bucket]
+
+        for index, parsed_sentence in zip(indices, parsed_bucket):
+            parsed_sentences[index] = parsed_sentence
+
+    return parsed_sentences
+
+
+def analyze_sentence(enhancers, sanitized_tac_tokens, parsed_sentence):
+    """
+    'analyze_sentence' aligns the TACRED tokens of a sentence with those of its UCCA parse and runs the sentence
+    level ones of 'enhancers' over it; the resulting 'SentenceAnalysis' is shared by all entries of the sentence
+
+    """
+    if parsed_sentence is None:
+        return SentenceAnalysis(None, None, None, None, None, None, SentenceFailure('parse', 'failed to perform UCCA parse'))
+
+    ucca_tokens = [ucca_terminal.text for ucca_terminal in parsed_sentence.terminals]
+
+    with metrics.timer('map_tokenization'):
+        tac_to_ucca = MapTokenization.map_a_to_b(sanitized_tac_tokens, ucca_tokens)
+
+        #ensure tac_to_ucca is 'surjective' over 'ucca_tokens' and defined over 'sanitized_tac_tokens':
+        aligned = MapTokenization.check_surjectivity(tac_to_ucca, ucca_tokens) \
+                  and MapTokenization.check_defined(tac_to_ucca, sanitized_tac_tokens)
+
+    if not aligned:
+        return SentenceAnalysis(parsed_sentence, None, None, None, None, None,
+                                SentenceFailure('alignment', 'failed to align all UCCA and TACRED tokens for UCCA head/dep extraction'))
+
+    spacy_attributes = {'spacy_tag': [ucca_terminal.tag for ucca_terminal in parsed_sentence.terminals],
+                        'spacy_pos': [ucca_terminal.pos for ucca_terminal in parsed_sentence.terminals],
+                        'spacy_ent': [ucca_terminal.ent for ucca_terminal in parsed_sentence.terminals],
+                        'spacy_head': [ucca_terminal.head for ucca_terminal in parsed_sentence.terminals]}
+
+    # the graph index is built once here and handed to every enhancer that runs over this sentence
+    graph_index = UccaGraphIndex(parsed_sentence)
+
+    sentence_enhancements = {}
+    for enhancer in enhancers:
+        if enhancer.sentence_level:
+            with metrics.timer(enhancer_stage(enhancer)):
+                sentence_enhancements[type(enhancer)] = enhancer.enhance(None, None, parsed_sentence, graph_index)
+
+    return SentenceAnalysis(parsed_sentence, graph_index, tac_to_ucca, ucca_tokens, spacy_attributes, sentence_enhancements, None)
+
+
+def enhance_item(enhancers, item, analysis):
+    """
+    'enhance_item' adds the UCCA attributes (those of 'enhancers') to a TACRED entry based on the analysis of its
+    sentence. Returns False if the entry should be dropped.
+
+    """
+    if analysis.failure is not None:
+        metrics.failure(analysis.failure.reason)
+        return False
+
+    parsed_sentence = analysis.parsed_sentence
+    tac_to_ucca = analysis.tac_to_ucca
+
+    item['tac_to_ucca'] = tac_to_ucca
+    item['ucca_tokens'] = analysis.ucca_tokens
+
+    for spacy_key, spacy_value in analysis.spacy_attributes.items():
+        item[spacy_key] = spacy_value
+
+    for enhancer in enhancers:
+        if enhancer.sentence_level:
+            enhancement = analysis.sentence_enhancements[type(enhancer)]
+        else:
+            with metrics.timer(enhancer_stage(enhancer)):
+                enhancement = enhancer.enhance(item, tac_to_ucca, parsed_sentence, analysis.graph_index)
+
+        for enhancement_key, enhancement_value in enhancement.items():
+                item[enhancement_key] = enhancement_value
+
+    return True
+
+
+def enhancer_stage(enhancer):
+    return 'enhancer:{0}'.format(type(enhancer).__name__)
+
+
+def sanitize_batch(batch):
+    with metrics.timer('sanitize', count=len(batch)):
+        return [tuple(SanitizeTacred.sanitize_tokens(item['token'])) for item in batch]
+
+
+def find_unparsed(batch_tokens, memo):
+    """
+    'find_unparsed' returns the analyses of the distinct sentences of a batch that are found in 'memo', if given (with
+    None for the rest), along with the sentences that are not, in order of appearance
+
+    """
+    analyses = {}
+    unparsed = []
+    for tokens in batch_tokens:
+        if tokens not in analyses:
+            analyses[tokens] = memo.get(tokens) if memo is not None else None
+            if analyses[tokens] is None:
+                unparsed.append(tokens)
+
+    return analyses, unparsed
+
+
+def parse_unparsed(parser, unparsed, batch_size):
+    sentences = [' '.join(tokens) for tokens in unparsed]
+
+    if batch_size == 1:
+        return [parser.parse_sentence(sentence) for sentence in sentences]
+
+    return parse_batch(parser, sentences)
+
+
+def complete_batch(enhancers, batch, batch_tokens, analyses, unparsed, parsed_sentences, memo, store=None, parse_seconds=0.0):
+    """
+    'complete_batch' analyzes the newly parsed sentences of a batch (remembering them in 'memo', if given) and enhances
+    the batch's entries with 'enhancers', returning them in their original order - with a Rejection in place of each
+    entry that had to be dropped. If a passage 'store' is given, the parse of each entry is kept in it.
+    The time spent on each entry is recorded: that of enhancing it, along with that of analyzing its sentence and
+    its share of 'parse_seconds' (the time it took to parse 'unparsed'), unless the sentence was remembered.
+
+    """
+    parse_share = parse_seconds / len(unparsed) if len(unparsed) > 0 else 0.0
+
+    sentence_seconds = {}
+    for tokens, parsed_sentence in zip(unparsed, parsed_sentences):
+        start = time.perf_counter()
+        analyses[tokens] = analyze_sentence(enhancers, list(tokens), parsed_sentence)
+        sentence_seconds[tokens] = parse_share + time.perf_counter() - start
+
+        if memo is not None:
+            memo.put(tokens, analyses[tokens])
+
+    if store is not None:
+        store.put((item['id'], ' '.join(tokens), analyses[tokens].parsed_sentence)
+                  for item, tokens in zip(batch, batch_tokens) if analyses[tokens].parsed_sentence is not None)
+
+    enhanced = []
+    for item, tokens in zip(batch, batch_tokens):
+        start = time.perf_counter()
+        if enhance_item(enhancers, item, analyses[tokens]):
+            enhanced.append(item)
+        else:
+            enhanced.append(Rejection(item.get('id'), analyses[tokens].failure.stage, analyses[tokens].failure.reason))
+
+        metrics.entry(item.get('id'), sentence_seconds.get(tokens, 0.0) + time.perf_counter() - start)
+
+    return enhanced
+
+
+def enhance_batch(enhancers, parser, batch, batch_size, memo, store=None):
+    """
+    'enhance_batch' parses and enhances a list of TACRED entries, returning them in their original order
+    (see 'complete_batch'). Entries are grouped by their (sanitized) sentence, so
+    that each distinct sentence is only parsed and analyzed once - or not at all if found in 'memo'.
+
+    """
+    batch_tokens = sanitize_batch(batch)
+
+    analyses, unparsed = find_unparsed(batch_tokens, memo)
+
+    start = time.perf_counter()
+    parsed_sentences = parse_unparsed(parser, unparsed, batch_size)
+
+    return complete_batch(enhancers, batch, batch_tokens, analyses, unparsed, parsed_sentences, memo, store, time.perf_counter() - start)
+
+
+class SerialDriver(object):
+    """
+    'SerialDriver' parses and enhances the entries of an enrichment run in the calling process, a batch at a time.
+
+    A driver runs over the (input offset, entry) pairs of the input, calling 'done' with the input offset following
+    each batch of entries it's done with, the number of those entries and the enhanced entries (with a Rejection in
+    place of each dropped one); 'done' writes them, commits the progress and returns whether to carry on.
+    SerialDriver, WorkerPoolDriver, StagedDriver and StoredPassageDriver are the drivers of ucca_enrichment.
+
+    Methods
+    -------
+    run
+        parses and enhances the entries, handing them to 'done'
+
+    """
+
+    def __init__(self, enhancers, parser_settings, batch_size, memo_size, save_passages=None):
+        """
+
+        Parameters
+        ----------
+        enhancers
+            the enhancers to run (see 'select_enhancers')
+        parser_settings
+            the ParserSettings of the parser to create
+        batch_size
+            number of entries parsed together (see 'enhance_batch')
+        memo_size
+            number of recent sentences whose analysis is kept in memory
+        save_passages
+            path of a passage store to keep the parse of each entry in, or None
+        """
+        self.__enhancers = enhancers
+        self.__parser_settings = parser_settings
+        self.__batch_size = batch_size
+        self.__memo_size = memo_size
+        self.__save_passages = save_passages
+
+    def run(self, entries, done):
+        parser = create_parser(self.__parser_settings)
+        memo = SentenceMemo(self.__memo_size)
+        store = UccaPassageStore(self.__save_passages) if self.__save_passages is not None else None
+
+        try:
+            for batch in chunked(entries, self.__batch_size):
+                enhanced = enhance_batch(self.__enhancers, parser, [item for _, item in batch], self.__batch_size, memo, store)
+
+                if not done(batch[-1][0], len(batch), enhanced):
+                    break
+        finally:
+            if store is not None:
+                store.close()
+
+        report_cache_stats([get_cache_stats(parser)] if self.__parser_settings.cache_file is not None else [])
@@ -1,13 +1,18 @@
+from tacred_enrichment.internal.run_metrics import metrics
 from tacred_enrichment.internal.ucca_enhancer import UccaEnhancer
 from tacred_enrichment.internal.ucca_types import UccaParsedPassage
-import itertools
+from tacred_enrichment.internal.ucca_graph_index import UccaGraphIndex
+from tacred_enrichment.internal.head_distances import HeadDistances
 import networkx
 
 
 
 class UccaDistancesFromPath(UccaEnhancer):
 
-    def enhance(self, tac, tac_to_ucca, ucca: UccaParsedPassage):
+    produces = ('dist_from_ucca_mh_path',)
+    requires = ('ucca_deps',)
+
+    def enhance(self, tac, tac_to_ucca, ucca: UccaParsedPassage, graph_index: UccaGraphIndex = None):
 
         ucca_tokens = [ucca_terminal.text for ucca_terminal in ucca.terminals]
         sent_len = len(ucca_tokens)
@@ -22,33 +27,10 @@ class UccaDistancesFromPath(UccaEnhancer):
 
         multi_heads = [[int(head) for dep, head in ucca_deps] for ucca_deps in tac['ucca_deps']]
 
-        edges = {(head_id-1, id): True for id in range(sent_len) for head_id in multi_heads[id]}
-
-        extended_edges = edges.copy()
-        for edge in itertools.combinations(subj, 2):
-            extended_edges[edge] = True
-        for edge in itertools.combinations(obj, 2):
-            extended_edges[edge] = True
-
-        graph = networkx.Graph(list(extended_edges.keys()))
         try:
-            on_path = networkx.shortest_path(graph, source=subj[0], target=obj[0])
+            token_distances = HeadDistances.distances_from_path(multi_heads[:sent_len], subj, obj)
         except networkx.NetworkXNoPath:
-            print('no path between source and target')
+            metrics.failure('no path between source and target')
             return {'dist_from_ucca_mh_path': None}
 
-
-        all_shortest_paths_lengths = {start: targets for start, targets in networkx.shortest_path_length(graph)}
-
-        token_distances = []
-        for token_id in range(sent_len):
-            distance = 0
-            if token_id not in on_path:
-                distances_to_path = {target: distance_to_target
-                                     for target, distance_to_target in all_shortest_paths_lengths[token_id].items()
-                                     if target in on_path}
-                distance = min(distances_to_path.values(), default=1e12)
-            token_distances.append(distance)
-
         return {'dist_from_ucca_mh_path': token_distances}
-
@@ -1,21 +1,27 @@
 from tacred_enrichment.internal.ucca_enhancer import UccaEnhancer
 from tacred_enrichment.internal.ucca_types import UccaParsedPassage
-from tacred_enrichment.internal.dep_graph import Step, DepGraph
-from tacred_enrichment.internal.ucca_types import is_terminal
+from tacred_enrichment.internal.ucca_graph_index import UccaGraphIndex
 
 
 class UccaEncoding(UccaEnhancer):
 
-    def enhance(self, tac, tac_to_ucca, ucca: UccaParsedPassage):
+    sentence_level = True
+    produces = ('ucca_encodings',)
 
-        links = ucca.get_links()
-        graph = DepGraph(links, is_terminal)
+    def enhance(self, tac, tac_to_ucca, ucca: UccaParsedPassage, graph_index: UccaGraphIndex = None):
+
+        if graph_index is None:
+            graph_index = UccaGraphIndex(ucca)
+
+        graph = graph_index.dep_graph
+
+        # all terminal to root encodings are computed in a single traversal from the root
+        encodings = graph.get_undirected_dependency_representations([terminal.node_id for terminal in ucca.terminals], graph_index.root)
 
         terminals_to_ucca_encoding = {}
         for terminal_on_path in ucca.terminals:
-            token_index = int(terminal_on_path.node_id.split('.')[1]) - 1
-            steps = graph.get_undirected_steps(terminal_on_path.node_id, graph.root())
-            terminals_to_ucca_encoding[token_index] = Step.get_dependency_representation(steps[1:]) if len(steps) > 1 else ''
+            token_index = terminal_on_path.index - 1
+            terminals_to_ucca_encoding[token_index] = encodings[terminal_on_path.node_id]
 
         return {'ucca_encodings':terminals_to_ucca_encoding}
 
@@ -1,5 +1,19 @@
 from tacred_enrichment.internal.ucca_types import UccaParsedPassage
+from tacred_enrichment.internal.ucca_graph_index import UccaGraphIndex
 
 class UccaEnhancer(object):
-    def enhance(self, tac, tac_to_ucca, ucca: UccaParsedPassage):
-        raise NotImplementedError('subclasses must override enhance()!')
\ No newline at end of file
+
+    # enhancers whose output depends on the sentence alone (and not on the subject and object of the TACRED
+    # entry) are 'sentence level'; their 'enhance' is called once per distinct sentence, with 'tac' and
+    # 'tac_to_ucca' set to None, and the output is shared by all entries of the sentence
+    sentence_level = False
+
+    # the keys of the TACRED entry the enhancer sets, and those (set by other enhancers) it reads; the latter
+    # are used to run only the enhancers some requested output depends on (see 'ucca_enhancer_registry')
+    produces = ()
+    requires = ()
+
+    # 'graph_index' is the passage's UccaGraphIndex, which callers running several enhancers over the same
+    # passage should build once and hand to each of them; if it's not provided enhancers build their own
+    def enhance(self, tac, tac_to_ucca, ucca: UccaParsedPassage, graph_index: UccaGraphIndex = None):
+        raise NotImplementedError('subclasses must override enhance()!')
@@ -0,0 +1,57 @@
+from tacred_enrichment.internal.ucca_distances_from_path import UccaDistancesFromPath
+from tacred_enrichment.internal.ucca_encodings import UccaEncoding
+from tacred_enrichment.internal.ucca_encodings_min_subtree import UccaEncodingMinSubtree
+from tacred_enrichment.internal.ucca_heads import UccaHeads
+from tacred_enrichment.internal.ucca_path import UccaPath
+
+# all enhancers, in the order they run in; an enhancer requiring the output of another must come after it
+ENHANCERS = [UccaPath, UccaEncodingMinSubtree, UccaHeads, UccaDistancesFromPath, UccaEncoding]
+
+
+def get_outputs():
+    """
+    'get_outputs' returns the keys set by all enhancers, in the order they run in
+
+    """
+    return [output for enhancer in ENHANCERS for output in enhancer.produces]
+
+
+def select_enhancers(outputs=None):
+    """
+    'select_enhancers' returns (instances of) the enhancers needed to produce the requested outputs: the ones
+    producing them, along with the enhancers producing what those require, and so on. The enhancers are
+    returned in the order of ENHANCERS, so that each runs after the ones it requires.
+
+    Parameters
+    ----------
+    outputs
+        keys of TACRED entries set by enhancers (see 'get_outputs'); all enhancers are returned if None.
+        A ValueError is raised for unknown keys
+
+    Returns
+    -------
+        a list of enhancers
+    """
+    if outputs is None:
+        return [enhancer() for enhancer in ENHANCERS]
+
+    producers = {output: enhancer for enhancer in ENHANCERS for output in enhancer.produces}
+
+    unknown = [output for output in outputs if output not in producers]
+    if unknown:
+        raise ValueError('unknown enhancer outputs {0}, expected any of: {1}'.format(', '.join(unknown), ', '.join(get_outputs())))
+
+    selected = set()
+    to_visit = list(outputs)
+    while to_visit:
+        enhancer = producers[to_visit.pop()]
+        if enhancer not in selected:
+            selected.add(enhancer)
+            to_visit.extend(enhancer.requires)
+
+    for enhancer in selected:
+        for required in enhancer.requires:
+            if ENHANCERS.index(producers[required]) > ENHANCERS.index(enhancer):
+                raise ValueError('{0} requires {1}, which is produced by an enhancer that runs after it'.format(enhancer.__name__, required))
+
+    return [enhancer() for enhancer in ENHANCERS if enhancer in selected]
@@ -0,0 +1,43 @@
+from types import MappingProxyType
+
+from tacred_enrichment.internal.dep_graph_backend import create_dep_graph
+from tacred_enrichment.internal.ucca_types import UccaParsedPassage, is_terminal
+
+
+class UccaGraphIndex(object):
+    """
+    'UccaGraphIndex' holds the graph structures of a 'UccaParsedPassage' that the UCCA enhancers need,
+    so that they are constructed once per passage rather than once per enhancer. The index is built once
+    and is not to be modified thereafter: all its mappings are read only views, and their values are tuples.
+
+    Attributes
+    ----------
+    links
+        the passage's edges as a tuple of Link objects (see 'UccaParsedPassage.get_links')
+    dep_graph
+        a DepGraph (or ArrayDepGraph, see 'create_dep_graph') over 'links', shared by all enhancers
+    root
+        id of the root node
+    parents
+        maps each node id to the ids of its parents (remote ones included), in edge order
+
+    """
+
+    def __init__(self, ucca: UccaParsedPassage):
+
+        self.links = tuple(ucca.get_links())
+        self.dep_graph = create_dep_graph(self.links, is_terminal)
+        self.root = self.dep_graph.root() if len(self.links) > 0 else None
+
+        parents = {}
+        for link in self.links:
+            parents.setdefault(link.word_index, []).append(link.parent_index)
+
+        self.parents = MappingProxyType({node: tuple(node_parents) for node, node_parents in parents.items()})
+
+    def get_parents(self, node_id):
+        """
+        Equivalent of 'Link.get_parents(links, node_id)' without scanning all links
+
+        """
+        return list(self.parents.get(node_id, ()))
@@ -1,17 +1,263 @@
+from itertools import groupby
+
+from ucca import layer0
+from ucca.layer1 import EdgeTags
+
 from tacred_enrichment.internal.ucca_enhancer import UccaEnhancer
 from tacred_enrichment.internal.ucca_types import UccaParsedPassage
-from semstr.convert import to_conllu
-from conllu import parse as conllu_parse
+from tacred_enrichment.internal.ucca_graph_index import UccaGraphIndex
+
+
+class DependencyEdge(object):
+    """
+    'DependencyEdge' is an edge of the dependency graph 'UccaDependencyConverter' builds: from the 'head' terminal
+    (by position, 0 being the root) to the 'dependent' one, labeled by 'rel', the tag of the UCCA edge it stands for
+    """
+
+    __slots__ = ('head', 'dependent', 'rel', 'remote')
+
+    def __init__(self, head, dependent, rel, remote):
+        self.head = head
+        self.dependent = dependent
+        self.rel = rel
+        self.remote = remote
+
+
+class UccaDependencyConverter(object):
+    """
+    'UccaDependencyConverter' converts a (native) UCCA passage, as parsed by TUPA, to dependencies between its
+    terminals, and returns the 'head' and 'deps' of each token: the values 'conllu.parse' reads off the CoNLL-U lines
+    of 'semstr.convert.to_conllu' (a tree, with enhanced dependencies), without writing or parsing any such lines.
+
+    The conversion follows semstr's for UCCA passages. Each terminal heads the units it's the head of - the head
+    child of a unit being chosen by edge tag (see 'HEAD_PRIORITY') - and depends on the head terminals of the
+    parents of the uppermost of them. Then linkers are re-attached to the following parallel scene, cycles are
+    broken, and terminals with no primary head are attached to the root (the first of them) or to the first of
+    them (the rest). semstr's relation rules that only apply to other formats (such as UD's 'conj' or 'acl') have
+    no effect on UCCA edge tags and are left out, and TUPA's passages have no multi word tokens to account for.
+
+    Methods
+    -------
+    to_heads_and_deps
+        returns the head and the deps (a list of (relation, head) pairs, or None) of each token of a passage
+
+    """
+
+    # edge tags in order of priority for choosing the head child of a unit: semstr's, preceded by the labels of its
+    # dependency formats (which don't occur in UCCA passages); a unit none of whose children has such a tag is headed
+    # by its first (primary) child
+    HEAD_PRIORITY = ('head', 'TOP', 'parataxis', 'conj', 'advcl', 'xcomp',
+                     EdgeTags.Center, EdgeTags.Connector, EdgeTags.ParallelScene, EdgeTags.Process, EdgeTags.State,
+                     EdgeTags.Participant, EdgeTags.Adverbial, EdgeTags.Time, EdgeTags.Quantifier, EdgeTags.Elaborator,
+                     EdgeTags.Relator, EdgeTags.Function, EdgeTags.Linker, EdgeTags.LinkRelation, EdgeTags.LinkArgument,
+                     EdgeTags.Ground, EdgeTags.Terminal, EdgeTags.Punctuation)
+
+    __PRIORITY = {tag: rank for rank, tag in enumerate(HEAD_PRIORITY)}
+
+    # the relations of terminals with no primary head: the first is the root, the rest are attached to it
+    ROOT = 'root'
+    PUNCT = 'punct'
+    ORPHAN = 'orphan'
+
+    def __init__(self):
+        self.__head_children = {}
+        self.__head_terminals = {}
+
+    def to_heads_and_deps(self, passage):
+        """
+
+        Parameters
+        ----------
+        passage
+            native ucca passage
+
+        Returns
+        -------
+            the 'head' and the 'deps' of each token (the latter being a list of (relation, head) pairs)
+        """
+        if passage.extra.get('format', 'ucca') != 'ucca':
+            raise ValueError('passage {0} was converted from {1}, rather than parsed as UCCA'.format(passage.ID, passage.extra['format']))
+
+        self.__head_children = {}
+        self.__head_terminals = {}
+
+        terminals = sorted(passage.layer(layer0.LAYER_ID).all, key=lambda terminal: terminal.position)
+        positions = [terminal.position for terminal in terminals]
+
+        incoming = {terminal.position: self.__terminal_edges(terminal) for terminal in terminals}
+
+        outgoing = {0: []}
+        outgoing.update((position, []) for position in positions)
+        for position in positions:
+            for edge in incoming[position]:
+                outgoing[edge.head].append(edge)
+
+        UccaDependencyConverter.__reattach_linkers(positions, incoming, outgoing)
+        UccaDependencyConverter.__break_cycles(positions, incoming, outgoing)
+        UccaDependencyConverter.__attach_parentless(terminals, incoming)
+
+        heads = [incoming[position][0].head if incoming[position] else 0 for position in positions]
+        deps = [[(edge.rel, edge.head) for edge in incoming[position]] or None for position in positions]
+
+        return heads, deps
+
+    def __head_child(self, unit):
+        """the child of 'unit' that heads it, by the tag of its edge; remote edges and implicit children aren't considered"""
+
+        head_child = self.__head_children.get(unit.ID)
+        if head_child is None:
+            primary = [edge for edge in unit if not edge.attrib.get('remote') and not edge.child.attrib.get('implicit')]
+
+            if primary:
+                lowest_rank = len(UccaDependencyConverter.HEAD_PRIORITY)
+                head_child = min(primary, key=lambda edge: UccaDependencyConverter.__PRIORITY.get(edge.tag, lowest_rank)).child
+            elif unit.children:
+                head_child = unit.children[0]
+            else:
+                raise RuntimeError('Could not find head child for unit ({0}): {1}'.format(unit.ID, unit))
+
+            self.__head_children[unit.ID] = head_child
+
+        return head_child
+
+    def __head_terminal(self, unit):
+        """the terminal heading 'unit', found by descending through head children"""
+
+        head_terminal = self.__head_terminals.get(unit.ID)
+        if head_terminal is None:
+            head_terminal = unit
+            while head_terminal.outgoing:
+                head_terminal = self.__head_child(head_terminal)
+
+            if head_terminal.layer.ID != layer0.LAYER_ID:
+                raise ValueError('Implicit unit in conversion to dependencies ({0}): {1}'.format(head_terminal.ID, head_terminal.root))
+
+            self.__head_terminals[unit.ID] = head_terminal
+
+        return head_terminal
+
+    def __headed_unit(self, unit):
+        """the uppermost unit headed by 'unit', climbing through (first) parents as long as 'unit' heads them"""
+
+        while unit.incoming and unit.parents[0].incoming and unit is self.__head_child(unit.parents[0]):
+            unit = unit.parents[0]
+
+        return unit
+
+    def __terminal_edges(self, terminal):
+        """
+        the edges from the head terminals of the parents of the uppermost unit headed by 'terminal' - one per head,
+        a remote one if there is any - primary ones first
+        """
+        edges = []
+        for unit_edge in self.__headed_unit(terminal).incoming:
+            if unit_edge.tag.upper() in ('ROOT', 'TOP') or unit_edge.tag in (EdgeTags.LinkRelation, EdgeTags.LinkArgument):
+                continue
+
+            head = self.__head_terminal(unit_edge.parent).position
+            if head == terminal.position:
+                edges.append(DependencyEdge(0, terminal.position, unit_edge.tag, False))
+            else:
+                edges.append(DependencyEdge(head, terminal.position, unit_edge.tag, bool(unit_edge.attrib.get('remote', False))))
+
+        edges.sort(key=lambda edge: edge.head)
+        edges = [sorted(head_edges, key=lambda edge: edge.remote)[-1] for _, head_edges in groupby(edges, key=lambda edge: edge.head)]
+
+        return [edge for edge in edges if not edge.remote] + [edge for edge in edges if edge.remote]
+
+    @staticmethod
+    def __reattach_linkers(positions, incoming, outgoing):
+        """attaches each linker to the nearest parallel scene following it, among those sharing its head"""
+
+        for position in reversed(positions):
+            for edge in incoming[position]:
+                if edge.rel != EdgeTags.Linker:
+                    continue
+
+                scenes = [scene_edge for scene_edge in outgoing[edge.head]
+                          if scene_edge.rel == EdgeTags.ParallelScene and not scene_edge.remote and scene_edge.dependent > position]
+                if not scenes:
+                    continue
+
+                scene = min(scenes, key=lambda scene_edge: scene_edge.dependent).dependent
+                if not any(other.rel == edge.rel and other.head == edge.head for other in outgoing[scene]):
+                    outgoing[edge.head].remove(edge)
+                    edge.head = scene
+                    outgoing[scene].append(edge)
+
+    @staticmethod
+    def __break_cycles(positions, incoming, outgoing):
+        """
+        removes primary edges until there are no cycles of them, an edge of a linker first; as semstr, the nodes on a
+        cycle are kept in a set whose members hash like semstr's nodes, so that ties are resolved the same way
+        """
+
+        def find_cycle(position, visited, path):
+            node = (position, ())
+            if node in visited:
+                return False
+
+            visited.add(node)
+            path.add(node)
+            for edge in incoming.get(position, ()):
+                if not edge.remote and ((edge.head, ()) in path or find_cycle(edge.head, visited, path)):
+                    return True
+
+            path.remove(node)
+            return False
+
+        while True:
+            visited = set()
+            path = set()
+            if not any(find_cycle(position, visited, path) for position in positions):
+                return
+
+            edge = min((edge for position, _ in path for edge in incoming.get(position, ()) if not edge.remote),
+                       key=lambda edge: edge.rel != EdgeTags.Linker)
+
+            outgoing[edge.head].remove(edge)
+            incoming[edge.dependent].remove(edge)
+
+    @staticmethod
+    def __attach_parentless(terminals, incoming):
+        """
+        drops the (remote) edges of terminals that have no primary head, and attaches the first of them to the root and
+        the rest to the first; remote edges of a flat relation are dropped too
+        """
+        root = None
+
+        for terminal in terminals:
+            edges = incoming[terminal.position]
+
+            parentless = True
+            for edge in list(edges):
+                if edge.remote:
+                    if edge.rel == EdgeTags.Terminal:
+                        edges.remove(edge)
+                    continue
+
+                parentless = False
+
+            if not parentless:
+                continue
+
+            if root is None:
+                root = terminal.position
+                incoming[terminal.position] = [DependencyEdge(0, terminal.position, UccaDependencyConverter.ROOT, False)]
+            else:
+                punct = bool({terminal.extra.get('tag', terminal.tag), terminal.extra.get('pos') or terminal.extra.get('tag', terminal.tag)} &
+                             {layer0.NodeTags.Punct, 'PUNCT'})
+                rel = UccaDependencyConverter.PUNCT if punct else UccaDependencyConverter.ORPHAN
+                incoming[terminal.position] = [DependencyEdge(root, terminal.position, rel, False)]
 
 
 class UccaHeads(UccaEnhancer):
 
-    def enhance(self, tac, tac_to_ucca, ucca: UccaParsedPassage):
+    sentence_level = True
+    produces = ('ucca_heads', 'ucca_deps')
 
-        lines_representation = to_conllu(ucca.native)
-        conllu = conllu_parse('\n'.join(lines_representation))
+    def enhance(self, tac, tac_to_ucca, ucca: UccaParsedPassage, graph_index: UccaGraphIndex = None):
 
-        ucca_heads = [token_info['head'] for i, token_info in enumerate(conllu[0])]
-        ucca_deps = [token_info['deps'] for i, token_info in enumerate(conllu[0])]
+        ucca_heads, ucca_deps = UccaDependencyConverter().to_heads_and_deps(ucca.native)
 
         return {'ucca_heads': ucca_heads, 'ucca_deps': ucca_deps}
@@ -0,0 +1,299 @@
+import hashlib
+import mmap
+import pickle
+import struct
+
+from tacred_enrichment.internal.ucca_types import UccaParsedPassage, UccaNode, UccaTerminalNode, UccaEdge
+
+# The packed passage file starts with a fixed size header, followed by one record per passage, and ends with an
+# index of fixed size entries - (hash of entry id, record offset, record length) - sorted by hash. All numbers are
+# little endian.
+#
+# A record starts with the counts of its parts, followed by:
+#  - the lengths of its strings, and then the strings themselves (utf-8); the first string is the entry id
+#  - its terminals: indices of their node id, text, lemma, tag, pos and ent strings, their token id and head, and
+#    the range of their incoming edge tags in the tag list
+#  - its non terminals: the index of their node id string and the range of their incoming edge tags
+#  - its edges: the positions of their child and parent among the terminals followed by the non terminals, and
+#    the indices of their tag and classification strings
+#  - the tag list: indices of edge tag strings
+#  - a pickle of the native ucca passage, if any
+# A string index of NONE stands for None, as does a head of NO_HEAD.
+
+MAGIC = b'UCPP'
+VERSION = 1
+
+NONE = 0xFFFFFFFF
+NO_HEAD = -(1 << 63)
+
+HEADER = struct.Struct('<4sHHQQ')        # magic, version, reserved, number of records, index offset
+INDEX_ENTRY = struct.Struct('<QQQ')      # entry id hash, record offset, record length
+COUNTS = struct.Struct('<IIIIII')        # strings, terminals, non terminals, edges, tags, native length
+TERMINAL = struct.Struct('<IIIIIIiqII')  # node id, text, lemma, tag, pos, ent, token id, head, tags start, tags count
+NON_TERMINAL = struct.Struct('<III')     # node id, tags start, tags count
+EDGE = struct.Struct('<IIII')            # child position, parent position, tag, classification
+
+
+def _id_hash(entry_id):
+    return int.from_bytes(hashlib.blake2b(entry_id.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class UccaPackedPassageWriter(object):
+    """
+    'UccaPackedPassageWriter' writes UccaParsedPassage records, keyed by TACRED entry id, to a packed passage
+    file (see 'UccaPackedPassageReader'). The index is written once the writer is closed, so the file is only
+    usable after that; it's best used as a context manager.
+
+    Methods
+    -------
+    write
+        appends the passage of an entry
+    close
+        writes the index and the header, and closes the file
+
+    """
+
+    def __init__(self, packed_file):
+        self.__file = open(packed_file, 'wb')
+        self.__file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+
+        self.__index = []
+        self.__ids = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, entry_id, parsed_passage: UccaParsedPassage):
+        """
+
+        Parameters
+        ----------
+        entry_id
+            TACRED entry id; a ValueError is raised if it was already written
+        parsed_passage
+            the entry's UccaParsedPassage, along with its native passage if it has one
+        """
+        if entry_id in self.__ids:
+            raise ValueError('passage of entry {0} was already written'.format(entry_id))
+        self.__ids.add(entry_id)
+
+        record = UccaPackedPassageWriter.__pack(entry_id, parsed_passage)
+
+        self.__index.append((_id_hash(entry_id), self.__file.tell(), len(record)))
+        self.__file.write(record)
+
+    def close(self):
+        if self.__file.closed:
+            return
+
+        index_offset = self.__file.tell()
+
+        self.__index.sort()
+        for index_entry in self.__index:
+            self.__file.write(INDEX_ENTRY.pack(*index_entry))
+
+        self.__file.seek(0)
+        self.__file.write(HEADER.pack(MAGIC, VERSION, 0, len(self.__index), index_offset))
+        self.__file.close()
+
+    @staticmethod
+    def __pack(entry_id, parsed_passage):
+
+        strings = {}
+
+        def string_index(string):
+            if string is None:
+                return NONE
+            return strings.setdefault(string, len(strings))
+
+        string_index(entry_id)
+
+        # edges refer to their nodes by position; as with a lookup by node id, the first node with an id wins
+        nodes = parsed_passage.terminals + parsed_passage.non_terminals
+        positions = {}
+        for position, node in enumerate(nodes):
+            positions.setdefault(node.node_id, position)
+
+        tags = []
+
+        def tag_range(edge_tags_in):
+            start = len(tags)
+            tags.extend(string_index(tag) for tag in edge_tags_in)
+            return start, len(edge_tags_in)
+
+        terminals = b''.join(TERMINAL.pack(string_index(terminal.node_id), string_index(terminal.text), string_index(terminal.lemma),
+                                           string_index(terminal.tag), string_index(terminal.pos), string_index(terminal.ent),
+                                           terminal.token_id, NO_HEAD if terminal.head is None else terminal.head,
+                                           *tag_range(terminal.edge_tags_in))
+                             for terminal in parsed_passage.terminals)
+
+        non_terminals = b''.join(NON_TERMINAL.pack(string_index(node.node_id), *tag_range(node.edge_tags_in))
+                                 for node in parsed_passage.non_terminals)
+
+        edges = b''.join(EDGE.pack(positions[edge.child.node_id], positions[edge.parent.node_id],
+                                   string_index(edge.tag), string_index(edge.classification))
+                         for edge in parsed_passage.edges)
+
+        native = pickle.dumps(parsed_passage.native, protocol=pickle.HIGHEST_PROTOCOL) if parsed_passage.native is not None else b''
+
+        encoded_strings = [string.encode('utf-8') for string in strings]
+
+        return b''.join([COUNTS.pack(len(encoded_strings), len(parsed_passage.terminals), len(parsed_passage.non_terminals),
+                                     len(parsed_passage.edges), len(tags), len(native)),
+                         struct.pack('<{0}I'.format(len(encoded_strings)), *(len(string) for string in encoded_strings)),
+                         b''.join(encoded_strings),
+                         terminals,
+                         non_terminals,
+                         edges,
+                         struct.pack('<{0}I'.format(len(tags)), *tags),
+                         native])
+
+
+class UccaPackedPassageReader(object):
+    """
+    'UccaPackedPassageReader' gives random access, by TACRED entry id, to the passages of a packed passage file
+    written by 'UccaPackedPassageWriter'. The file is memory mapped: looking an entry up is a binary search of
+    the index, and only the passage asked for is decoded.
+
+    Methods
+    -------
+    get
+        returns the UccaParsedPassage of an entry, or None
+    ids
+        yields the ids of all entries, in the order their passages were written
+    is_packed_passage_file
+        tells whether a file is a packed passage file
+
+    """
+
+    def __init__(self, packed_file):
+        """
+
+        Parameters
+        ----------
+        packed_file
+            path of the packed passage file; a ValueError is raised if it isn't one
+        """
+        self.__file = open(packed_file, 'rb')
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, self.__count, self.__index_offset = HEADER.unpack_from(self.__map, 0)
+        if magic != MAGIC:
+            raise ValueError('{0} is not a packed passage file'.format(packed_file))
+        if version != VERSION:
+            raise ValueError('unsupported packed passage file version {0}'.format(version))
+
+    def __len__(self):
+        return self.__count
+
+    def close(self):
+        self.__map.close()
+        self.__file.close()
+
+    def __index_entry(self, position):
+        return INDEX_ENTRY.unpack_from(self.__map, self.__index_offset + position * INDEX_ENTRY.size)
+
+    def get(self, entry_id, native=True):
+        """
+
+        Parameters
+        ----------
+        entry_id
+            TACRED entry id
+        native
+            whether to unpickle the native passage as well (when stored); it's only needed by 'UccaHeads'
+
+        Returns
+        -------
+            the entry's UccaParsedPassage, or None if the file holds none for it
+        """
+        id_hash = _id_hash(entry_id)
+
+        # find the first index entry whose hash isn't smaller than 'id_hash'
+        low, high = 0, self.__count
+        while low < high:
+            middle = (low + high) // 2
+            if self.__index_entry(middle)[0] < id_hash:
+                low = middle + 1
+            else:
+                high = middle
+
+        # ids may (rarely) share a hash, so check each record with the hash for the actual id
+        for position in range(low, self.__count):
+            entry_hash, offset, length = self.__index_entry(position)
+            if entry_hash != id_hash:
+                break
+
+            record_id, parsed_passage = UccaPackedPassageReader.__unpack(memoryview(self.__map)[offset:offset + length], native)
+            if record_id == entry_id:
+                return parsed_passage
+
+        return None
+
+    def ids(self):
+        for position in sorted(range(self.__count), key=lambda position: self.__index_entry(position)[1]):
+            _, offset, length = self.__index_entry(position)
+            yield UccaPackedPassageReader.__unpack_strings(memoryview(self.__map)[offset:offset + length], first_only=True)[0][0]
+
+    @staticmethod
+    def is_packed_passage_file(path):
+        with open(path, 'rb') as file:
+            return file.read(len(MAGIC)) == MAGIC
+
+    @staticmethod
+    def __unpack_strings(record, first_only=False):
+        string_count = COUNTS.unpack_from(record, 0)[0]
+
+        lengths = struct.unpack_from('<{0}I'.format(string_count), record, COUNTS.size)
+
+        offset = COUNTS.size + 4 * string_count
+        strings = []
+        for length in lengths[:1] if first_only else lengths:
+            strings.append(str(record[offset:offset + length], 'utf-8'))
+            offset += length
+
+        return strings, offset
+
+    @staticmethod
+    def __unpack(record, native):
+        string_count, terminal_count, non_terminal_count, edge_count, tag_count, native_length = COUNTS.unpack_from(record, 0)
+
+        strings, offset = UccaPackedPassageReader.__unpack_strings(record)
+
+        def string(index):
+            return None if index == NONE else strings[index]
+
+        terminals = list(struct.iter_unpack(TERMINAL.format, record[offset:offset + terminal_count * TERMINAL.size]))
+        offset += terminal_count * TERMINAL.size
+
+        non_terminals = list(struct.iter_unpack(NON_TERMINAL.format, record[offset:offset + non_terminal_count * NON_TERMINAL.size]))
+        offset += non_terminal_count * NON_TERMINAL.size
+
+        edges = list(struct.iter_unpack(EDGE.format, record[offset:offset + edge_count * EDGE.size]))
+        offset += edge_count * EDGE.size
+
+        tags = [strings[index] for index in struct.unpack_from('<{0}I'.format(tag_count), record, offset)]
+        offset += 4 * tag_count
+
+        parsed_passage = UccaParsedPassage()
+
+        # the node lists are assigned as a whole; the passage indexes them once they're first looked up
+        parsed_passage.terminals = [UccaTerminalNode(strings[node_id], tags[tags_start:tags_start + tags_count], token_id,
+                                                     string(text), string(lemma), string(tag), string(pos), string(ent),
+                                                     None if head == NO_HEAD else head)
+                                    for node_id, text, lemma, tag, pos, ent, token_id, head, tags_start, tags_count in terminals]
+
+        parsed_passage.non_terminals = [UccaNode(strings[node_id], tags[tags_start:tags_start + tags_count])
+                                        for node_id, tags_start, tags_count in non_terminals]
+
+        nodes = parsed_passage.terminals + parsed_passage.non_terminals
+        parsed_passage.edges = [UccaEdge(nodes[child], nodes[parent], string(tag), string(classification))
+                                for child, parent, tag, classification in edges]
+
+        if native and native_length > 0:
+            parsed_passage.native = pickle.loads(record[offset:offset + native_length])
+
+        return strings[0], parsed_passage
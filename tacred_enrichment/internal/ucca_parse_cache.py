@@ -0,0 +1,202 @@
+import glob
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+
+from tacred_enrichment.internal.ucca_types import UccaParsedPassage
+
+
+class UccaParseCache(object):
+    """
+    'UccaParseCache' is a persistent, content addressed, store of UCCA parses. Each parse is keyed by a
+    hash of the (sanitized) sentence together with a fingerprint of the TUPA model that produced it, so
+    that a change of model never serves stale parses.
+
+    The store is an sqlite file holding, per sentence, the serialized 'UccaParsedPassage' along with a
+    pickle of its native ucca passage (which 'UccaHeads' requires). Once the total size of the stored
+    parses exceeds the size cap, the least recently used ones are evicted.
+
+    Attributes
+    ----------
+    hits
+        number of lookups served from the cache
+    misses
+        number of lookups not found in the cache
+
+    Methods
+    -------
+    get
+        returns the cached UccaParsedPassage for a sentence, or None
+    put
+        caches the UccaParsedPassage of a sentence
+    model_fingerprint
+        computes a fingerprint of the TUPA model files
+
+    """
+
+    # once the cap is exceeded evict down to this fraction of it, so that eviction isn't run on every put
+    __EVICT_TO = 0.9
+
+    def __init__(self, cache_file, fingerprint, max_size):
+        """
+
+        Parameters
+        ----------
+        cache_file
+            path of the sqlite file backing the cache; it is created if it doesn't exist
+        fingerprint
+            fingerprint of the model whose parses are cached
+        max_size
+            size cap, in bytes
+        """
+        self.__fingerprint = fingerprint
+        self.__max_size = max_size
+
+        # several worker processes may share the same cache file, hence the generous timeout and WAL mode
+        self.__connection = sqlite3.connect(cache_file, timeout=60, isolation_level=None)
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute('CREATE TABLE IF NOT EXISTS passages '
+                                  '(key TEXT PRIMARY KEY, serialization TEXT, native BLOB, size INTEGER, last_used REAL)')
+        self.__connection.execute('CREATE INDEX IF NOT EXISTS passages_by_last_used ON passages (last_used)')
+
+        self.__size = self.__connection.execute('SELECT COALESCE(SUM(size), 0) FROM passages').fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+
+    def __key(self, sentence):
+        return hashlib.sha1('{0}\n{1}'.format(self.__fingerprint, sentence).encode('utf-8')).hexdigest()
+
+    def get(self, sentence):
+
+        key = self.__key(sentence)
+        row = self.__connection.execute('SELECT serialization, native, size FROM passages WHERE key = ?', (key,)).fetchone()
+
+        parsed_passage = None
+        if row is not None:
+            try:
+                parsed_passage = UccaParsedPassage.from_serialization(row[0])
+                parsed_passage.native = pickle.loads(row[1]) if row[1] is not None else None
+
+            # an entry that can't be read back - corrupt, truncated or pickled with classes that are gone or have
+            # moved - is treated as a miss and evicted, rather than read (and failed on) again by every run
+            except (ValueError, EOFError, AttributeError, ImportError, pickle.UnpicklingError):
+                parsed_passage = None
+                self.__connection.execute('DELETE FROM passages WHERE key = ?', (key,))
+                self.__size -= row[2]
+
+        if parsed_passage is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.__connection.execute('UPDATE passages SET last_used = ? WHERE key = ?', (time.time(), key))
+
+        return parsed_passage
+
+    def put(self, sentence, parsed_passage):
+
+        serialization = parsed_passage.serialize()
+        native = pickle.dumps(parsed_passage.native, protocol=pickle.HIGHEST_PROTOCOL) if parsed_passage.native is not None else None
+        size = len(serialization) + (len(native) if native is not None else 0)
+
+        self.__connection.execute('INSERT OR REPLACE INTO passages VALUES (?, ?, ?, ?, ?)',
+                                  (self.__key(sentence), serialization, native, size, time.time()))
+
+        self.__size += size
+        if self.__size > self.__max_size:
+            self.__evict()
+
+    def __evict(self):
+
+        # other processes may be writing to the same file, so start with an accurate total
+        self.__size = self.__connection.execute('SELECT COALESCE(SUM(size), 0) FROM passages').fetchone()[0]
+        if self.__size <= self.__max_size:
+            return
+
+        excess = self.__size - int(self.__max_size * UccaParseCache.__EVICT_TO)
+
+        evicted_keys = []
+        evicted_size = 0
+        for key, size in self.__connection.execute('SELECT key, size FROM passages ORDER BY last_used'):
+            evicted_keys.append((key,))
+            evicted_size += size
+            if evicted_size >= excess:
+                break
+
+        self.__connection.executemany('DELETE FROM passages WHERE key = ?', evicted_keys)
+        self.__size -= evicted_size
+
+    @staticmethod
+    def model_fingerprint(model_prefix, hash_content=False):
+        """
+        'model_fingerprint' fingerprints all the files making up the TUPA model (i.e. all files whose path starts
+        with 'model_prefix') by their name, size and modification time, or - if 'hash_content' is set - by their
+        name and content, which takes reading the whole model (and so is best done once per run, rather than per
+        process). The two kinds of fingerprint differ, so switching between them starts the cache afresh.
+
+        """
+        fingerprint = hashlib.sha1()
+
+        for model_file in sorted(glob.glob(glob.escape(model_prefix) + '*')):
+            if not os.path.isfile(model_file):
+                continue
+
+            fingerprint.update(os.path.basename(model_file).encode('utf-8'))
+
+            if not hash_content:
+                status = os.stat(model_file)
+                fingerprint.update('\t{0}\t{1}\n'.format(status.st_size, status.st_mtime_ns).encode('utf-8'))
+                continue
+
+            with open(model_file, 'rb') as file:
+                for block in iter(lambda: file.read(1 << 20), b''):
+                    fingerprint.update(block)
+
+        return fingerprint.hexdigest()
+
+
+class CachedTupaParser(object):
+    """
+    'CachedTupaParser' wraps a 'TupaParser' with an 'UccaParseCache', exposing the same 'parse_sentence'
+    and 'parse_sentences' methods; TUPA is only invoked for sentences that aren't already cached
+
+    """
+
+    def __init__(self, parser, cache):
+        self.__parser = parser
+        self.cache = cache
+
+    def parse_sentence(self, sentence):
+
+        parsed_passage = self.cache.get(sentence)
+
+        if parsed_passage is None:
+            parsed_passage = self.__parser.parse_sentence(sentence)
+
+            if parsed_passage is not None:
+                self.cache.put(sentence, parsed_passage)
+
+        return parsed_passage
+
+    def parse_sentences(self, sentences):
+
+        parsed_passages = [self.cache.get(sentence) for sentence in sentences]
+
+        missing = [index for index, parsed_passage in enumerate(parsed_passages) if parsed_passage is None]
+        if len(missing) == 0:
+            return parsed_passages
+
+        parsed_missing = self.__parser.parse_sentences([sentences[index] for index in missing])
+
+        for index, parsed_passage in zip(missing, parsed_missing):
+            parsed_passages[index] = parsed_passage
+            self.cache.put(sentences[index], parsed_passage)
+
+        # like 'TupaParser.parse_sentences' only return what was successfully parsed up to a failure
+        if len(parsed_missing) < len(missing):
+            return parsed_passages[:missing[len(parsed_missing)]]
+
+        return parsed_passages
@@ -0,0 +1,166 @@
+from collections import OrderedDict
+
+from ucca.core import Passage
+from ucca.layer0 import Layer0
+from ucca.layer1 import Layer1
+
+from tacred_enrichment.internal.ucca_types import UccaParsedPassage, UccaEdge, UccaNode, UccaTerminalNode
+
+
+class UccaPassageConverter(object):
+    """
+    'UccaPassageConverter' converts a native ucca passage - as parsed by TUPA, with its terminals annotated
+    by spaCy - into a UccaParsedPassage, whose edges are ordered so that the children of each node follow
+    the order of their terminals
+
+    Methods
+    -------
+    convert
+        returns the UccaParsedPassage of a native ucca passage
+
+    """
+
+    @staticmethod
+    def __get_earliest_direct_terminals(direct_children_by_node):
+        """
+        '__get_earliest_direct_terminals' maps each node to the earliest (lowest token index) terminal among
+        its descendants through direct edges, or to None if it has none; all nodes are handled in a single
+        post-order pass, each node's value being derived from those of its children
+
+        """
+        earliest_terminals = {}
+        in_progress = set()
+
+        for start in direct_children_by_node:
+            to_visit = [(start, False)]
+
+            while to_visit:
+                node, expanded = to_visit.pop()
+                if node in earliest_terminals or (not expanded and node in in_progress):
+                    continue
+
+                children = direct_children_by_node.get(node, [])
+
+                if not expanded:
+                    in_progress.add(node)
+                    to_visit.append((node, True))
+                    to_visit.extend((child, False) for child in children)
+                    continue
+
+                # terminals have ids with a '0.x' format, where x is an integer that reflects the token index
+                candidates = []
+                for child in children:
+                    layer, _, index = child.partition('.')
+                    if layer == '0':
+                        candidates.append(int(index))
+                    if earliest_terminals.get(child) is not None:
+                        candidates.append(earliest_terminals[child])
+
+                earliest_terminals[node] = min(candidates, default=None)
+
+        return earliest_terminals
+
+    @staticmethod
+    def convert(passage: Passage):
+        ucca_parsed_passage = UccaParsedPassage(passage)
+
+        ucca_node_lookup = {}
+
+        layer0 = next(layer for layer in passage.layers if isinstance(layer, Layer0))
+        layer1 = next(layer for layer in passage.layers if isinstance(layer, Layer1))
+
+        for node in layer0.all:
+            edge_tags_in = [edge.tag for edge in node.incoming]
+            token_id = int(node.ID.split('.')[1])  # :)
+            lemma, tag, pos, ent, head =  node.extra['lemma'], node.extra['tag'], node.extra['pos'], node.extra['ent_type'], node.extra['head']
+            terminal_node = UccaTerminalNode(node.ID, edge_tags_in, token_id, node.text, lemma, tag, pos, ent, head)
+            ucca_parsed_passage.add_terminal(terminal_node)
+            ucca_node_lookup[node.ID] = terminal_node
+
+        for node in layer1.all:
+            edge_tags_in = [edge.tag for edge in node.incoming]
+            non_terminal_node = UccaNode(node.ID, edge_tags_in)
+            ucca_parsed_passage.add_non_terminal(non_terminal_node)
+            ucca_node_lookup[node.ID] = non_terminal_node
+
+        # all the edges are from layer1 nodes to their children (which can include layer0
+        # nodes)
+
+        edge_lookup = OrderedDict()
+
+
+        for node in layer1.all:
+            for edge in node.outgoing:
+                child_node = ucca_node_lookup[edge.child.ID]
+                parent_node = ucca_node_lookup[edge.parent.ID]
+
+                ucca_edge = UccaEdge(child_node, parent_node, edge.tag, 'remote' if edge.attrib.get('remote') else 'direct')
+                edge_lookup[(edge.parent.ID, edge.child.ID)] = ucca_edge
+
+                #ucca_parsed_passage.edges.append(UccaEdge(child_node, parent_node, edge.tag, 'remote' if edge.attrib.get('remote') else 'direct'))
+
+
+        # the edges as extracted in the sequence above are not in proper order - specifically children of
+        # a given parent are not in the order appropriate to the actual terminals ...
+
+        # the following code fixes this up by sorting children based on their earliest direct terminal descendant
+
+        # we'll first collect the children of each node (in the order of the edges), along with its children
+        # through direct (non remote) edges, which we'll use for sorting
+        children_by_node = OrderedDict()
+        direct_children_by_node = {}
+        for (parent_id, child_id), edge in edge_lookup.items():
+            children_by_node.setdefault(parent_id, []).append(child_id)
+            children_by_node.setdefault(child_id, [])
+            if edge.classification == 'direct':
+                direct_children_by_node.setdefault(parent_id, []).append(child_id)
+
+        # the root is the first node (in order of appearance in the edges) without a parent
+        nodes_with_parents = set(child_id for _, child_id in edge_lookup.keys())
+        root = next(node for node in children_by_node if node not in nodes_with_parents)
+
+        earliest_terminals = UccaPassageConverter.__get_earliest_direct_terminals(direct_children_by_node)
+
+        # standard stack based implementation for iterating over the dag in breadth first fashion
+        stack = [ root ]
+
+        while stack:
+            node = stack.pop()
+
+            # get all the nodes children
+            children = list(children_by_node[node])
+
+            # no need to sort if there is just one child
+            if len(children) > 1:
+
+                # child_to_lowest_value_terminal will contain a mapping if each of nodes' childlren to
+                # their respective earliest terminal that it's directly connected to
+                child_to_lowest_value_terminal = {}
+                for child in children:
+
+                    # in the case of a non-terminal ...
+                    if child.split('.')[0] == '1':
+                        earliest_terminal_id = earliest_terminals.get(child)
+                        if earliest_terminal_id is None:
+                            raise ValueError('node {0} has no direct terminal descendants'.format(child))
+
+                    else:
+                        #'child' is a terminal, so it's 'earliest_terminal_id' is basically itself ..
+                        earliest_terminal_id = int(child.split('.')[1])
+
+                    child_to_lowest_value_terminal[child] = earliest_terminal_id
+
+                # finally sort the children based on their earliest terminal id
+                children = [child for child, _ in sorted( child_to_lowest_value_terminal.items(), key=lambda x: x[1] ) ]
+
+            # now we can add edges in proper order
+            for child_node in children:
+                edge = edge_lookup[(node, child_node)]
+                ucca_parsed_passage.add_edge(edge)
+
+            # we are popping from a stack so in order to treat the children in their proper
+            # order we need to push them to stack in reverse order
+            children.reverse()
+            stack += children
+
+        return ucca_parsed_passage
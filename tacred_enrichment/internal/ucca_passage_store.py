@@ -0,0 +1,134 @@
+import errno
+import hashlib
+import os
+import pickle
+import sqlite3
+from pathlib import Path
+
+from tacred_enrichment.internal.ucca_packed_passages import UccaPackedPassageReader
+from tacred_enrichment.internal.ucca_types import UccaParsedPassage
+
+
+class UccaPassageStore(object):
+    """
+    'UccaPassageStore' keeps the UCCA parse of each enriched TACRED entry, keyed by the entry's id, so that
+    enhancers can later be (re)run over an enriched file without parsing it all over again.
+
+    The store is an sqlite file with a table of passages, each stored once per distinct sentence (serialized
+    along with a pickle of its native ucca passage, as in 'UccaParseCache'), and a table mapping entry ids to
+    their passage.
+
+    Methods
+    -------
+    put
+        stores the parses of a number of entries
+    get
+        returns the stored UccaParsedPassage of an entry, or None
+    entries
+        yields the id and UccaParsedPassage of each stored entry, in the order they were stored
+    close
+        closes the store, checkpointing its write ahead log into the sqlite file
+
+    """
+
+    def __init__(self, store_file, read_only=False):
+        """
+
+        Parameters
+        ----------
+        store_file
+            path of the sqlite file backing the store; it is created if it doesn't exist, unless 'read_only'
+        read_only
+            open an existing store for lookups only; FileNotFoundError is raised if there is no such file
+        """
+
+        if read_only:
+            if not os.path.isfile(store_file):
+                raise FileNotFoundError(errno.ENOENT, 'no passage store', store_file)
+
+            self.__connection = sqlite3.connect(Path(store_file).resolve().as_uri() + '?mode=ro', uri=True, isolation_level=None)
+
+        else:
+            # several worker processes may write to the same store, hence the generous timeout and WAL mode
+            self.__connection = sqlite3.connect(store_file, timeout=60, isolation_level=None)
+            self.__connection.execute('PRAGMA journal_mode=WAL')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS passages (key TEXT PRIMARY KEY, serialization TEXT, native BLOB)')
+            self.__connection.execute('CREATE TABLE IF NOT EXISTS entries (id TEXT PRIMARY KEY, key TEXT)')
+
+        # keys of the passages this instance has stored, which needn't be serialized again
+        self.__stored_keys = set()
+
+    @staticmethod
+    def __key(sentence):
+        return hashlib.sha1(sentence.encode('utf-8')).hexdigest()
+
+    def put(self, entries):
+        """
+
+        Parameters
+        ----------
+        entries
+            (entry id, sentence, UccaParsedPassage) tuples, all stored in a single transaction
+        """
+        passages = []
+        entry_keys = []
+        for entry_id, sentence, parsed_passage in entries:
+            key = UccaPassageStore.__key(sentence)
+            entry_keys.append((entry_id, key))
+
+            if key not in self.__stored_keys:
+                self.__stored_keys.add(key)
+
+                native = pickle.dumps(parsed_passage.native, protocol=pickle.HIGHEST_PROTOCOL) if parsed_passage.native is not None else None
+                passages.append((key, parsed_passage.serialize(), native))
+
+        self.__connection.execute('BEGIN')
+        try:
+            self.__connection.executemany('INSERT OR REPLACE INTO passages VALUES (?, ?, ?)', passages)
+            self.__connection.executemany('INSERT OR REPLACE INTO entries VALUES (?, ?)', entry_keys)
+            self.__connection.execute('COMMIT')
+        except sqlite3.Error:
+            self.__connection.execute('ROLLBACK')
+            raise
+
+    def get(self, entry_id):
+
+        row = self.__connection.execute('SELECT passages.serialization, passages.native FROM entries '
+                                        'JOIN passages ON passages.key = entries.key WHERE entries.id = ?', (entry_id,)).fetchone()
+        if row is None:
+            return None
+
+        return UccaPassageStore.__deserialize(*row)
+
+    def entries(self):
+
+        rows = self.__connection.execute('SELECT entries.id, passages.serialization, passages.native FROM entries '
+                                         'JOIN passages ON passages.key = entries.key ORDER BY entries.rowid')
+        for entry_id, serialization, native in rows:
+            yield entry_id, UccaPassageStore.__deserialize(serialization, native)
+
+    def close(self):
+        self.__connection.close()
+
+    @staticmethod
+    def __deserialize(serialization, native):
+        parsed_passage = UccaParsedPassage.from_serialization(serialization)
+        parsed_passage.native = pickle.loads(native) if native is not None else None
+
+        return parsed_passage
+
+
+def open_passages(passages_file):
+    """
+    'open_passages' opens a file of entry passages for lookup by entry id (through a 'get' method): a packed
+    passage file (see 'UccaPackedPassageReader'), or otherwise a passage store, opened read only.
+    FileNotFoundError is raised if 'passages_file' doesn't exist.
+
+    """
+    if not os.path.isfile(passages_file):
+        raise FileNotFoundError(errno.ENOENT, 'no passages file', passages_file)
+
+    if UccaPackedPassageReader.is_packed_passage_file(passages_file):
+        return UccaPackedPassageReader(passages_file)
+
+    return UccaPassageStore(passages_file, read_only=True)
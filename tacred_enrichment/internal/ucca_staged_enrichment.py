@@ -0,0 +1,198 @@
+import time
+from collections import OrderedDict, namedtuple
+from multiprocessing import Process, Queue
+from queue import Empty
+from signal import signal, SIGINT, SIGTERM, SIG_DFL, SIG_IGN
+from threading import Event, Thread
+
+from more_itertools import chunked
+
+from tacred_enrichment.internal.parser_settings import create_parser, get_cache_stats, report_cache_stats
+from tacred_enrichment.internal.run_metrics import metrics
+from tacred_enrichment.internal.sentence_memo import SentenceMemo
+from tacred_enrichment.internal.staged_pipeline import END_OF_INPUT, QueueDepthMonitor, StageFailure, feed, run_stage
+from tacred_enrichment.internal.ucca_batch_enhancement import complete_batch, find_unparsed, parse_unparsed, sanitize_batch
+from tacred_enrichment.internal.ucca_passage_store import UccaPassageStore
+
+
+# the staged pipeline runs parsing and enhancing in a process each; 'parse_stage' and 'enhance_stage' are their targets
+
+# seconds the calling thread waits for an enhanced batch before checking that the stage processes are still running
+STAGE_CHECK_INTERVAL = 1.0
+
+class SentenceParse(namedtuple('SentenceParse', 'tokens, remembered, parsed_sentence')):
+    """
+    'SentenceParse' is what the parse stage passes on for each distinct sentence of a batch: either its
+    'parsed_sentence' (None if it couldn't be parsed) or, if 'remembered' is set, no parse at all: the sentence was
+    parsed before, and its analysis is to be reused
+    """
+
+
+def parse_stage(input_queue, output_queue, parser_settings, batch_size, memo_size):
+    """
+    'parse_stage' parses the sentences of each batch of entries it gets, passing the batch on along with a
+    SentenceParse per distinct sentence. The parse stage alone decides which sentences are remembered rather than
+    parsed again, by keeping a memo of the parsed sentences; along with each batch it also passes on the sentences
+    its memo forgot, whose analyses the enhance stage may then forget too.
+
+    """
+    signal(SIGINT, SIG_IGN)
+    signal(SIGTERM, SIG_DFL)
+
+    parser = None
+
+    def create_handler():
+        nonlocal parser
+        parser = create_parser(parser_settings)
+        parsed_memo = SentenceMemo(memo_size)
+
+        def parse(message):
+            input_offset, batch = message
+            batch_tokens = sanitize_batch(batch)
+
+            remembered, unparsed = find_unparsed(batch_tokens, parsed_memo)
+
+            start = time.perf_counter()
+            parsed_sentences = parse_unparsed(parser, unparsed, batch_size)
+            parse_seconds = time.perf_counter() - start
+
+            forgotten = []
+            for tokens in unparsed:
+                forgotten_tokens = parsed_memo.put(tokens, True)
+                if forgotten_tokens is not None:
+                    forgotten.append(forgotten_tokens)
+
+            sentence_parses = [SentenceParse(tokens, True, None) for tokens, found in remembered.items() if found is not None]
+            sentence_parses += [SentenceParse(tokens, False, parsed_sentence) for tokens, parsed_sentence in zip(unparsed, parsed_sentences)]
+
+            return input_offset, batch, batch_tokens, sentence_parses, forgotten, parse_seconds, metrics.drain()
+
+        return parse
+
+    run_stage('parse', create_handler, input_queue, output_queue)
+
+    if parser_settings.cache_file is not None and parser is not None:
+        report_cache_stats([get_cache_stats(parser)])
+
+
+def enhance_stage(input_queue, output_queue, enhancers, save_passages):
+    """
+    'enhance_stage' analyzes the sentences the parse stage parsed and enhances the entries of each batch with
+    'enhancers'. It keeps the analysis of every sentence the parse stage remembers, as told by the SentenceParse
+    objects and the forgotten sentences passed along with each batch.
+
+    """
+    signal(SIGINT, SIG_IGN)
+    signal(SIGTERM, SIG_DFL)
+
+    store = None
+
+    def create_handler():
+        nonlocal store
+        remembered = {}
+        store = UccaPassageStore(save_passages) if save_passages is not None else None
+
+        def enhance_parsed(message):
+            input_offset, batch, batch_tokens, sentence_parses, forgotten, parse_seconds, parse_metrics = message
+            metrics.merge(parse_metrics)
+
+            analyses = {sentence_parse.tokens: remembered[sentence_parse.tokens] for sentence_parse in sentence_parses if sentence_parse.remembered}
+            parsed = [sentence_parse for sentence_parse in sentence_parses if not sentence_parse.remembered]
+            unparsed = [sentence_parse.tokens for sentence_parse in parsed]
+
+            enhanced = complete_batch(enhancers, batch, batch_tokens, analyses, unparsed, [sentence_parse.parsed_sentence for sentence_parse in parsed],
+                                      None, store, parse_seconds)
+
+            for tokens in unparsed:
+                remembered[tokens] = analyses[tokens]
+            for tokens in forgotten:
+                del remembered[tokens]
+
+            return input_offset, len(batch), enhanced, metrics.drain()
+
+        return enhance_parsed
+
+    run_stage('enhance', create_handler, input_queue, output_queue)
+
+    if store is not None:
+        store.close()
+
+
+class StagedDriver(object):
+    """
+    'StagedDriver' runs the enrichment as a pipeline: a thread reads and decodes batches of entries, a process
+    parses them, another analyzes and enhances them, and the calling thread hands them to 'done' (see 'SerialDriver').
+    The stages are connected by queues holding up to 'queue_size' batches, so a stage that falls behind holds
+    back the ones before it; with a single process per stage the batches stay in input order throughout.
+    The depth of the queues is sampled and reported once done.
+
+    """
+
+    def __init__(self, enhancers, parser_settings, batch_size, memo_size, save_passages, queue_size):
+        self.__enhancers = enhancers
+        self.__parser_settings = parser_settings
+        self.__batch_size = batch_size
+        self.__memo_size = memo_size
+        self.__save_passages = save_passages
+        self.__queue_size = queue_size
+
+    def run(self, entries, done):
+        batches = Queue(self.__queue_size)
+        parsed = Queue(self.__queue_size)
+        enhanced = Queue(self.__queue_size)
+
+        stopping = Event()
+        reader = Thread(target=feed, daemon=True,
+                        args=('read', ((batch[-1][0], [item for _, item in batch]) for batch in chunked(entries, self.__batch_size)), batches, stopping))
+
+        stages = [Process(target=parse_stage, name='parse', args=(batches, parsed, self.__parser_settings, self.__batch_size, self.__memo_size)),
+                  Process(target=enhance_stage, name='enhance', args=(parsed, enhanced, self.__enhancers, self.__save_passages))]
+
+        monitor = QueueDepthMonitor(OrderedDict([('parse', batches), ('enhance', parsed), ('write', enhanced)]), self.__queue_size)
+
+        reader.start()
+        for stage in stages:
+            stage.start()
+        monitor.start()
+
+        finished = False
+        try:
+            while True:
+                # taken before waiting: a stage that had already ended by then has put all it ever will on its queue
+                exit_codes = [stage.exitcode for stage in stages]
+
+                try:
+                    message = enhanced.get(timeout=STAGE_CHECK_INTERVAL)
+                except Empty:
+                    # a stage killed (or crashing) without a StageFailure leaves the stages after it waiting forever,
+                    # as does an enhance stage that ended without its last batches reaching this thread
+                    for stage, exit_code in zip(stages, exit_codes):
+                        if exit_code not in (None, 0) or (exit_code == 0 and stage is stages[-1]):
+                            raise RuntimeError('{0} stage died with exit code {1}'.format(stage.name, exit_code))
+                    continue
+
+                if message is END_OF_INPUT:
+                    finished = True
+                    break
+
+                if isinstance(message, StageFailure):
+                    raise RuntimeError('{0} stage failed:\n{1}'.format(message.stage, message.details))
+
+                input_offset, batch_count, items, stage_metrics = message
+                metrics.merge(stage_metrics)
+
+                if not done(input_offset, batch_count, items):
+                    break
+
+        finally:
+            stopping.set()
+            monitor.stop()
+
+            # the queues may still hold batches no one is going to take off them
+            batches.cancel_join_thread()
+            for stage in stages:
+                if not finished:
+                    stage.terminate()
+                stage.join()
+
+        monitor.report()
@@ -0,0 +1,67 @@
+import time
+
+from more_itertools import chunked
+
+from tacred_enrichment.internal.run_metrics import metrics
+from tacred_enrichment.internal.sentence_memo import SentenceAnalysis, SentenceFailure, SentenceMemo
+from tacred_enrichment.internal.ucca_batch_enhancement import complete_batch, find_unparsed, sanitize_batch
+from tacred_enrichment.internal.ucca_passage_store import open_passages
+
+
+def enhance_stored_batch(enhancers, store, batch, memo):
+    """
+    'enhance_stored_batch' enhances a list of (already enriched) TACRED entries using the parses kept for
+    them in a passage 'store' rather than parsing them, and returns them in their original order (see
+    'complete_batch'). Entries without a stored parse are rejected.
+
+    """
+    batch_tokens = sanitize_batch(batch)
+
+    analyses, unparsed = find_unparsed(batch_tokens, memo)
+
+    # entries sharing a sentence share its parse, so that of the first of them will do
+    entry_ids = {}
+    for item, tokens in zip(batch, batch_tokens):
+        entry_ids.setdefault(tokens, item['id'])
+
+    start = time.perf_counter()
+
+    stored = []
+    for tokens in unparsed:
+        with metrics.timer('passage_lookup'):
+            parsed_sentence = store.get(entry_ids[tokens])
+
+        # the reason is the same for every entry (whose id the rejection carries), so that misses are counted together
+        if parsed_sentence is None:
+            analyses[tokens] = SentenceAnalysis(None, None, None, None, None, None, SentenceFailure('passage_lookup', 'no stored UCCA passage'))
+        else:
+            stored.append((tokens, parsed_sentence))
+
+    return complete_batch(enhancers, batch, batch_tokens, analyses, [tokens for tokens, _ in stored],
+                          [parsed_sentence for _, parsed_sentence in stored], memo, parse_seconds=time.perf_counter() - start)
+
+
+class StoredPassageDriver(object):
+    """
+    'StoredPassageDriver' enhances the (already enriched) entries of an enrichment run using the parses kept for them
+    in a passage store - or a packed passage file made of one - rather than parsing them (see 'SerialDriver' and
+    'enhance_stored_batch'), so no TUPA model is needed
+
+    """
+
+    def __init__(self, enhancers, passages_file, batch_size, memo_size):
+        self.__enhancers = enhancers
+        self.__passages_file = passages_file
+        self.__batch_size = batch_size
+        self.__memo_size = memo_size
+
+    def run(self, entries, done):
+        store = open_passages(self.__passages_file)
+        memo = SentenceMemo(self.__memo_size)
+
+        try:
+            for batch in chunked(entries, self.__batch_size):
+                if not done(batch[-1][0], len(batch), enhance_stored_batch(self.__enhancers, store, [item for _, item in batch], memo)):
+                    break
+        finally:
+            store.close()
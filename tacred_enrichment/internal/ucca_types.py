@@ -1,13 +1,37 @@
 import json
+import sys
 from itertools import chain
 
 from tacred_enrichment.internal.link import Link
 
 
+def _intern(tag):
+    # edge tags and classifications come from a small vocabulary; interning them means that each passage
+    # (and each node) refers to one shared string object per tag rather than to its own copies
+    return sys.intern(tag) if isinstance(tag, str) else tag
+
+
 class UccaNode(object):
+    """
+    'UccaNode' is a node of a UCCA parse. Besides its string id (e.g. '1.12') it carries the integer
+    'layer' and 'index' that make up that id, so that they needn't be parsed out of it again and again.
+    Nodes are slotted, to keep passages held in memory (say, in a cache) small.
+    """
+
+    __slots__ = ('node_id', 'layer', 'index', 'edge_tags_in')
+
     def __init__(self, node_id, edge_tags_in):
         self.node_id = node_id
-        self.edge_tags_in = [x for i, x in enumerate(edge_tags_in) if edge_tags_in.index(x) == i]
+
+        layer, _, index = node_id.partition('.')
+        self.layer = int(layer)
+        self.index = int(index)
+
+        # drop duplicate tags while retaining their order
+        self.edge_tags_in = [_intern(tag) for tag in dict.fromkeys(edge_tags_in)]
+
+    def is_terminal(self):
+        return self.layer == 0
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
@@ -26,24 +50,30 @@ class UccaNode(object):
 
 
 class UccaTerminalNode(UccaNode):
+
+    __slots__ = ('token_id', 'text', 'lemma', 'tag', 'pos', 'ent', 'head')
+
     def __init__(self, node_id, edge_tags_in, token_id, text, lemma, tag=None, pos=None, ent=None, head=None):
         super().__init__(node_id, edge_tags_in)
 
         self.token_id = token_id
         self.text = text
         self.lemma = lemma
-        self.tag = tag
-        self.pos = pos
-        self.ent = ent
+        self.tag = _intern(tag)
+        self.pos = _intern(pos)
+        self.ent = _intern(ent)
         self.head = head
 
 
 class UccaEdge(object):
+
+    __slots__ = ('child', 'parent', 'tag', 'classification')
+
     def __init__(self, child, parent, tag, classification):
         self.child = child
         self.parent = parent
-        self.tag = tag
-        self.classification = classification
+        self.tag = _intern(tag)
+        self.classification = _intern(classification)
 
     def __eq__(self, other):
         if isinstance(other, self.__class__):
@@ -66,6 +96,12 @@ class UccaEdge(object):
 
 
 class UccaParsedPassage(object):
+
+    __slots__ = ('native', 'terminals', 'non_terminals', 'edges', '__node_by_node_id', '__node_id_by_token_id', '__indexed')
+
+    # version of the json layout produced by 'serialize'
+    SERIALIZATION_VERSION = 1
+
     class UccaParsedPassageEncoding(json.JSONEncoder):
 
         def default(self, z):
@@ -81,6 +117,7 @@ class UccaParsedPassage(object):
 
             elif isinstance(z, UccaParsedPassage):
                 data = {}
+                data['version'] = UccaParsedPassage.SERIALIZATION_VERSION
                 data['terminals'] = z.terminals
                 data['non_terminals'] = z.non_terminals
                 data['edges'] = z.edges
@@ -92,6 +129,52 @@ class UccaParsedPassage(object):
     def __init__(self, native=None):
         self.native = native
 
+        self.terminals = []
+        self.non_terminals = []
+        self.edges = []
+
+        # lookup indexes by node id and by token id; they are maintained by the 'add_*' methods, and
+        # rebuilt on demand should the node lists have been assigned or appended to directly
+        self.__node_by_node_id = {}
+        self.__node_id_by_token_id = {}
+        self.__indexed = None
+
+    def __index_signature(self):
+        return id(self.terminals), len(self.terminals), id(self.non_terminals), len(self.non_terminals)
+
+    def __index_node(self, node):
+        # as with a linear scan, the first node with a given id wins
+        self.__node_by_node_id.setdefault(node.node_id, node)
+
+        if isinstance(node, UccaTerminalNode):
+            self.__node_id_by_token_id.setdefault(node.token_id, node.node_id)
+
+    def __ensure_indexed(self):
+        if self.__indexed == self.__index_signature():
+            return
+
+        self.__node_by_node_id = {}
+        self.__node_id_by_token_id = {}
+        for node in chain(self.terminals, self.non_terminals):
+            self.__index_node(node)
+
+        self.__indexed = self.__index_signature()
+
+    def add_terminal(self, terminal):
+        self.__ensure_indexed()
+        self.terminals.append(terminal)
+        self.__index_node(terminal)
+        self.__indexed = self.__index_signature()
+
+    def add_non_terminal(self, non_terminal):
+        self.__ensure_indexed()
+        self.non_terminals.append(non_terminal)
+        self.__index_node(non_terminal)
+        self.__indexed = self.__index_signature()
+
+    def add_edge(self, edge):
+        self.edges.append(edge)
+
     def serialize(self):
         return json.dumps(self, cls=UccaParsedPassage.UccaParsedPassageEncoding)
 
@@ -101,9 +184,10 @@ class UccaParsedPassage(object):
         for node in chain(self.terminals, self.non_terminals):
             node_to_children[node] = []
 
+        self.__ensure_indexed()
         for edge in self.edges:
-            parent = self.get_ucca_node_by_node_id(edge.parent.node_id)
-            child = self.get_ucca_node_by_node_id(edge.child.node_id)
+            parent = self.__node_by_node_id[edge.parent.node_id]
+            child = self.__node_by_node_id[edge.child.node_id]
 
             node_to_children[parent].append(child)
 
@@ -116,20 +200,23 @@ class UccaParsedPassage(object):
             node_to_parents[node] = []
 
 
+        self.__ensure_indexed()
         for edge in self.edges:
 
-            child = self.get_ucca_node_by_node_id(edge.child.node_id)
-            parent = self.get_ucca_node_by_node_id(edge.parent.node_id)
+            child = self.__node_by_node_id[edge.child.node_id]
+            parent = self.__node_by_node_id[edge.parent.node_id]
 
             node_to_parents[child].append(parent)
 
         return node_to_parents
 
     def get_ucca_node_by_node_id(self, node_id):
-        return next(node for node in chain(self.terminals, self.non_terminals) if node.node_id == node_id)
+        self.__ensure_indexed()
+        return self.__node_by_node_id[node_id]
 
     def get_node_id_by_token_id(self, token_id):
-        return next(terminal.node_id for terminal in self.terminals if terminal.token_id == token_id)
+        self.__ensure_indexed()
+        return self.__node_id_by_token_id[token_id]
 
     def get_links(self):
         """
@@ -195,115 +282,79 @@ class UccaParsedPassage(object):
 
     @staticmethod
     def from_serialization(serialization: str):
+        """
+        'from_serialization' reconstructs a UccaParsedPassage from the json produced by 'serialize'
 
-        self = UccaParsedPassage()
+        Parameters
+        ----------
+        serialization
+            json string, as produced by 'serialize'
 
-        self.terminals = []
-        self.non_terminals = []
-        self.edges = []
+        Returns
+        -------
+            the deserialized UccaParsedPassage; a ValueError is raised if 'serialization' is malformed
+
+        """
+
+        try:
+            representation = json.loads(serialization)
+        except ValueError as e:
+            raise ValueError('malformed UccaParsedPassage serialization: {0}'.format(e)) from e
+
+        return UccaParsedPassage.from_representation(representation)
+
+    @staticmethod
+    def from_serializations(stream):
+        """
+        'from_serializations' decodes a file of serialized passages, one per line, yielding them one at
+        a time; a ValueError identifying the offending line is raised for a malformed one
+
+        """
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+
+            try:
+                yield UccaParsedPassage.from_serialization(line)
+            except ValueError as e:
+                raise ValueError('line {0}: {1}'.format(line_number, e)) from e
 
-        #edge_lookup = OrderedDict()
+    @staticmethod
+    def from_representation(representation):
+        """
+        'from_representation' reconstructs a UccaParsedPassage from the already json decoded output of
+        'serialize'; a ValueError is raised if 'representation' is malformed
+
+        """
+
+        if not isinstance(representation, dict):
+            raise ValueError('malformed UccaParsedPassage serialization: expected an object')
+
+        # serializations preceding the introduction of the version header have the same layout as version 1
+        version = representation.get('version', 1)
+        if version != UccaParsedPassage.SERIALIZATION_VERSION:
+            raise ValueError('unsupported UccaParsedPassage serialization version {0}'.format(version))
+
+        self = UccaParsedPassage()
 
         try:
-            representation = eval(serialization)
-
-            for element in representation['terminals']:
-                terminal = UccaTerminalNode(element[0],
-                                            ['Terminal'],
-                                            element[1],
-                                            element[2],
-                                            element[3],
-                                            element[4],
-                                            element[5])
-                self.terminals.append(terminal)
-
-            for element in representation['non_terminals']:
-                non_terminal = UccaNode(element[0], element[1])
-                self.non_terminals.append(non_terminal)
-
-            for element in representation['edges']:
-                child_id = element[0]
-                parent_id = element[1]
-                edge_tag = element[2]
-                classification = element[3]
-
-                child = next(node for node in chain(self.non_terminals, self.terminals) if node.node_id == child_id)
-                parent = next(node for node in chain(self.non_terminals, self.terminals) if node.node_id == parent_id)
-
-                self.edges.append(UccaEdge(child, parent, edge_tag, classification))
-                #edge_lookup[(parent_id, child_id)] = UccaEdge(child, parent, edge_tag, classification)
-
-        except:
-            return None
-
-
-        # # the edges in the serialization are not in proper order - specifically children of a given parent are not
-        # # in the order appropriate to the actual terminals ...
-        #
-        # # the following sequence fixes this up by sorting children based on their earliest direct terminal descendant
-        #
-        # # we'll first create a DiGraph with all the edges - this DiGraph will allow us to easily iterate over the edges
-        # # in breadth first fashion (something we couldn't do by just considering the edge list)
-        # digraph_with_remotes = networkx.DiGraph(list(edge_lookup.keys()))
-        #
-        # # and then a DiGraph without remote edges - we'll use this for  sorting
-        # digraph_without_remotes = networkx.DiGraph( [ edge_key for edge_key, edge in edge_lookup.items() if edge.classification == 'direct' ] )
-        #
-        # # there might be a better way for finding the root of the dag; i didn't find one
-        # root = next(networkx.topological_sort(digraph_with_remotes))
-        #
-        # # standard stack based implementation for iterating over the dag in breadth first fashion
-        # stack = [ root ]
-        #
-        # while stack:
-        #     node = stack.pop()
-        #
-        #     # get all the nodes children
-        #     children = list(digraph_with_remotes.successors(node))
-        #
-        #     # no need to sort if there is just one child
-        #     if len(children) > 1:
-        #
-        #         # child_to_lowest_value_terminal will contain a mapping if each of nodes' childlren to
-        #         # their respective earliest terminal that it's directly connected to
-        #         child_to_lowest_value_terminal = {}
-        #         for child in children:
-        #
-        #             # in the case of a non-terminal ...
-        #             if child.split('.')[0] == '1':
-        #                 # only consider direct descendants (that's why we call networkx.descendants on 'digraph_without_remotes'
-        #                 # and not on 'digraph_with_remotes'
-        #                 descendants = networkx.descendants(digraph_without_remotes, child)
-        #
-        #                 # terminal descendants all have ids with a '0.x' format, where x is an integer that reflects the token
-        #                 # index of the terminal
-        #                 terminal_descendants = [ int(descendant.split('.')[1]) for descendant in descendants if descendant.split('.')[0] == '0' ]
-        #
-        #                 # get the earliest terminal id for child by sorting it terminal descendants and then
-        #                 # picking the first one
-        #                 terminal_descendants.sort()
-        #                 earliest_terminal_id = terminal_descendants[0]
-        #
-        #             else:
-        #                 #'child' is a terminal, so it's 'earliest_terminal_id' is basically itself ..
-        #                 earliest_terminal_id = int(child.split('.')[1])
-        #
-        #             child_to_lowest_value_terminal[child] = earliest_terminal_id
-        #
-        #         # finally sort the children based on their earliest terminal id
-        #         children = [child for child, _ in sorted( child_to_lowest_value_terminal.items(), key=lambda x: x[1] ) ]
-        #
-        #     # now we can add edges in proper order
-        #     for child_node in children:
-        #         edge = edge_lookup[(node, child_node)]
-        #         self.edges.append( edge )
-        #
-        #     # we are popping from a stack so in order to treat the children in their proper
-        #     # order we need to push them to stack in reverse order
-        #     children.reverse()
-        #     stack += children
+            for node_id, token_id, text, lemma, tag, pos, ent, head in representation['terminals']:
+                self.add_terminal(UccaTerminalNode(node_id, ['Terminal'], token_id, text, lemma, tag, pos, ent, head))
+
+            for node_id, edge_tags_in in representation['non_terminals']:
+                self.add_non_terminal(UccaNode(node_id, edge_tags_in))
+
+            for child_id, parent_id, edge_tag, classification in representation['edges']:
+                child = self.get_ucca_node_by_node_id(child_id)
+                parent = self.get_ucca_node_by_node_id(parent_id)
+
+                self.add_edge(UccaEdge(child, parent, edge_tag, classification))
 
+        except KeyError as e:
+            raise ValueError('malformed UccaParsedPassage serialization: unknown node or missing section {0}'.format(e)) from e
 
+        except (TypeError, ValueError) as e:
+            raise ValueError('malformed UccaParsedPassage serialization: {0}'.format(e)) from e
 
         return self
 
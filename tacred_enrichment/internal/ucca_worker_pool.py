@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+from collections import defaultdict, deque
+from functools import partial
+from multiprocessing import Pool
+from multiprocessing.util import Finalize
+from signal import signal, SIGINT, SIGTERM, SIG_DFL, SIG_IGN
+from threading import Semaphore
+
+from more_itertools import chunked
+
+from tacred_enrichment.internal.parser_settings import create_parser, get_cache_stats, report_cache_stats
+from tacred_enrichment.internal.run_metrics import metrics
+from tacred_enrichment.internal.sentence_memo import SentenceMemo
+from tacred_enrichment.internal.ucca_batch_enhancement import enhance_batch
+from tacred_enrichment.internal.ucca_passage_store import UccaPassageStore
+
+
+# each worker process holds the enhancers it runs, its own parser, sentence memo and passage store, which are
+# instantiated once by 'init_worker'
+worker_enhancers = None
+worker_parser = None
+worker_memo = None
+worker_store = None
+
+
+def init_worker(enhancers, parser_settings, memo_size, save_passages):
+    global worker_enhancers, worker_parser, worker_memo, worker_store
+
+    # stopping is coordinated by the parent process, which gets to checkpoint before the pool is terminated; the
+    # parent's graceful SIGTERM handler isn't inherited, or terminating the pool would never end its workers
+    signal(SIGINT, SIG_IGN)
+    signal(SIGTERM, SIG_DFL)
+
+    worker_enhancers = enhancers
+    worker_parser = create_parser(parser_settings)
+    worker_memo = SentenceMemo(memo_size)
+    worker_store = UccaPassageStore(save_passages) if save_passages is not None else None
+
+    # run as the worker exits once the pool is closed; a terminated worker leaves its write ahead log to the next connection
+    if worker_store is not None:
+        Finalize(worker_store, worker_store.close, exitpriority=0)
+
+
+def enhance_chunk(chunk, batch_size):
+    """
+    'enhance_chunk' runs in a worker process; it returns the worker's pid, the number of entries processed,
+    the time it took, the enhanced entries, the worker's parse cache counters and its metrics (since the
+    previous chunk), so that the parent process can write the entries and report on them
+
+    """
+    start = time.time()
+
+    enhanced = []
+    for batch in chunked(chunk, batch_size):
+        enhanced += enhance_batch(worker_enhancers, worker_parser, batch, batch_size, worker_memo, worker_store)
+
+    return os.getpid(), len(chunk), time.time() - start, enhanced, get_cache_stats(worker_parser), metrics.drain()
+
+
+def report_throughput(worker_stats):
+    for pid, (count, elapsed) in sorted(worker_stats.items()):
+        rate = count / elapsed if elapsed > 0 else 0.0
+        print('worker {0}: {1} entries in {2:.1f}s ({3:.2f} entries/s)'.format(pid, count, elapsed, rate), file=sys.stderr)
+
+
+class WorkerPoolDriver(object):
+    """
+    'WorkerPoolDriver' parses and enhances the entries of an enrichment run in a pool of 'workers' processes, each
+    with its own parser, handing them 'chunk_size' entries at a time (see 'SerialDriver' for what a driver does).
+    The number of entries each worker enhanced, and how fast, is reported once done.
+
+    """
+
+    def __init__(self, enhancers, parser_settings, batch_size, memo_size, save_passages, workers, chunk_size):
+        if parser_settings.annotation_processes > 1:
+            raise ValueError('spaCy annotation processes are not supported with multiple workers')
+
+        self.__enhancers = enhancers
+        self.__parser_settings = parser_settings
+        self.__batch_size = batch_size
+        self.__memo_size = memo_size
+        self.__save_passages = save_passages
+        self.__workers = workers
+        self.__chunk_size = chunk_size
+
+    def run(self, entries, done):
+        # 'Pool.imap' would otherwise read the entire input up front; the semaphore caps the number of
+        # chunks that are in flight, and is released as each result is written
+        in_flight = Semaphore(self.__workers * 2)
+
+        # 'Pool.imap' returns results in the order the chunks were submitted, so the input offset
+        # following each chunk can be queued here and picked up as its result arrives
+        chunk_offsets = deque()
+
+        def throttled_chunks():
+            for chunk in chunked(entries, self.__chunk_size):
+                in_flight.acquire()
+                chunk_offsets.append(chunk[-1][0])
+                yield [item for _, item in chunk]
+
+        worker_stats = defaultdict(lambda: [0, 0.0])
+        worker_cache_stats = {}
+
+        finished = False
+        initargs = (self.__enhancers, self.__parser_settings, self.__memo_size, self.__save_passages)
+        with Pool(self.__workers, initializer=init_worker, initargs=initargs) as pool:
+            try:
+                for pid, chunk_count, elapsed, enhanced, cache_stats, worker_metrics in pool.imap(partial(enhance_chunk, batch_size=self.__batch_size), throttled_chunks()):
+                    metrics.merge(worker_metrics)
+
+                    worker_stats[pid][0] += chunk_count
+                    worker_stats[pid][1] += elapsed
+                    if cache_stats is not None:
+                        worker_cache_stats[pid] = cache_stats
+                    in_flight.release()
+
+                    if not done(chunk_offsets.popleft(), chunk_count, enhanced):
+                        break
+                else:
+                    finished = True
+            finally:
+                # make sure the thread feeding the pool isn't left blocked should we bail out early
+                for _ in range(self.__workers * 2):
+                    in_flight.release()
+
+            # once all is done the workers are let to exit, rather than terminated, so that they close their stores
+            if finished:
+                pool.close()
+                pool.join()
+
+        report_throughput(worker_stats)
+        report_cache_stats(list(worker_cache_stats.values()))
@@ -1,77 +1,233 @@
 """Enhance TAC with all UCCA stuff using UCCA tokenization
 
 Usage:
-  ucca_enrichment.py <tupa_module_path>  [--input=<input-file>] [--output=<output-file>]
+  ucca_enrichment.py <tupa_module_path> [--input=<input-file>] [--output=<output-file>] [--resume] [--batch-size=<batch-size>]
+                     [--workers=<workers>] [--chunk-size=<chunk-size>] [--staged] [--queue-size=<batches>]
+                     [--cache=<cache-file>] [--cache-size=<megabytes>] [--cache-hash-model] [--memo-size=<sentences>]
+                     [--spacy-batch-size=<batch-size>] [--spacy-processes=<processes>] [--parser-backend=<backend>]
+                     [--dep-graph=<backend>] [--enhancers=<outputs>] [--save-passages=<passages-file>]
+                     [--stats=<stats-file>] [--report-interval=<seconds>] [--rejects=<rejects-file>]
+                     [--only-ids=<ids> | --retry-rejects=<rejects-file>]
+  ucca_enrichment.py --parser-backend=<backend> [--input=<input-file>] [--output=<output-file>] [--resume] [--batch-size=<batch-size>]
+                     [--workers=<workers>] [--chunk-size=<chunk-size>] [--staged] [--queue-size=<batches>]
+                     [--memo-size=<sentences>] [--dep-graph=<backend>] [--enhancers=<outputs>] [--save-passages=<passages-file>]
+                     [--stats=<stats-file>] [--report-interval=<seconds>] [--rejects=<rejects-file>]
+                     [--only-ids=<ids> | --retry-rejects=<rejects-file>]
+  ucca_enrichment.py --from-passages=<passages-file> [--input=<input-file>] [--output=<output-file>] [--resume] [--batch-size=<batch-size>]
+                     [--memo-size=<sentences>] [--dep-graph=<backend>] [--enhancers=<outputs>]
+                     [--stats=<stats-file>] [--report-interval=<seconds>] [--rejects=<rejects-file>]
+                     [--only-ids=<ids> | --retry-rejects=<rejects-file>]
   ucca_enrichment.py (-h | --help)
 
 Options:
-  -h --help     Show this screen.
+  -h --help                   Show this screen.
+  --batch-size=<batch-size>   Number of entries to read ahead and parse together, grouped by sentence length [default: 1]
+  --workers=<workers>         Number of worker processes, each with its own TUPA parser [default: 1]
+  --chunk-size=<chunk-size>   Number of entries handed to a worker process at a time [default: 32]
+  --resume                    Resume an interrupted run from the journal kept next to the output file
+  --cache=<cache-file>        Persistent UCCA parse cache; sentences found in it are not parsed again
+  --cache-size=<megabytes>    Size cap of the parse cache, beyond which least recently used parses are evicted [default: 4096]
+  --cache-hash-model          Tell the parses of different TUPA models apart by hashing the content of the model files, rather than by their size and modification time
+  --memo-size=<sentences>     Number of recent sentences whose parse and sentence level enhancements are kept in memory [default: 1024]
+  --dep-graph=<backend>       Graph implementation used by the enhancers, 'networkx' or 'array' (overrides the TACRED_DEP_GRAPH_BACKEND environment variable; networkx if neither is set)
+  --spacy-batch-size=<batch-size>  Number of sentences spaCy annotates at a time, out of each parsed batch [default: 50]
+  --spacy-processes=<processes>    Number of processes spaCy annotates with, which requires spaCy 2.2.2 or later when above 1 (cannot be combined with --workers) [default: 1]
+  --staged                    Run reading, parsing, enhancing and writing as separate stages (threads and processes) connected by bounded queues, reporting each queue's depth at the end (cannot be combined with --workers)
+  --queue-size=<batches>      Number of batches each queue of the staged pipeline holds [default: 4]
+  --enhancers=<outputs>       Comma separated enhancer outputs to produce (e.g. ucca_path,dist_from_ucca_mh_path); only the enhancers producing them and those they depend on are run (all if not given)
+  --save-passages=<passages-file>  Keep the UCCA parse of each entry in a passage store, keyed by the entry's id
+  --from-passages=<passages-file>  Rather than parsing, read the parse of each entry from a passage store written by an earlier run (with --save-passages), or a packed passage file made of one (see extra/pack_passages.py), whose enriched output is then the input; the (re)computed enhancer outputs are merged into its entries
+  --stats=<stats-file>        Write run statistics - per stage timings and latency percentiles, the slowest entries and failure counts - to a json file
+  --report-interval=<seconds>  Seconds between summaries of the run statistics on stderr, 0 for none (a final summary is always given) [default: 60]
+  --parser-backend=<backend>  'live' parses with TUPA; 'record:<file>' parses with TUPA and records every parse in a file; 'replay:<file>' serves the parses recorded in a file rather than parsing, so no TUPA model is needed (sentences that weren't recorded fail to parse) [default: live]
+  --rejects=<rejects-file>    Write the entries that are dropped (failing to parse, to align with the UCCA tokens or to be found in the passage store) to a json lines file of their id, the failing stage and the reason
+  --only-ids=<ids>            Enhance only the input entries with these (comma separated) ids, and splice them into the existing output, in input order (as a full run writes them, not in id order), replacing entries with the same id
+  --retry-rejects=<rejects-file>  As --only-ids, with the ids of a rejects file written by an earlier run (see --rejects)
 """
+import os
 import sys
+from functools import partial
 
 import jsonlines
 from docopt import docopt
 
-from tacred_enrichment.internal.map_tokenization import MapTokenization
+from tacred_enrichment.internal.dep_graph_backend import set_dep_graph_backend
+from tacred_enrichment.internal.enrichment_journal import EnrichmentJournal
+from tacred_enrichment.internal.enrichment_rejects import Rejection, read_rejected_ids, retry_entries
+from tacred_enrichment.internal.graceful_stop import GracefulStop
+from tacred_enrichment.internal.parser_backend import REPLAY, parse_parser_backend
+from tacred_enrichment.internal.parser_settings import ParserSettings
 from tacred_enrichment.internal.pipe_error_work_around import revert_to_default_behaviour_on_sigpipe
-from tacred_enrichment.internal.sanitize_tacred import SanitizeTacred
-from tacred_enrichment.internal.tupa_parser import TupaParser
-from tacred_enrichment.internal.ucca_encodings import UccaEncoding
-from tacred_enrichment.internal.ucca_encodings_min_subtree import UccaEncodingMinSubtree
-from tacred_enrichment.internal.ucca_distances_from_path import UccaDistancesFromPath
-from tacred_enrichment.internal.ucca_heads import UccaHeads
-from tacred_enrichment.internal.ucca_path import UccaPath
+from tacred_enrichment.internal.run_metrics import metrics
+from tacred_enrichment.internal.ucca_batch_enhancement import SerialDriver
+from tacred_enrichment.internal.ucca_enhancer_registry import select_enhancers
+from tacred_enrichment.internal.ucca_staged_enrichment import StagedDriver
+from tacred_enrichment.internal.ucca_stored_enrichment import StoredPassageDriver
+from tacred_enrichment.internal.ucca_worker_pool import WorkerPoolDriver
+
+
+def write_items(json_write, rejects_write, items):
+    """
+    'write_items' writes enhanced entries to 'json_write', and the Rejections among them to 'rejects_write'
+    (unless it's None)
+
+    """
+    for item in items:
+        if isinstance(item, Rejection):
+            if rejects_write is not None:
+                rejects_write.write(item._asdict())
+            continue
+
+        with metrics.timer('json_write'):
+            json_write.write(item)
 
 
-def enhance(input_stream, output_stream, model_prefix):
+def commit(journal, output_stream, input_offset, count):
+    """
+    'commit' flushes everything written so far and records in the journal that all input entries up to
+    'input_offset' are done with
 
-    json_read = jsonlines.Reader(input_stream)
+    """
+    if journal is None:
+        return
 
-    with jsonlines.Writer(output_stream) as json_write:
+    output_stream.flush()
+    journal.commit(EnrichmentJournal.Progress(input_offset, output_stream.tell(), count))
 
-        parser = TupaParser(model_prefix)
 
-        for item in json_read:
-            sentence = ' '.join(SanitizeTacred.sanitize_tokens(item['token']))
-            parsed_sentence = parser.parse_sentence(sentence)
-            if parsed_sentence is None:
-                print('failed to perform UCCA parse')
-                continue
+def enhance(input_stream, output_stream, driver, journal=None, progress=None, rejects_file=None, stats_file=None, report_interval=None):
+    """
+    'enhance' reads TACRED json lines from the binary 'input_stream', has 'driver' (a SerialDriver, WorkerPoolDriver,
+    StagedDriver or StoredPassageDriver) parse and enhance them, and writes the UCCA enhanced entries to
+    'output_stream'. If a 'journal' is given, progress is committed to it after each batch (or chunk, when running
+    with multiple workers), and SIGTERM/SIGINT stop the run cleanly after the next commit.
+    A 'progress' read from a previous run's journal resumes from where that run stopped.
+    Timings, failures and the slowest entries are summarized on stderr every 'report_interval' seconds (if given)
+    and once done, when they are also written to 'stats_file' (if given) as json.
+    Entries that are dropped (since their sentence couldn't be parsed, aligned or found in the passage store) are
+    written to 'rejects_file', if given, as json lines of their id, the stage at which they failed and why.
 
-            sanitized_tac_tokens = SanitizeTacred.sanitize_tokens(item['token'])
-            ucca_tokens = [ucca_terminal.text for ucca_terminal in parsed_sentence.terminals]
-            tac_to_ucca = MapTokenization.map_a_to_b(sanitized_tac_tokens, ucca_tokens)
+    """
+    metrics.reset()
 
-            #ensure tac_to_ucca is 'surjective' over 'ucca_tokens' and defined over 'sanitized_tac_tokens':
-            if not MapTokenization.check_surjectivity(tac_to_ucca, ucca_tokens) \
-                    or not MapTokenization.check_defined(tac_to_ucca, sanitized_tac_tokens):
-                print('failed to align all UCCA and TACRED tokens for UCCA head/dep extraction')
-                continue
+    if progress is None:
+        progress = EnrichmentJournal.Progress(input_offset=0, output_offset=0, count=0)
 
-            item['tac_to_ucca'] = tac_to_ucca
-            item['ucca_tokens'] = ucca_tokens
+    count = progress.count
+    entries = EnrichmentJournal.read_json_lines(input_stream, progress.input_offset)
 
-            item['spacy_tag'] = [ucca_terminal.tag for ucca_terminal in parsed_sentence.terminals]
-            item['spacy_pos'] = [ucca_terminal.pos for ucca_terminal in parsed_sentence.terminals]
-            item['spacy_ent'] = [ucca_terminal.ent for ucca_terminal in parsed_sentence.terminals]
-            item['spacy_head'] = [ucca_terminal.head for ucca_terminal in parsed_sentence.terminals]
+    stop = GracefulStop() if journal is not None else None
 
-            for enhancer in [ UccaPath(), UccaEncodingMinSubtree(), UccaHeads(), UccaDistancesFromPath(), UccaEncoding() ]:
-                for enhancement_key, enhancement_value in enhancer.enhance(item, tac_to_ucca, parsed_sentence).items():
-                        item[enhancement_key] = enhancement_value
+    # a resumed run adds its rejects to those of the run it resumes
+    rejects_stream = open(rejects_file, 'a' if progress.count > 0 else 'w', encoding='utf-8', newline='', buffering=1) if rejects_file is not None else None
+    rejects_write = jsonlines.Writer(rejects_stream) if rejects_stream is not None else None
 
-            json_write.write(item)
+    try:
+        with jsonlines.Writer(output_stream) as json_write:
+
+            def done(input_offset, entry_count, items):
+                nonlocal count
+
+                write_items(json_write, rejects_write, items)
+
+                count += entry_count
+                commit(journal, output_stream, input_offset, count)
+                metrics.maybe_report(report_interval)
+
+                return stop is None or not stop.requested
+
+            driver.run(entries, done)
+
+    finally:
+        if rejects_stream is not None:
+            rejects_stream.close()
+
+        print(metrics.summary(), file=sys.stderr)
+        if stats_file is not None:
+            metrics.write(stats_file)
 
 
 if __name__ == "__main__":
     args = docopt(__doc__)
 
-    input_stream = open(args['--input'], encoding='utf-8') if args['--input'] is not None else sys.stdin
-    output_stream = open(args['--output'], 'w', encoding='utf-8', newline='', buffering=1) if args['--output'] is not None else sys.stdout
-    tupa_module_path = args.get('<tupa_module_path>', None)
+    if args['--resume'] and (args['--input'] is None or args['--output'] is None):
+        sys.exit('--resume requires both --input and --output')
+
+    retrying = args['--only-ids'] is not None or args['--retry-rejects'] is not None
+    if retrying and (args['--input'] is None or args['--output'] is None):
+        sys.exit('--only-ids and --retry-rejects require both --input and --output')
+
+    if retrying and args['--resume']:
+        sys.exit('--only-ids and --retry-rejects cannot be combined with --resume')
+
+    if int(args['--spacy-processes']) > 1 and int(args['--workers']) > 1:
+        sys.exit('--spacy-processes cannot be combined with --workers')
+
+    if args['--staged'] and int(args['--workers']) > 1:
+        sys.exit('--staged cannot be combined with --workers')
+
+    if args['--dep-graph'] is not None:
+        try:
+            set_dep_graph_backend(args['--dep-graph'])
+        except ValueError as e:
+            sys.exit(str(e))
+
+    try:
+        parser_backend, _ = parse_parser_backend(args['--parser-backend'])
+    except ValueError as e:
+        sys.exit(str(e))
+
+    if args['--from-passages'] is not None and not os.path.isfile(args['--from-passages']):
+        sys.exit('no passages file {0}'.format(args['--from-passages']))
+
+    if parser_backend == REPLAY and args['--cache'] is not None:
+        sys.exit('--cache cannot be combined with a replay parser backend')
+
+    if parser_backend != REPLAY and args['<tupa_module_path>'] is None and args['--from-passages'] is None:
+        sys.exit('a TUPA model is required, unless the parser backend is replay:<file>')
+
+    try:
+        enhancers = select_enhancers(args['--enhancers'].split(',') if args['--enhancers'] is not None else None)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    batch_size = int(args['--batch-size'])
+    workers = int(args['--workers'])
+    memo_size = int(args['--memo-size'])
+    report_interval = int(args['--report-interval']) or None
+
+    if args['--from-passages'] is not None:
+        driver = StoredPassageDriver(enhancers, args['--from-passages'], batch_size, memo_size)
+    else:
+        parser_settings = ParserSettings.create(args.get('<tupa_module_path>', None), args['--parser-backend'], args['--cache'],
+                                                int(args['--cache-size']) * 1024 * 1024, args['--cache-hash-model'],
+                                                int(args['--spacy-batch-size']), int(args['--spacy-processes']))
+
+        if args['--staged']:
+            driver = StagedDriver(enhancers, parser_settings, batch_size, memo_size, args['--save-passages'], int(args['--queue-size']))
+        elif workers > 1:
+            driver = WorkerPoolDriver(enhancers, parser_settings, batch_size, memo_size, args['--save-passages'], workers,
+                                      int(args['--chunk-size']))
+        else:
+            driver = SerialDriver(enhancers, parser_settings, batch_size, memo_size, args['--save-passages'])
 
     # https://stackoverflow.com/questions/14207708/ioerror-errno-32-broken-pipe-python
     revert_to_default_behaviour_on_sigpipe()
 
-    enhance(input_stream, output_stream, tupa_module_path)
+    if retrying:
+        entry_ids = args['--only-ids'].split(',') if args['--only-ids'] is not None else read_rejected_ids(args['--retry-rejects'])
+
+        retry_entries(args['--input'], args['--output'], entry_ids,
+                      partial(enhance, driver=driver, rejects_file=args['--rejects'], stats_file=args['--stats'], report_interval=report_interval))
+        sys.exit(0)
+
+    journal = EnrichmentJournal(args['--output'], args['--input']) if args['--output'] is not None else None
+    progress = journal.load() if args['--resume'] else None
+
+    if progress is not None:
+        EnrichmentJournal.prepare_output_for_resume(args['--output'], progress)
+
+    input_stream = open(args['--input'], 'rb') if args['--input'] is not None else sys.stdin.buffer
+    output_stream = open(args['--output'], 'a' if progress is not None else 'w', encoding='utf-8', newline='', buffering=1) if args['--output'] is not None else sys.stdout
 
+    enhance(input_stream, output_stream, driver, journal, progress, args['--rejects'], args['--stats'], report_interval)
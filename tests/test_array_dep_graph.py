@@ -0,0 +1,138 @@
+import os
+import subprocess
+import sys
+
+import networkx
+import pytest
+
+from tacred_enrichment.benchmark.stub_parser import StubTupaParser
+from tacred_enrichment.benchmark.synthetic import generate_entries, seeded_random
+from tacred_enrichment.internal.array_dep_graph import ArrayDepGraph
+from tacred_enrichment.internal.dep_graph import DepGraph, Step
+from tacred_enrichment.internal.ucca_types import is_terminal
+
+# the python hash seeds the comparison is repeated under, in a process of its own each; set and dict iteration
+# orders depend on them, and the two implementations must agree whatever they are
+HASH_SEEDS = ('0', '1', '2')
+
+PASSAGE_COUNT = 25
+PAIRS_PER_PASSAGE = 20
+
+
+def generate_passage_links(seed, depth, remote_rate):
+    """
+    'generate_passage_links' returns the links of random UCCA-like DAGs: synthetic passages (see
+    'generate_native_passage') with up to 'depth' levels of units, and remote edges at 'remote_rate'
+
+    """
+    parser = StubTupaParser(seed, depth, remote_rate)
+
+    return [parser.parse_sentence(' '.join(entry['token'])).get_links()
+            for entry in generate_entries(PASSAGE_COUNT, seed, sentence_length=15)]
+
+
+def outcome(method, *args):
+    """returns what calling 'method' with 'args' gives, be it a result or the type of the exception it raises"""
+    try:
+        return 'result', method(*args)
+    except networkx.NetworkXException as e:
+        return 'raises', type(e).__name__
+
+
+def compare_by(terminal_list, one, another):
+    return len(terminal_list)
+
+
+def summarize_subgraph(graph):
+    if graph is None:
+        return None
+
+    root = graph.root()
+    terminals = sorted(graph.get_terminals())
+
+    return root, terminals, graph.get_undirected_dependency_representations(terminals, root)
+
+
+def find_mismatches(seed, depth, remote_rate):
+    """
+    'find_mismatches' builds a DepGraph and an ArrayDepGraph over each of the generated passages and returns a
+    description of every query on which they differ
+
+    """
+    mismatches = []
+
+    for passage_index, links in enumerate(generate_passage_links(seed, depth, remote_rate)):
+        graphs = DepGraph(links, is_terminal), ArrayDepGraph(links, is_terminal)
+
+        nodes = sorted({link.word_index for link in links} | {link.parent_index for link in links})
+
+        def check(query, *args):
+            outcomes = [outcome(getattr(graph, query), *args) for graph in graphs]
+            if outcomes[0] != outcomes[1]:
+                mismatches.append('passage {0}: {1}{2} gives {3} (networkx) and {4} (array)'.format(
+                    passage_index, query, args, outcomes[0], outcomes[1]))
+
+        check('root')
+
+        for node in nodes:
+            check('get_parents', node)
+
+        root = graphs[0].root()
+        check('get_undirected_dependency_representations', nodes, root)
+        check('get_undirected_dependency_representations', nodes, nodes[len(nodes) // 2])
+
+        rnd = seeded_random(seed, 'pairs', passage_index)
+        pairs = [(rnd.choice(nodes), rnd.choice(nodes)) for _ in range(PAIRS_PER_PASSAGE)]
+
+        # a node that isn't in the graph is handled alike, too
+        pairs += [(nodes[0], 'missing'), ('missing', nodes[-1])]
+
+        for one, another in pairs:
+            check('is_ancestor', one, another)
+            check('lowest_common_ancestor', one, another)
+            check('get_links_of_lca_subgraph', one, another)
+
+            steps = [outcome(graph.get_undirected_steps, one, another) for graph in graphs]
+            if steps[0] != steps[1]:
+                mismatches.append('passage {0}: get_undirected_steps{1} gives {2} (networkx) and {3} (array)'.format(
+                    passage_index, (one, another), steps[0], steps[1]))
+            elif steps[0][0] == 'result':
+                assert all(isinstance(step, Step) for step in steps[0][1])
+
+            if one != 'missing' and another != 'missing':
+                subgraphs = [summarize_subgraph(graph.get_minimal_subgraph(one, another, compare_by)) for graph in graphs]
+                if subgraphs[0] != subgraphs[1]:
+                    mismatches.append('passage {0}: get_minimal_subgraph{1} gives {2} (networkx) and {3} (array)'.format(
+                        passage_index, (one, another), subgraphs[0], subgraphs[1]))
+
+    return mismatches
+
+
+# trees (no remote edges) are indexed differently from DAGs by both implementations, so both are covered
+GRAPH_SHAPES = [(0, 3, 0.0), (1, 4, 0.0), (2, 3, 0.2), (3, 5, 0.5)]
+
+
+@pytest.mark.parametrize('seed, depth, remote_rate', GRAPH_SHAPES)
+def test_array_dep_graph_matches_networkx(seed, depth, remote_rate):
+    assert find_mismatches(seed, depth, remote_rate) == []
+
+
+@pytest.mark.parametrize('hash_seed', HASH_SEEDS)
+def test_array_dep_graph_matches_networkx_under_hash_seed(hash_seed):
+    repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    environment = dict(os.environ, PYTHONHASHSEED=hash_seed)
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [repository, environment.get('PYTHONPATH')]))
+
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__)], env=environment,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+
+    assert completed.returncode == 0, completed.stdout
+
+
+if __name__ == '__main__':
+    # run by 'test_array_dep_graph_matches_networkx_under_hash_seed', in a process with a given hash seed
+    found = [mismatch for shape in GRAPH_SHAPES for mismatch in find_mismatches(*shape)]
+
+    print('\n'.join(found))
+    sys.exit(1 if found else 0)
@@ -0,0 +1,179 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+
+import pytest
+from more_itertools import chunked
+
+from tacred_enrichment.benchmark.stub_parser import StubTupaParser
+from tacred_enrichment.benchmark.synthetic import generate_entries
+from tacred_enrichment.internal.enrichment_journal import EnrichmentJournal
+from tacred_enrichment.internal.enrichment_rejects import Rejection
+from tacred_enrichment.internal.parser_backend import REPLAY, ParseRecording
+from tacred_enrichment.internal.parser_settings import ParserSettings
+from tacred_enrichment.internal.ucca_batch_enhancement import sanitize_batch
+from tacred_enrichment.internal.ucca_enhancer_registry import select_enhancers
+from tacred_enrichment.internal.ucca_passage_store import UccaPassageStore
+from tacred_enrichment.internal.ucca_worker_pool import WorkerPoolDriver
+from tacred_enrichment.ucca_enrichment import enhance
+
+ENTRY_COUNT = 20
+BATCH_SIZE = 3
+
+
+class MarkingDriver(object):
+    """
+    a driver (see 'SerialDriver') that marks each entry as enhanced, rejecting every fifth one; if 'interrupt_after'
+    is given, it sends itself SIGINT once it has handed over that many batches, as a user stopping the run would
+    """
+
+    def __init__(self, interrupt_after=None):
+        self.__interrupt_after = interrupt_after
+        self.batches = 0
+
+    def run(self, entries, done):
+        for batch in chunked(entries, BATCH_SIZE):
+            items = [Rejection(item['id'], 'parse', 'rejected') if item['index'] % 5 == 0 else dict(item, enhanced=True)
+                     for _, item in batch]
+
+            self.batches += 1
+            if self.batches == self.__interrupt_after:
+                os.kill(os.getpid(), signal.SIGINT)
+
+            if not done(batch[-1][0], len(batch), items):
+                break
+
+
+@pytest.fixture(autouse=True)
+def restore_signal_handlers():
+    # 'enhance' stops gracefully on SIGTERM and SIGINT when it's given a journal
+    handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGINT, signal.SIGTERM)}
+    yield
+    for signum, handler in handlers.items():
+        signal.signal(signum, handler)
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    # non ascii text and blank lines, so that byte offsets differ from character offsets and line counts
+    path = str(tmp_path / 'input.jsonl')
+    with open(path, 'w', encoding='utf-8', newline='') as stream:
+        for index in range(ENTRY_COUNT):
+            stream.write(json.dumps({'id': 'e{0}'.format(index), 'index': index, 'token': ['naïve', 'café']}, ensure_ascii=False) + '\n')
+            if index % 7 == 0:
+                stream.write('\n')
+    return path
+
+
+def run(input_file, output_file, rejects_file, driver, resume=False):
+    journal = EnrichmentJournal(output_file, input_file)
+    progress = journal.load() if resume else None
+
+    if progress is not None:
+        EnrichmentJournal.prepare_output_for_resume(output_file, progress)
+
+    with open(input_file, 'rb') as input_stream, \
+            open(output_file, 'a' if progress is not None else 'w', encoding='utf-8', newline='', buffering=1) as output_stream:
+        enhance(input_stream, output_stream, driver, journal, progress, rejects_file)
+
+    return journal
+
+
+def read(path):
+    with open(path, encoding='utf-8') as stream:
+        return stream.read()
+
+
+def test_read_json_lines_offsets(input_file):
+    with open(input_file, 'rb') as input_stream:
+        entries = list(EnrichmentJournal.read_json_lines(input_stream))
+
+    assert [item['index'] for _, item in entries] == list(range(ENTRY_COUNT))
+
+    with open(input_file, 'rb') as input_stream:
+        content = input_stream.read()
+    for offset, item in entries:
+        assert content[:offset].decode('utf-8').rstrip('\n').endswith(json.dumps(item, ensure_ascii=False))
+
+    with open(input_file, 'rb') as input_stream:
+        assert list(EnrichmentJournal.read_json_lines(input_stream, entries[9][0])) == entries[10:]
+
+
+def test_commit_and_load(tmp_path, input_file):
+    output_file = str(tmp_path / 'output.jsonl')
+    journal = EnrichmentJournal(output_file, input_file)
+    assert journal.load() is None
+
+    journal.commit(EnrichmentJournal.Progress(120, 80, 4))
+    assert journal.load() == EnrichmentJournal.Progress(120, 80, 4)
+    assert sorted(os.listdir(str(tmp_path))) == ['input.jsonl', 'output.jsonl.journal']
+
+    with pytest.raises(ValueError):
+        EnrichmentJournal(output_file, str(tmp_path / 'other.jsonl')).load()
+
+
+def test_resumed_run_matches_an_uninterrupted_one(tmp_path, input_file):
+    expected_output, expected_rejects = str(tmp_path / 'expected.jsonl'), str(tmp_path / 'expected.rejects')
+    run(input_file, expected_output, expected_rejects, MarkingDriver())
+
+    output_file, rejects_file = str(tmp_path / 'output.jsonl'), str(tmp_path / 'output.rejects')
+    journal = run(input_file, output_file, rejects_file, MarkingDriver(interrupt_after=3))
+
+    progress = journal.load()
+    assert progress.count == 3 * BATCH_SIZE
+    assert os.path.getsize(output_file) == progress.output_offset
+
+    # whatever was written after the last commit, before the run was killed, is dropped on resume
+    with open(output_file, 'a', encoding='utf-8') as output_stream:
+        output_stream.write('{"id": "half written')
+
+    resumed = MarkingDriver()
+    run(input_file, output_file, rejects_file, resumed, resume=True)
+
+    assert resumed.batches == -(-(ENTRY_COUNT - progress.count) // BATCH_SIZE)
+    assert read(output_file) == read(expected_output)
+    assert read(rejects_file) == read(expected_rejects)
+    assert journal.load().count == ENTRY_COUNT
+
+
+def test_worker_pool_run_with_a_journal(tmp_path):
+    entries = generate_entries(ENTRY_COUNT, sentence_length=10)
+    input_file = str(tmp_path / 'input.jsonl')
+    with open(input_file, 'w', encoding='utf-8') as stream:
+        stream.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+
+    # the workers replay stub parses, so that no TUPA model is needed
+    recording_file = str(tmp_path / 'parses.db')
+    recording, parser = ParseRecording(recording_file), StubTupaParser()
+    for tokens in sanitize_batch(entries):
+        recording.put(' '.join(tokens), parser.parse_sentence(' '.join(tokens)))
+
+    output_file, store_file = str(tmp_path / 'output.jsonl'), str(tmp_path / 'passages.db')
+    repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [repository, environment.get('PYTHONPATH')]))
+
+    # in a process of its own, since a pool whose workers can't be terminated would hang the tests
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), input_file, output_file, recording_file, store_file],
+                               env=environment, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
+                               timeout=300)
+
+    assert completed.returncode == 0, completed.stdout
+    with open(output_file, encoding='utf-8') as stream:
+        assert [json.loads(line)['id'] for line in stream] == [entry['id'] for entry in entries]
+    assert EnrichmentJournal(output_file, input_file).load().count == ENTRY_COUNT
+
+    # the workers closed their passage stores, checkpointing the write ahead log
+    assert not os.path.exists(store_file + '-wal')
+    assert sorted(entry_id for entry_id, _ in UccaPassageStore(store_file, read_only=True).entries()) == sorted(entry['id'] for entry in entries)
+
+
+if __name__ == '__main__':
+    # run by 'test_worker_pool_run_with_a_journal', with the input, output, recorded parses and passage store files
+    input_path, output_path, recording_path, store_path = sys.argv[1:]
+
+    pool_driver = WorkerPoolDriver(select_enhancers(), ParserSettings.create(None, '{0}:{1}'.format(REPLAY, recording_path)),
+                                   BATCH_SIZE, 16, store_path, 2, 4)
+    run(input_path, output_path, output_path + '.rejects', pool_driver)
@@ -0,0 +1,118 @@
+import io
+import json
+import os
+
+import pytest
+
+from tacred_enrichment.internal.enrichment_rejects import Rejection, read_rejected_ids, retry_entries, select_entries, splice_entries
+
+
+def json_lines(items):
+    return ''.join(json.dumps(item) + '\n' for item in items)
+
+
+def read_ids(path):
+    with open(path, encoding='utf-8') as stream:
+        return [json.loads(line)['id'] for line in stream if line.strip()]
+
+
+def write_file(path, text):
+    with open(path, 'w', encoding='utf-8', newline='') as stream:
+        stream.write(text)
+    return str(path)
+
+
+def test_read_rejected_ids_in_order_of_appearance(tmp_path):
+    rejects = [Rejection('b', 'parse', 'failed'), Rejection('a', 'alignment', 'mismatch'),
+               Rejection('b', 'parse', 'failed again'), Rejection('c', 'passage_lookup', 'missing')]
+    rejects_file = write_file(tmp_path / 'rejects.jsonl', json_lines(reject._asdict() for reject in rejects[:2]) + '\n' +
+                              json_lines(reject._asdict() for reject in rejects[2:]))
+
+    assert read_rejected_ids(rejects_file) == ['b', 'a', 'c']
+
+
+def test_select_entries():
+    items = [{'id': 'e{0}'.format(index), 'token': ['w']} for index in range(5)]
+    selected_stream = io.BytesIO()
+
+    positions = select_entries(io.BytesIO(json_lines(items).encode('utf-8')), ['e3', 'e1', 'missing'], selected_stream)
+
+    assert positions == {'e{0}'.format(index): index for index in range(5)}
+    assert [json.loads(line) for line in selected_stream.getvalue().decode('utf-8').splitlines()] == [items[1], items[3]]
+
+
+def test_splice_entries_in_input_order(tmp_path):
+    positions = {'e{0}'.format(index): index for index in range(8)}
+
+    # e1, e4 and e7 were rejected; e5 is retried although it was not
+    output_file = write_file(tmp_path / 'output.jsonl', json_lines({'id': entry_id, 'run': 1} for entry_id in ['e0', 'e2', 'e3', 'e5', 'e6']))
+    os.chmod(output_file, 0o640)
+
+    spliced = json_lines({'id': entry_id, 'run': 2} for entry_id in ['e7', 'e5', 'e1', 'e4']) + '\n'
+    splice_entries(output_file, io.StringIO(spliced), positions)
+
+    with open(output_file, encoding='utf-8') as stream:
+        merged = [json.loads(line) for line in stream]
+
+    assert [(item['id'], item['run']) for item in merged] == \
+        [('e0', 1), ('e1', 2), ('e2', 1), ('e3', 1), ('e4', 2), ('e5', 2), ('e6', 1), ('e7', 2)]
+    assert os.stat(output_file).st_mode & 0o777 == 0o640
+    assert os.listdir(str(tmp_path)) == ['output.jsonl']
+
+
+def test_splice_follows_input_order_rather_than_id_order(tmp_path):
+    # the output of a full run is in input order, which the ids (TACRED's are hashes) needn't follow
+    input_ids = ['e10', 'e2', 'e7', 'e1', 'e30']
+    positions = {entry_id: index for index, entry_id in enumerate(input_ids)}
+    output_file = write_file(tmp_path / 'output.jsonl', json_lines({'id': entry_id} for entry_id in ['e10', 'e1']))
+
+    splice_entries(output_file, io.StringIO(json_lines({'id': entry_id} for entry_id in sorted(['e30', 'e2', 'e7']))), positions)
+
+    assert read_ids(output_file) == input_ids
+    assert input_ids != sorted(input_ids)
+
+
+def test_splice_keeps_entries_that_are_not_in_the_input_in_place(tmp_path):
+    positions = {'e0': 0, 'e1': 1, 'e2': 2}
+    output_file = write_file(tmp_path / 'output.jsonl', json_lines({'id': entry_id} for entry_id in ['e0', 'stray', 'e2']))
+
+    splice_entries(output_file, io.StringIO(json_lines([{'id': 'e1'}])), positions)
+
+    assert read_ids(output_file) == ['e0', 'stray', 'e1', 'e2']
+
+
+def test_failed_splice_leaves_the_output_as_it_was(tmp_path):
+    output_text = json_lines({'id': entry_id} for entry_id in ['e0', 'e2'])
+    output_file = write_file(tmp_path / 'output.jsonl', output_text + '{"id": \n')
+
+    with pytest.raises(ValueError):
+        splice_entries(output_file, io.StringIO(json_lines([{'id': 'e1'}])), {'e0': 0, 'e1': 1, 'e2': 2})
+
+    with open(output_file, encoding='utf-8') as stream:
+        assert stream.read() == output_text + '{"id": \n'
+    assert os.listdir(str(tmp_path)) == ['output.jsonl']
+
+
+def test_retry_entries(tmp_path, capsys):
+    items = [{'id': 'e{0}'.format(index), 'token': ['w{0}'.format(index)]} for index in range(6)]
+    input_file = write_file(tmp_path / 'input.jsonl', json_lines(items))
+    output_file = write_file(tmp_path / 'output.jsonl', json_lines(dict(item, enhanced=1) for item in items if item['id'] not in ('e1', 'e4')))
+
+    enhanced_ids = []
+
+    def enhance(input_stream, output_stream):
+        # enhances e4, and rejects e1 again
+        for line in input_stream:
+            item = json.loads(line)
+            enhanced_ids.append(item['id'])
+            if item['id'] != 'e1':
+                output_stream.write(json.dumps(dict(item, enhanced=2)) + '\n')
+
+    retry_entries(input_file, output_file, ['e4', 'e1', 'nope'], enhance)
+
+    assert enhanced_ids == ['e1', 'e4']
+    with open(output_file, encoding='utf-8') as stream:
+        assert [(item['id'], item['enhanced']) for item in map(json.loads, stream)] == \
+            [('e0', 1), ('e2', 1), ('e3', 1), ('e4', 2), ('e5', 1)]
+
+    assert '1 of the ids are not in the input, e.g. nope' in capsys.readouterr().err
@@ -0,0 +1,122 @@
+import itertools
+
+import networkx
+import pytest
+
+from tacred_enrichment.benchmark.synthetic import generate_entries, generate_native_passage, seeded_random, ucca_tokenize
+from tacred_enrichment.internal.head_distances import HeadDistances
+from tacred_enrichment.internal.ucca_heads import UccaDependencyConverter
+
+SENTENCE_COUNT = 200
+
+
+def baseline_distances_from_path(multi_heads, subj, obj):
+    """
+    the distances UccaDistancesFromPath used to compute: the shortest path length of every token to each node on the
+    subject-object path (from all-pairs shortest paths), the least of which is its distance
+    """
+    sent_len = len(multi_heads)
+
+    edges = {(head_id-1, id): True for id in range(sent_len) for head_id in multi_heads[id]}
+
+    extended_edges = edges.copy()
+    for edge in itertools.combinations(subj, 2):
+        extended_edges[edge] = True
+    for edge in itertools.combinations(obj, 2):
+        extended_edges[edge] = True
+
+    graph = networkx.Graph(list(extended_edges.keys()))
+    on_path = networkx.shortest_path(graph, source=subj[0], target=obj[0])
+
+    all_shortest_paths_lengths = {start: targets for start, targets in networkx.shortest_path_length(graph)}
+
+    token_distances = []
+    for token_id in range(sent_len):
+        distance = 0
+        if token_id not in on_path:
+            distances_to_path = {target: distance_to_target
+                                 for target, distance_to_target in all_shortest_paths_lengths[token_id].items()
+                                 if target in on_path}
+            distance = min(distances_to_path.values(), default=1e12)
+        token_distances.append(distance)
+
+    return token_distances
+
+
+def outcome(distances_from_path, *args):
+    """returns what 'distances_from_path' gives, be it distances or the type of the exception it raises"""
+    try:
+        return 'result', distances_from_path(*args)
+    except networkx.NetworkXException as e:
+        return 'raises', type(e).__name__
+
+
+def random_span(rnd, sent_len):
+    start = rnd.randrange(sent_len)
+    return list(range(start, min(sent_len, start + rnd.randint(1, 3))))
+
+
+def generate_random_heads(seed):
+    """
+    'generate_random_heads' returns random multi heads (of 1 to 4 heads a token, as in 'ucca_deps'), along with a
+    subject and an object span; tokens heading one another may be cut off from the root, and so may the object be
+    from the subject
+    """
+    rnd = seeded_random(seed, 'heads')
+
+    sent_len = rnd.randint(2, 30)
+    multi_heads = []
+    for token_id in range(sent_len):
+        candidates = [head for head in range(sent_len + 1) if head != token_id + 1 and (head > 0 or rnd.random() < 0.3)]
+        multi_heads.append(rnd.sample(candidates, min(len(candidates), rnd.choice([1, 1, 1, 2, 4]))))
+
+    return multi_heads, random_span(rnd, sent_len), random_span(rnd, sent_len)
+
+
+def generate_ucca_heads(seed):
+    """
+    'generate_ucca_heads' returns the multi heads of the 'ucca_deps' of TUPA-like passages, along with a subject
+    and an object span in each - what UccaDistancesFromPath computes distances over
+    """
+    rnd = seeded_random(seed, 'spans')
+    converter = UccaDependencyConverter()
+
+    for index, entry in enumerate(generate_entries(SENTENCE_COUNT // 4, seed, sentence_length=20)):
+        passage = generate_native_passage(str(index), ucca_tokenize(entry['token']), seed, 4, 0.3)
+        _, deps = converter.to_heads_and_deps(passage)
+
+        multi_heads = [[head for _, head in token_deps] for token_deps in deps]
+        yield multi_heads, random_span(rnd, len(multi_heads)), random_span(rnd, len(multi_heads))
+
+
+@pytest.mark.parametrize('first_seed', range(0, 4 * SENTENCE_COUNT, SENTENCE_COUNT))
+def test_distances_match_all_pairs_baseline_on_random_heads(first_seed):
+    for seed in range(first_seed, first_seed + SENTENCE_COUNT):
+        multi_heads, subj, obj = generate_random_heads(seed)
+
+        assert outcome(HeadDistances.distances_from_path, multi_heads, subj, obj) == \
+            outcome(baseline_distances_from_path, multi_heads, subj, obj), seed
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_distances_match_all_pairs_baseline_on_ucca_deps(seed):
+    for multi_heads, subj, obj in generate_ucca_heads(seed):
+        assert HeadDistances.distances_from_path(multi_heads, subj, obj) == baseline_distances_from_path(multi_heads, subj, obj)
+
+
+def test_single_heads_and_unreachable_tokens():
+    # root <- 1 <- 2 <- 3, and tokens 4 and 5 headed by one another, apart from the rest
+    heads = HeadDistances.as_multi_heads([0, 1, 2, 5, 4])
+
+    assert HeadDistances.distances_from_path(heads, [0], [2]) == [0, 0, 0, HeadDistances.UNREACHABLE, HeadDistances.UNREACHABLE]
+    assert HeadDistances.distances_from_path(heads, [0], [0]) == [0, 1, 2, HeadDistances.UNREACHABLE, HeadDistances.UNREACHABLE]
+
+    with pytest.raises(networkx.NetworkXNoPath):
+        HeadDistances.distances_from_path(heads, [0], [3])
+
+
+def test_token_without_heads_is_unreachable():
+    # the baseline fails to look up a token that has neither a head nor a dependent, which isn't a node of the graph
+    heads = [[0], [1], [], [2]]
+
+    assert HeadDistances.distances_from_path(heads, [0], [1]) == [0, 0, HeadDistances.UNREACHABLE, 1]
@@ -0,0 +1,81 @@
+import pytest
+
+from tacred_enrichment.internal import ucca_enhancer_registry
+from tacred_enrichment.internal.ucca_distances_from_path import UccaDistancesFromPath
+from tacred_enrichment.internal.ucca_encodings import UccaEncoding
+from tacred_enrichment.internal.ucca_encodings_min_subtree import UccaEncodingMinSubtree
+from tacred_enrichment.internal.ucca_enhancer import UccaEnhancer
+from tacred_enrichment.internal.ucca_enhancer_registry import ENHANCERS, get_outputs, select_enhancers
+from tacred_enrichment.internal.ucca_heads import UccaHeads
+from tacred_enrichment.internal.ucca_path import UccaPath
+
+
+class First(UccaEnhancer):
+    produces = ('first',)
+
+
+class Second(UccaEnhancer):
+    produces = ('second', 'second_len')
+    requires = ('first',)
+
+
+class Third(UccaEnhancer):
+    produces = ('third',)
+    requires = ('second_len',)
+
+
+class Unrelated(UccaEnhancer):
+    produces = ('unrelated',)
+
+
+def selected_types(outputs=None):
+    return [type(enhancer) for enhancer in select_enhancers(outputs)]
+
+
+def test_all_enhancers_by_default():
+    assert selected_types() == ENHANCERS
+    assert get_outputs() == ['ucca_path', 'ucca_path_len', 'ucca_encodings_min_subtree', 'ucca_heads', 'ucca_deps',
+                             'dist_from_ucca_mh_path', 'ucca_encodings']
+
+
+def test_every_requirement_is_produced_by_an_earlier_enhancer():
+    for enhancer in ENHANCERS:
+        assert selected_types(enhancer.produces)[-1] is enhancer
+
+
+@pytest.mark.parametrize('outputs, expected', [
+    ([], []),
+    (['ucca_path_len'], [UccaPath]),
+    (['ucca_path', 'ucca_path_len', 'ucca_path'], [UccaPath]),
+    (['ucca_deps'], [UccaHeads]),
+    (['dist_from_ucca_mh_path'], [UccaHeads, UccaDistancesFromPath]),
+    (['ucca_encodings', 'ucca_encodings_min_subtree'], [UccaEncodingMinSubtree, UccaEncoding]),
+    (['dist_from_ucca_mh_path', 'ucca_path'], [UccaPath, UccaHeads, UccaDistancesFromPath]),
+])
+def test_selected_enhancers_and_their_requirements_in_run_order(outputs, expected):
+    assert selected_types(outputs) == expected
+
+
+def test_each_selection_has_enhancers_of_its_own():
+    assert all(first is not second for first, second in zip(select_enhancers(), select_enhancers()))
+
+
+def test_unknown_outputs():
+    with pytest.raises(ValueError, match='unknown enhancer outputs nope, ucca_nope'):
+        select_enhancers(['ucca_path', 'nope', 'ucca_nope'])
+
+
+def test_requirements_are_resolved_transitively(monkeypatch):
+    monkeypatch.setattr(ucca_enhancer_registry, 'ENHANCERS', [First, Unrelated, Second, Third])
+
+    assert selected_types(['third']) == [First, Second, Third]
+    assert selected_types(['second', 'unrelated']) == [First, Unrelated, Second]
+    assert get_outputs() == ['first', 'unrelated', 'second', 'second_len', 'third']
+
+
+def test_requirement_produced_by_a_later_enhancer(monkeypatch):
+    monkeypatch.setattr(ucca_enhancer_registry, 'ENHANCERS', [First, Third, Second])
+
+    assert selected_types(['second']) == [First, Second]
+    with pytest.raises(ValueError, match='Third requires second_len'):
+        select_enhancers(['third'])
@@ -0,0 +1,26 @@
+import re
+
+import pytest
+from docopt import docopt
+
+from tacred_enrichment import ucca_enrichment
+
+# an option's description is only read (along with its default) when two spaces separate it from the option
+OPTION_DEFAULTS = re.findall(r'^  (--[a-z-]+)=<[a-z-]+>  .*\[default: (\S+)\]$', ucca_enrichment.__doc__, re.MULTILINE)
+
+
+def test_every_default_is_read():
+    documented = re.findall(r'^  (--[a-z-]+)=.*\[default: ', ucca_enrichment.__doc__, re.MULTILINE)
+
+    assert [option for option, _ in OPTION_DEFAULTS] == documented
+    assert ('--report-interval', '60') in OPTION_DEFAULTS
+
+
+@pytest.mark.parametrize('argv', [['model'], ['--parser-backend=replay:parses.db'], ['--from-passages=passages.db']])
+def test_defaults(argv):
+    args = docopt(ucca_enrichment.__doc__, argv=argv)
+
+    assert args['--report-interval'] == '60'
+    for option, default in OPTION_DEFAULTS:
+        if not any(arg.startswith(option + '=') for arg in argv):
+            assert args[option] == default
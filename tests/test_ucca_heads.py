@@ -0,0 +1,132 @@
+import pytest
+from conllu import parse as conllu_parse
+from semstr.convert import to_conllu
+from ucca.core import Passage
+from ucca.layer0 import Layer0
+from ucca.layer1 import Layer1, EdgeTags, FoundationalNode, NodeTags
+
+from tacred_enrichment.benchmark.synthetic import generate_entries, generate_native_passage, seeded_random, ucca_tokenize
+from tacred_enrichment.internal.ucca_heads import UccaDependencyConverter
+
+PASSAGE_COUNT = 40
+
+# the tags of units the varied passages are made of; linkage (LR, LA) and punctuation edges are added apart
+UNIT_TAGS = [EdgeTags.ParallelScene, EdgeTags.Participant, EdgeTags.Process, EdgeTags.State, EdgeTags.Adverbial,
+             EdgeTags.Ground, EdgeTags.Center, EdgeTags.Elaborator, EdgeTags.Function, EdgeTags.Connector,
+             EdgeTags.Relator, EdgeTags.Time, EdgeTags.Quantifier, EdgeTags.Linker, EdgeTags.Terminal]
+
+# linkers are re-attached to the parallel scenes following them, so these are drawn more often
+SCENE_TAGS = [EdgeTags.ParallelScene, EdgeTags.ParallelScene, EdgeTags.Linker]
+
+
+def heads_and_deps_of_conllu(passage):
+    """the heads and deps of the tokens of 'passage', as UccaHeads used to get them: by way of CoNLL-U lines"""
+
+    tokens = conllu_parse('\n'.join(to_conllu(passage)))[0]
+
+    return [token['head'] for token in tokens], [token['deps'] for token in tokens]
+
+
+def outcome(convert, passage):
+    """returns what converting 'passage' gives, be it heads and deps or the type of the exception raised"""
+    try:
+        return 'result', convert(passage)
+    except (ValueError, RuntimeError) as e:
+        return 'raises', type(e).__name__
+
+
+def generate_varied_passage(seed):
+    """
+    'generate_varied_passage' generates a native ucca passage that has units of every tag, including implicit ones,
+    linkers, linkage nodes and remote edges (of any tag, some of which added before the primary edge of their child)
+    - the kinds of passages TUPA may parse, and then some
+    """
+    rnd = seeded_random(seed, 'varied')
+
+    passage = Passage(str(seed))
+    layer0 = Layer0(passage)
+    layer1 = Layer1(passage)
+
+    terminals = []
+    for index in range(rnd.randint(1, 12)):
+        punct = rnd.random() < 0.15
+        terminal = layer0.add_terminal(text='.' if punct else 'w{0}'.format(index), punct=punct)
+        terminal.extra.update({'tag': '.' if punct else 'NN', 'pos': 'PUNCT' if punct else 'NOUN'})
+        terminals.append(terminal)
+
+    units = []
+
+    def add_unit(parent, tag):
+        if units and rnd.random() < 0.15:
+            # the unit is a remote child before it's a primary one; its remote parent may have no other child, and
+            # so be headed by it, which is how dependencies may end up in a cycle
+            remote_parent = rnd.choice(units) if rnd.random() < 0.5 else layer1.add_fnode(rnd.choice(units), rnd.choice(UNIT_TAGS))
+
+            unit = FoundationalNode(root=passage, tag=NodeTags.Foundational, ID=layer1.next_id())
+            layer1.add_remote(remote_parent, rnd.choice(UNIT_TAGS), unit)
+            (parent or layer1.heads[0]).add(tag, unit)
+        else:
+            unit = layer1.add_fnode(parent, tag)
+
+        units.append(unit)
+        return unit
+
+    def add_units(parent, start, end, level):
+        while start < end:
+            piece_end = rnd.randint(start + 1, end)
+            unit = add_unit(parent, rnd.choice(SCENE_TAGS if rnd.random() < 0.5 else UNIT_TAGS))
+
+            if rnd.random() < 0.15:
+                layer1.add_fnode(unit, rnd.choice(UNIT_TAGS), implicit=True)
+
+            if rnd.random() < 0.05:
+                # a unit with nothing but an implicit child has no head terminal, which fails the conversion if
+                # a (remote) edge leaves it
+                layer1.add_fnode(add_unit(unit, rnd.choice(UNIT_TAGS)), rnd.choice(UNIT_TAGS), implicit=True)
+
+            if level < 4 and piece_end - start > 1 and rnd.random() < 0.8:
+                add_units(unit, start, piece_end, level + 1)
+            else:
+                for terminal in terminals[start:piece_end]:
+                    if terminal.punct:
+                        layer1.add_punct(unit, terminal)
+                    else:
+                        unit.add(EdgeTags.Terminal, terminal)
+
+            start = piece_end
+
+    add_units(None, 0, len(terminals), 1)
+
+    # remote edges only point from a unit to a later one that isn't its ancestor, or to a terminal
+    for index, unit in enumerate(units):
+        if rnd.random() < 0.3:
+            candidates = [candidate for candidate in units[index + 1:] if unit not in candidate.iter(method='bfs')]
+            candidates += terminals if rnd.random() < 0.2 else []
+            if candidates:
+                layer1.add_remote(unit, rnd.choice(UNIT_TAGS), rnd.choice(candidates))
+
+    if len(units) > 2 and rnd.random() < 0.3:
+        relation, *arguments = rnd.sample(units, 3)
+        layer1.add_linkage(relation, *arguments)
+
+    return passage
+
+
+def generate_tupa_like_passages(seed, depth, remote_rate):
+    return [generate_native_passage(str(index), ucca_tokenize(entry['token']), seed, depth, remote_rate)
+            for index, entry in enumerate(generate_entries(PASSAGE_COUNT, seed, sentence_length=15))]
+
+
+@pytest.mark.parametrize('seed, depth, remote_rate', [(0, 1, 0.0), (1, 3, 0.0), (2, 3, 0.3), (3, 5, 0.6)])
+def test_converter_matches_conllu_on_tupa_like_passages(seed, depth, remote_rate):
+    for passage in generate_tupa_like_passages(seed, depth, remote_rate):
+        assert UccaDependencyConverter().to_heads_and_deps(passage) == heads_and_deps_of_conllu(passage), passage.ID
+
+
+@pytest.mark.parametrize('first_seed', range(0, 400, 100))
+def test_converter_matches_conllu_on_varied_passages(first_seed):
+    converter = UccaDependencyConverter()
+
+    for seed in range(first_seed, first_seed + 100):
+        passage = generate_varied_passage(seed)
+        assert outcome(converter.to_heads_and_deps, passage) == outcome(heads_and_deps_of_conllu, passage), seed
@@ -0,0 +1,144 @@
+import pytest
+
+from tacred_enrichment.benchmark.stub_parser import StubTupaParser
+from tacred_enrichment.benchmark.synthetic import generate_entries
+from tacred_enrichment.extra.pack_passages import pack_passages
+from tacred_enrichment.internal import ucca_packed_passages
+from tacred_enrichment.internal.ucca_packed_passages import UccaPackedPassageReader, UccaPackedPassageWriter
+from tacred_enrichment.internal.ucca_passage_store import UccaPassageStore, open_passages
+from tacred_enrichment.internal.ucca_types import UccaEdge, UccaNode, UccaParsedPassage, UccaTerminalNode
+
+ENTRY_COUNT = 60
+
+
+def generate_entry_passages(seed=0):
+    """(entry id, sentence, UccaParsedPassage) of synthetic entries, along with their native passages"""
+
+    parser = StubTupaParser(seed, 3, 0.3)
+
+    entry_passages = []
+    for entry in generate_entries(ENTRY_COUNT, seed, sentence_length=15):
+        sentence = ' '.join(entry['token'])
+        entry_passages.append((entry['id'], sentence, parser.parse_sentence(sentence)))
+
+    return entry_passages
+
+
+def write_packed(packed_file, entry_passages):
+    with UccaPackedPassageWriter(packed_file) as writer:
+        for entry_id, _, parsed_passage in entry_passages:
+            writer.write(entry_id, parsed_passage)
+
+
+def assert_same_passage(read, written, native=True):
+    assert read.serialize() == written.serialize()
+
+    if native:
+        assert read.native.equals(written.native)
+    else:
+        assert read.native is None
+
+
+def test_lookup_by_entry_id(tmp_path):
+    packed_file = str(tmp_path / 'passages.packed')
+    entry_passages = generate_entry_passages()
+    write_packed(packed_file, entry_passages)
+
+    reader = UccaPackedPassageReader(packed_file)
+    try:
+        assert len(reader) == ENTRY_COUNT
+        assert list(reader.ids()) == [entry_id for entry_id, _, _ in entry_passages]
+
+        for entry_id, _, parsed_passage in reversed(entry_passages):
+            assert_same_passage(reader.get(entry_id), parsed_passage)
+            assert_same_passage(reader.get(entry_id, native=False), parsed_passage, native=False)
+
+        assert reader.get('missing') is None
+    finally:
+        reader.close()
+
+
+def test_lookup_when_entry_ids_share_a_hash(tmp_path, monkeypatch):
+    # three hashes for all the ids, so most lookups go through records of other entries first
+    monkeypatch.setattr(ucca_packed_passages, '_id_hash', lambda entry_id: len(entry_id) % 3)
+
+    packed_file = str(tmp_path / 'passages.packed')
+    entry_passages = generate_entry_passages(1)
+    write_packed(packed_file, entry_passages)
+
+    reader = UccaPackedPassageReader(packed_file)
+    try:
+        for entry_id, _, parsed_passage in entry_passages:
+            assert_same_passage(reader.get(entry_id), parsed_passage)
+
+        assert reader.get('missing') is None
+        assert list(reader.ids()) == [entry_id for entry_id, _, _ in entry_passages]
+    finally:
+        reader.close()
+
+
+def test_passage_with_missing_attributes(tmp_path):
+    packed_file = str(tmp_path / 'passages.packed')
+
+    parsed_passage = UccaParsedPassage()
+    terminal = UccaTerminalNode('0.1', ['Terminal'], 1, 'word', None, tag=None, pos='NOUN', ent=None, head=None)
+    root = UccaNode('1.1', [])
+    parsed_passage.add_terminal(terminal)
+    parsed_passage.add_non_terminal(root)
+    parsed_passage.add_edge(UccaEdge(terminal, root, 'A', None))
+
+    write_packed(packed_file, [('no-native', None, parsed_passage), ('empty', None, UccaParsedPassage())])
+
+    reader = UccaPackedPassageReader(packed_file)
+    try:
+        read = reader.get('no-native')
+        assert read.serialize() == parsed_passage.serialize()
+        assert read.native is None
+        assert read.get_node_id_by_token_id(1) == '0.1'
+
+        assert reader.get('empty').serialize() == UccaParsedPassage().serialize()
+    finally:
+        reader.close()
+
+
+def test_entry_written_twice(tmp_path):
+    entry_id, _, parsed_passage = generate_entry_passages()[0]
+
+    with UccaPackedPassageWriter(str(tmp_path / 'passages.packed')) as writer:
+        writer.write(entry_id, parsed_passage)
+
+        with pytest.raises(ValueError):
+            writer.write(entry_id, parsed_passage)
+
+
+def test_packed_store_matches_store(tmp_path):
+    store_file = str(tmp_path / 'passages.db')
+    packed_file = str(tmp_path / 'passages.packed')
+    entry_passages = generate_entry_passages(2)
+
+    store = UccaPassageStore(store_file)
+    store.put(entry_passages)
+    pack_passages(store_file, packed_file)
+
+    packed = open_passages(packed_file)
+    stored = open_passages(store_file)
+    assert isinstance(packed, UccaPackedPassageReader)
+    assert isinstance(stored, UccaPassageStore)
+
+    try:
+        for entry_id, _, _ in entry_passages:
+            assert_same_passage(packed.get(entry_id), stored.get(entry_id))
+    finally:
+        packed.close()
+
+
+def test_not_a_packed_passage_file(tmp_path):
+    store_file = str(tmp_path / 'passages.db')
+    UccaPassageStore(store_file).put(generate_entry_passages()[:1])
+
+    assert not UccaPackedPassageReader.is_packed_passage_file(store_file)
+    with pytest.raises(ValueError):
+        UccaPackedPassageReader(store_file)
+
+    with pytest.raises(FileNotFoundError):
+        open_passages(str(tmp_path / 'missing.packed'))
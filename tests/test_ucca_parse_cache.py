@@ -0,0 +1,192 @@
+import os
+import sqlite3
+
+import pytest
+
+from tacred_enrichment.benchmark.stub_parser import StubTupaParser
+from tacred_enrichment.internal import ucca_parse_cache
+from tacred_enrichment.internal.ucca_parse_cache import CachedTupaParser, UccaParseCache
+from tacred_enrichment.internal.ucca_types import UccaNode, UccaParsedPassage, UccaTerminalNode
+
+
+class FakeClock(object):
+    """stands in for the 'time' module of ucca_parse_cache, so that every use of a parse is a tick later"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        self.now += 1.0
+        return self.now
+
+
+class CountingParser(object):
+    """parses with a StubTupaParser, counting the sentences it's asked to parse; 'failing' sentences fail"""
+
+    def __init__(self, failing=()):
+        self.__parser = StubTupaParser()
+        self.__failing = failing
+        self.parsed = []
+
+    def parse_sentence(self, sentence):
+        self.parsed.append(sentence)
+        return None if sentence in self.__failing else self.__parser.parse_sentence(sentence)
+
+    def parse_sentences(self, sentences):
+        parsed_passages = []
+        for sentence in sentences:
+            parsed_passage = self.parse_sentence(sentence)
+            if parsed_passage is None:
+                break
+            parsed_passages.append(parsed_passage)
+
+        return parsed_passages
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ucca_parse_cache, 'time', clock)
+    return clock
+
+
+def passage_of(sentence):
+    """a small passage without a native passage, the same size for all sentences of the same length"""
+
+    parsed_passage = UccaParsedPassage()
+    terminal = UccaTerminalNode('0.1', ['Terminal'], 1, sentence, sentence)
+    root = UccaNode('1.1', [])
+    parsed_passage.add_terminal(terminal)
+    parsed_passage.add_non_terminal(root)
+
+    return parsed_passage
+
+
+def passage_size(sentence):
+    return len(passage_of(sentence).serialize())
+
+
+def cached_sentences(cache, sentences):
+    return [sentence for sentence in sentences if cache.get(sentence) is not None]
+
+
+def test_least_recently_used_parses_are_evicted(tmp_path):
+    sentences = ['s{0}'.format(index) for index in range(6)]
+    cache = UccaParseCache(str(tmp_path / 'cache.db'), 'model', 5 * passage_size('s0'))
+
+    for sentence in sentences[:5]:
+        cache.put(sentence, passage_of(sentence))
+    cache.get('s0')
+
+    # the cap is exceeded by one parse, and the cache is evicted down to 90% of it: the two least recently used go
+    cache.put('s5', passage_of('s5'))
+
+    assert cached_sentences(cache, sentences) == ['s0', 's3', 's4', 's5']
+
+
+def test_size_is_kept_across_instances(tmp_path):
+    cache_file = str(tmp_path / 'cache.db')
+    max_size = 3 * passage_size('s0')
+
+    first = UccaParseCache(cache_file, 'model', max_size)
+    for sentence in ['s0', 's1', 's2']:
+        first.put(sentence, passage_of(sentence))
+
+    second = UccaParseCache(cache_file, 'model', max_size)
+    second.put('s3', passage_of('s3'))
+
+    assert cached_sentences(second, ['s0', 's1', 's2', 's3']) == ['s2', 's3']
+
+
+def test_hits_misses_and_model_fingerprints(tmp_path):
+    cache_file = str(tmp_path / 'cache.db')
+    parsed_passage = StubTupaParser().parse_sentence('the dog barks')
+
+    cache = UccaParseCache(cache_file, 'model', 1 << 30)
+    cache.put('the dog barks', parsed_passage)
+
+    cached = cache.get('the dog barks')
+    assert cached.serialize() == parsed_passage.serialize()
+    assert cached.native.equals(parsed_passage.native)
+    assert cache.get('the cat sleeps') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    other_model = UccaParseCache(cache_file, 'other model', 1 << 30)
+    assert other_model.get('the dog barks') is None
+
+
+@pytest.mark.parametrize('column, corruption', [
+    ('serialization', '{"terminals": ['),
+    ('native', b''),
+    ('native', b'cos\nno_such_function\n.'),
+    ('native', b'cno_such_module\nUccaPassage\n.'),
+])
+def test_corrupt_entry_is_a_miss_and_evicted(tmp_path, column, corruption):
+    cache_file = str(tmp_path / 'cache.db')
+    cache = UccaParseCache(cache_file, 'model', 1 << 30)
+    cache.put('s0', StubTupaParser().parse_sentence('s0'))
+
+    connection = sqlite3.connect(cache_file, isolation_level=None)
+    connection.execute('UPDATE passages SET {0} = ?'.format(column), (corruption,))
+
+    assert cache.get('s0') is None
+    assert cache.misses == 1
+    assert connection.execute('SELECT COUNT(*) FROM passages').fetchone()[0] == 0
+    connection.close()
+
+    cache.put('s0', passage_of('s0'))
+    assert cache.get('s0').serialize() == passage_of('s0').serialize()
+
+
+def test_model_fingerprint(tmp_path):
+    model_prefix = str(tmp_path / 'model')
+    for suffix, content in [('.json', b'{"a": 1}'), ('.enum', b'tags'), ('_other.json', b'other')]:
+        with open(model_prefix + suffix, 'wb') as file:
+            file.write(content)
+    unrelated = str(tmp_path / 'unrelated')
+    with open(unrelated, 'wb') as file:
+        file.write(b'unrelated')
+
+    by_status = UccaParseCache.model_fingerprint(model_prefix)
+    by_content = UccaParseCache.model_fingerprint(model_prefix, hash_content=True)
+    assert by_status != by_content
+
+    # files not making up the model don't count
+    os.utime(unrelated, ns=(0, 0))
+    assert UccaParseCache.model_fingerprint(model_prefix) == by_status
+
+    # touching a model file changes the fingerprint by status, but not the one by content
+    os.utime(model_prefix + '.enum', ns=(10 ** 18, 10 ** 18))
+    assert UccaParseCache.model_fingerprint(model_prefix) != by_status
+    assert UccaParseCache.model_fingerprint(model_prefix, hash_content=True) == by_content
+
+    with open(model_prefix + '.json', 'wb') as file:
+        file.write(b'{"a": 2}')
+    assert UccaParseCache.model_fingerprint(model_prefix, hash_content=True) != by_content
+
+
+def test_cached_parser_only_parses_what_is_not_cached(tmp_path):
+    parser = CountingParser()
+    cached_parser = CachedTupaParser(parser, UccaParseCache(str(tmp_path / 'cache.db'), 'model', 1 << 30))
+
+    first = cached_parser.parse_sentences(['a b', 'c d'])
+    second = cached_parser.parse_sentences(['c d', 'e f', 'a b'])
+    third = cached_parser.parse_sentence('e f')
+
+    assert parser.parsed == ['a b', 'c d', 'e f']
+    assert [passage.serialize() for passage in second] == [first[1].serialize(), StubTupaParser().parse_sentence('e f').serialize(),
+                                                          first[0].serialize()]
+    assert third.serialize() == second[1].serialize()
+    assert (cached_parser.cache.hits, cached_parser.cache.misses) == (3, 3)
+
+
+def test_cached_parser_stops_at_a_failed_parse(tmp_path):
+    parser = CountingParser(failing=('c d',))
+    cached_parser = CachedTupaParser(parser, UccaParseCache(str(tmp_path / 'cache.db'), 'model', 1 << 30))
+    cached_parser.parse_sentence('e f')
+
+    parsed_passages = cached_parser.parse_sentences(['a b', 'c d', 'e f'])
+
+    assert len(parsed_passages) == 1
+    assert cached_parser.parse_sentence('c d') is None
+    assert parser.parsed == ['e f', 'a b', 'c d', 'c d']
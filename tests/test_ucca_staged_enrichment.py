@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+from tacred_enrichment.benchmark.synthetic import generate_entries
+from tacred_enrichment.internal import ucca_staged_enrichment
+from tacred_enrichment.internal.parser_settings import ParserSettings
+from tacred_enrichment.internal.ucca_enhancer_registry import select_enhancers
+from tacred_enrichment.internal.ucca_staged_enrichment import StagedDriver
+
+
+def die(*args):
+    # exits the stage's process at once, as a crash or a kill would, without a StageFailure
+    os._exit(3)
+
+
+@pytest.mark.parametrize('stage_function, stage', [('create_parser', 'parse'), ('complete_batch', 'enhance')])
+def test_a_stage_that_dies_fails_the_run(monkeypatch, tmp_path, stage_function, stage):
+    # the stage processes are forked, and so have the patched function
+    monkeypatch.setattr(ucca_staged_enrichment, stage_function, die)
+    monkeypatch.setattr(ucca_staged_enrichment, 'STAGE_CHECK_INTERVAL', 0.1)
+
+    entries = list(enumerate(generate_entries(10)))
+    parser_settings = ParserSettings.create(None, 'replay:{0}'.format(tmp_path / 'parses.db'))
+    driver = StagedDriver(select_enhancers(), parser_settings, 2, 16, None, 2)
+
+    with pytest.raises(RuntimeError, match='{0} stage died with exit code 3'.format(stage)):
+        driver.run(entries, lambda input_offset, entry_count, items: True)
@@ -0,0 +1,123 @@
+import io
+import json
+
+import pytest
+
+from tacred_enrichment.benchmark.stub_parser import StubTupaParser
+from tacred_enrichment.benchmark.synthetic import generate_entries
+from tacred_enrichment.internal.ucca_types import UccaEdge, UccaNode, UccaParsedPassage, UccaTerminalNode
+
+PASSAGE_COUNT = 30
+
+
+def generate_passages(seed, depth, remote_rate):
+    parser = StubTupaParser(seed, depth, remote_rate)
+
+    return parser.parse_sentences([' '.join(entry['token']) for entry in generate_entries(PASSAGE_COUNT, seed, sentence_length=15)])
+
+
+def describe(passage):
+    """every attribute of the nodes and edges of 'passage', in order"""
+
+    terminals = [(node.node_id, node.edge_tags_in, node.token_id, node.text, node.lemma, node.tag, node.pos, node.ent, node.head)
+                 for node in passage.terminals]
+    non_terminals = [(node.node_id, node.edge_tags_in) for node in passage.non_terminals]
+    edges = [(edge.child.node_id, edge.parent.node_id, edge.tag, edge.classification) for edge in passage.edges]
+
+    return terminals, non_terminals, edges
+
+
+def small_representation():
+    return {'version': UccaParsedPassage.SERIALIZATION_VERSION,
+            'terminals': [['0.1', 1, 'Dogs', 'dog', 'NNS', 'NOUN', '', 0]],
+            'non_terminals': [['1.1', []], ['1.2', ['H']]],
+            'edges': [['1.2', '1.1', 'H', 'direct'], ['0.1', '1.2', 'A', 'direct']]}
+
+
+@pytest.mark.parametrize('seed, depth, remote_rate', [(0, 1, 0.0), (1, 3, 0.3), (2, 5, 0.6)])
+def test_serialization_round_trip(seed, depth, remote_rate):
+    for passage in generate_passages(seed, depth, remote_rate):
+        serialization = passage.serialize()
+        deserialized = UccaParsedPassage.from_serialization(serialization)
+
+        assert describe(deserialized) == describe(passage)
+        assert deserialized.serialize() == serialization
+
+        # the edges of the deserialized passage refer to its own nodes
+        for edge in deserialized.edges:
+            assert edge.child is deserialized.get_ucca_node_by_node_id(edge.child.node_id)
+            assert edge.parent is deserialized.get_ucca_node_by_node_id(edge.parent.node_id)
+
+
+def test_lookups_match_a_linear_scan():
+    for passage in generate_passages(3, 3, 0.3):
+        for node in passage.terminals + passage.non_terminals:
+            assert passage.get_ucca_node_by_node_id(node.node_id) is \
+                next(other for other in passage.terminals + passage.non_terminals if other.node_id == node.node_id)
+
+        for terminal in passage.terminals:
+            assert passage.get_node_id_by_token_id(terminal.token_id) == \
+                next(other.node_id for other in passage.terminals if other.token_id == terminal.token_id)
+
+
+def test_lookups_follow_nodes_appended_directly():
+    passage = UccaParsedPassage.from_representation(small_representation())
+    passage.get_ucca_node_by_node_id('1.1')
+
+    passage.terminals.append(UccaTerminalNode('0.2', ['Terminal'], 2, 'bark', 'bark'))
+    passage.non_terminals = passage.non_terminals + [UccaNode('1.3', ['P'])]
+
+    assert passage.get_node_id_by_token_id(2) == '0.2'
+    assert passage.get_ucca_node_by_node_id('1.3').edge_tags_in == ['P']
+
+
+def test_first_node_with_an_id_wins():
+    passage = UccaParsedPassage()
+    first = UccaNode('1.1', ['H'])
+    passage.add_non_terminal(first)
+    passage.add_non_terminal(UccaNode('1.1', ['A']))
+
+    assert passage.get_ucca_node_by_node_id('1.1') is first
+
+
+def test_serialization_without_a_version_is_read_as_version_1():
+    representation = small_representation()
+    del representation['version']
+
+    passage = UccaParsedPassage.from_serialization(json.dumps(representation))
+
+    assert describe(passage) == describe(UccaParsedPassage.from_representation(small_representation()))
+    assert passage.edges[0] == UccaEdge(UccaNode('1.2', []), UccaNode('1.1', []), 'H', 'direct')
+
+
+@pytest.mark.parametrize('serialization', [
+    '',
+    '{"terminals": [',
+    '[]',
+    '"a string"',
+    # python literals, which 'eval' used to accept, aren't json
+    "{'terminals': [], 'non_terminals': [], 'edges': []}",
+    "__import__('os').getcwd()",
+    json.dumps(dict(small_representation(), version=2)),
+    json.dumps({key: value for key, value in small_representation().items() if key != 'edges'}),
+    json.dumps(dict(small_representation(), edges=[['0.1', '1.9', 'A', 'direct']])),
+    json.dumps(dict(small_representation(), edges=[['0.1', '1.2', 'A']])),
+    json.dumps(dict(small_representation(), terminals=[['0.1', 1, 'Dogs']])),
+    json.dumps(dict(small_representation(), non_terminals=[['one', []]])),
+    json.dumps(dict(small_representation(), non_terminals=7)),
+])
+def test_malformed_serialization_raises_value_error(serialization):
+    with pytest.raises(ValueError):
+        UccaParsedPassage.from_serialization(serialization)
+
+
+def test_malformed_line_is_identified():
+    passages = generate_passages(4, 2, 0.1)[:2]
+    stream = io.StringIO(passages[0].serialize() + '\n\n' + passages[1].serialize() + '\n' + '{"version": 1}\n')
+
+    decoded = UccaParsedPassage.from_serializations(stream)
+
+    assert describe(next(decoded)) == describe(passages[0])
+    assert describe(next(decoded)) == describe(passages[1])
+    with pytest.raises(ValueError, match='^line 4: '):
+        next(decoded)